@@ -1,71 +1,281 @@
-import os, sys, time, json
+import os, sys, time, json, copy
 import threading
 from application.managers.gateway_manager import GatewayManager
 from application.managers.device_manager import DeviceManager
+from application.observers import AppObserver
 from application.services.device_service import DeviceService
 from infrastructure.connectivity.connectivity import ConnectivityMonitor
+from infrastructure.connectivity.probe import DEFAULT_PROBE_TARGETS, parse_targets
+from infrastructure.metrics.startup import STARTUP
 from infrastructure.mqtt.mqtt_client import MqttClient
-from infrastructure.config.loader import get_gateway, save_gateway
+from infrastructure.config.loader import HISTORY_DIR, get_gateway, reload_gateway, update_gateway, flush_config
+from infrastructure.history.ring_buffer import HistoryStore
+from infrastructure.mqtt.aggregation import WindowAggregator
+from infrastructure.profiles.registry import install_profile, set_logger as set_profile_logger
 
 # =========================
 # Global
 # =========================
+# Claves de gateway.json que solo se aplican relanzando el proceso
+HARD_RESTART_KEYS = ("history", "aggregation")
 
 
 class AppController:
     """
-    Controlador principal de la aplicación Tkinter.
+    Controlador principal de la aplicación (independiente de la interfaz).
     Gestiona conexiones MQTT, Modbus (TCP/Serial), Logo y HTTP.
+
+    Views subscribe as ``AppObserver``s (``ui`` is just one more observer);
+    headless runs pass a ``ConsoleObserver`` and never import tkinter.
+    ``start()`` launches the connectivity monitor and MQTT, ``run()`` blocks
+    until the stop event and ``close()`` stops everything.
     """
 
-    def __init__(self, window):
-        self.window = window
-        self.log = window._log
-        self.gateway_cfg = get_gateway()
-        self.mqtt_handler = MqttClient(
-            self.gateway_cfg,
-            self.on_initial_load,
-            log_callback=self.window._log,
-            command_callback=self.on_receive_command,
-            command_gateway_callback=self.on_receive_gateway_command
-        )
-        
-        # Poblar campos de la UI con la configuración actual
-        self.window.org_id_var.set(self.gateway_cfg.get("organizationId", ""))
-        self.window.gw_id_var.set(self.gateway_cfg.get("gatewayId", ""))
-        self.window.update_known_networks_list(self.gateway_cfg.get("known_networks", {}))
-
-        self.connectivity_monitor = ConnectivityMonitor(
-                log_callback=self.window._log,
-                known_networks=self.gateway_cfg.get("known_networks", {"Chaves 5G": "qwerty25"}),
-                # known_networks=self.gateway_cfg.get("known_networks", {}),
-                status_callback=self.window.update_connectivity_status
+    def __init__(self, ui: AppObserver | None = None, observers=None):
+        self.observers = list(observers or [])
+        if ui is not None:
+            self.observers.append(ui)
+        with STARTUP.stage("config gateway.json"):
+            self.gateway_cfg = get_gateway()
+        self.devices = {}
+        self.services = []
+        self._started = False
+        self._devices_profiled = False
+        # Config con la que están construidos los subsistemas (base del reinicio suave)
+        self._applied_cfg = self.gateway_cfg
+        # Perfiles inválidos visibles en la UI y en el log del servicio
+        set_profile_logger(self.log)
+        # Historial local por dispositivo/señal (gateway.json "history")
+        self.history = HistoryStore.from_config(HISTORY_DIR, self.gateway_cfg.get("history"), log=self.log)
+        with STARTUP.stage("MqttClient init"):
+            self.mqtt_handler = MqttClient(
+                self.gateway_cfg,
+                self.on_initial_load,
+                log_callback=self.log,
+                command_callback=self.on_receive_command,
+                command_gateway_callback=self.on_receive_gateway_command,
+                history_callback=self.on_history_request if self.history else None,
             )
-        self.connectivity_monitor.start()
+        
+        # Agregación por ventana entre drivers y MQTT (gateway.json "aggregation")
+        self.aggregator = WindowAggregator.from_config(
+            self.mqtt_handler.send_aggregate, self.gateway_cfg.get("aggregation"), log=self.log
+        )
+
+        # Poblar las vistas con la configuración actual
+        self._notify("on_gateway_ids", self.gateway_cfg.get("organizationId", ""), self.gateway_cfg.get("gatewayId", ""))
+        self._notify("on_known_networks", self.gateway_cfg.get("known_networks", {}))
+
+        with STARTUP.stage("ConnectivityMonitor init"):
+            self.connectivity_monitor = ConnectivityMonitor(
+                    log_callback=self.log,
+                    known_networks=dict(self.gateway_cfg.get("known_networks", {"Chaves 5G": "qwerty25"})),
+                    # known_networks=self.gateway_cfg.get("known_networks", {}),
+                    status_callback=lambda ok, name: self._notify("on_connectivity", ok, name),
+                    probe_targets=self._probe_targets(),
+                    # Copia propia: el monitor actualiza el historial en sitio
+                    network_stats=copy.deepcopy(self.gateway_cfg.get("network_stats", {})),
+                    stats_callback=self._save_network_stats,
+                    link_callback=self.mqtt_handler.set_link_state
+                )
+
+        self.device_manager = DeviceManager(self.mqtt_handler, self.refresh_device_list, self.log)
+        self.gateway_manager = GatewayManager(self.mqtt_handler, self._refresh_gateway_fields, self.log)
+
+    # === Lifecycle ===
+    def start(self):
+        """Starts connectivity monitoring and MQTT (devices load on the first MQTT connect)."""
+        if self._started:
+            return
+        self._started = True
+        if self.aggregator:
+            self.aggregator.start()
+        with STARTUP.stage("ConnectivityMonitor start"):
+            self.connectivity_monitor.start()
 
         # Conectar MQTT al final
-        self.on_connect_mqtt()
+        with STARTUP.stage("MQTT connect (async)"):
+            self.on_connect_mqtt()
+
+    def run(self, stop_event: threading.Event):
+        """Blocking headless loop: start and wait until ``stop_event`` is set."""
+        self.start()
+        stop_event.wait()
 
-        self.device_manager = DeviceManager(self.mqtt_handler, self.refresh_device_list, self.window._log)
-        self.gateway_manager = GatewayManager(self.mqtt_handler, self._refresh_gateway_fields, self.window._log)
+    def close(self):
+        """Stops devices, connectivity monitoring and MQTT."""
+        for ds in list(self.devices.values()):
+            try:
+                ds.stop()
+            except Exception as e:
+                self.log(f"⚠️ Error deteniendo {getattr(ds, 'name', '?')}: {e}")
         self.devices = {}
+        self.services = []
+        if self.history:
+            self.history.close()
+        if self.aggregator:
+            self.aggregator.stop()
+        flush_config()
+        http = sys.modules.get("infrastructure.http.http_client")
+        if http:
+            # Sesión y loop compartidos por todos los HttpClient
+            http.SHARED_HTTP.shutdown()
+        try:
+            self.connectivity_monitor.stop()
+        except Exception as e:
+            self.log(f"⚠️ Error deteniendo monitor de conectividad: {e}")
+        try:
+            self.mqtt_handler.disconnect()
+        except Exception as e:
+            self.log(f"⚠️ Error desconectando MQTT: {e}")
+        self._started = False
+
+    def soft_restart(self) -> bool:
+        """
+        Re-read gateway.json and rebuild only what changed, in process:
+        MQTT identity, known networks / probe targets, bandwidth budget and
+        the device services. Healthy device connections are kept; only the
+        disconnected ones are restarted. Returns False when a change needs a
+        full restart (``HARD_RESTART_KEYS``).
+        """
+        prev = self._applied_cfg
+        cfg = reload_gateway()
+        if any(prev.get(k) != cfg.get(k) for k in HARD_RESTART_KEYS):
+            return False
+        self.gateway_cfg = cfg
+        self.log("🔁 Reinicio suave: aplicando configuración...")
+
+        if self.mqtt_handler.identity_changed(cfg):
+            # Los dispositivos son de la identidad anterior: se detienen y sus ventanas
+            # de agregación se publican con los tópicos viejos antes de cambiarla.
+            # on_initial_load trae los dispositivos nuevos al reconectar.
+            for ds in list(self.devices.values()):
+                ds.stop()
+            self.devices = {}
+            self.services = []
+            self._notify("on_devices", self.services)
+            if self.aggregator:
+                self.aggregator.flush()
+            self.mqtt_handler.set_identity(cfg)
+        else:
+            self.mqtt_handler.set_identity(cfg)
+            for ds in list(self.devices.values()):
+                ds.gateway_cfg = cfg
+                if not ds.connected:
+                    self.log(f"♻️ Reiniciando {ds.name} (sin conexión)")
+                    ds.stop()
+                    ds.start()
+        self._notify("on_gateway_ids", cfg.get("organizationId", ""), cfg.get("gatewayId", ""))
+
+        if prev.get("known_networks") != cfg.get("known_networks"):
+            self.connectivity_monitor.known_networks = dict(cfg.get("known_networks", {}))
+            self._notify("on_known_networks", cfg.get("known_networks", {}))
+        if prev.get("probe_targets") != cfg.get("probe_targets"):
+            self.connectivity_monitor.set_probe_targets(self._probe_targets())
+        if prev.get("bandwidth_budget") != cfg.get("bandwidth_budget"):
+            self.mqtt_handler.governor.set_budget(cfg.get("bandwidth_budget"))
+
+        self._applied_cfg = cfg
+        self.log("✅ Reinicio suave completado")
+        return True
+
+    def restart(self, hard: bool = False) -> None:
+        """Soft restart; re-exec the process only if requested or if the soft path can't apply the change."""
+        if not hard:
+            try:
+                if self.soft_restart():
+                    return
+                self.log("⚠️ El cambio requiere reinicio completo")
+            except Exception as e:
+                self.log(f"❌ Reinicio suave fallido, reiniciando proceso: {e}")
+        flush_config()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    # === Observers ===
+    def add_observer(self, observer: AppObserver):
+        self.observers.append(observer)
+
+    def _notify(self, hook: str, *args):
+        for observer in list(self.observers):
+            try:
+                getattr(observer, hook)(*args)
+            except Exception as e:
+                print(f"⚠️ Observer {type(observer).__name__}.{hook} error: {e}")
+
+    def log(self, message):
+        if not self.observers:
+            print(message)
+            return
+        self._notify("log", message)
         
+    def _probe_targets(self):
+        """Connectivity probe targets: gateway.json 'probe_targets' or public DNS, plus the MQTT broker."""
+        targets = parse_targets(self.gateway_cfg.get("probe_targets")) or list(DEFAULT_PROBE_TARGETS)
+        if self.mqtt_handler.host:
+            targets.append((self.mqtt_handler.host, self.mqtt_handler.port))
+        return targets
+
+    def _set_bandwidth_budget(self, budget):
+        """Applies and persists the telemetry byte budget (hourlyBytes/dailyBytes)."""
+        applied = self.mqtt_handler.governor.set_budget(budget)
+        self.gateway_cfg = update_gateway({"bandwidth_budget": applied})
+
+    def _set_device_profile(self, model, profile):
+        """Installs a cloud-pushed model profile and applies it to that model's devices."""
+        try:
+            install_profile(model, profile or {})
+        except (ValueError, OSError) as e:
+            self.log(f"❌ Perfil de modelo rechazado: {e}")
+            return
+        self.log(f"📦 Perfil de modelo '{model}' instalado")
+        # Sin cambios de direcciones solo se reemplaza la referencia al perfil
+        for ds in list(self.devices.values()):
+            ds.reload_profiles()
+
+    def _save_network_stats(self, stats):
+        """Persists the Wi-Fi reconnection history in gateway.json."""
+        self.gateway_cfg = update_gateway({"network_stats": stats})
+
+    # === History ===
+    def query_history(self, serial, signal, seconds=None, start=None, end=None, buckets=None):
+        """Recent samples of one signal: raw, or downsampled into ``buckets``."""
+        if not self.history:
+            return {"serial": serial, "signal": signal, "error": "historial deshabilitado"}
+        if seconds is not None and start is None:
+            end = time.time() if end is None else end
+            start = end - float(seconds)
+        return self.history.query(serial, signal, start=start, end=end, buckets=buckets)
+
+    def on_history_request(self, request):
+        """MQTT history/request → history/response payload."""
+        if request.get("signal") is None:
+            return {"serial": request.get("serial"), "signals": self.history.available(request.get("serial"))}
+        return self.query_history(
+            request.get("serial"), request.get("signal"),
+            seconds=request.get("seconds"), start=request.get("start"),
+            end=request.get("end"), buckets=request.get("buckets"),
+        )
+
     # === commands ===
     def on_receive_gateway_command(self, command):
         print("on_receive_gateway_command", command)
         
         match command["action"]:
             case "restart":
-                os.execv(sys.executable, [sys.executable] + sys.argv)
+                self.restart(hard=command.get("mode") == "hard")
             case "restart-gateway":
                 print("restart")
+            case "set-bandwidth-budget":
+                self._set_bandwidth_budget(command.get("budget", command))
+            case "set-device-profile":
+                self._set_device_profile(command.get("model"), command.get("profile"))
 
     
     def on_receive_command(self, device_serial, command):
         if not self.devices:
-            self.window._log(f"no hay dispositivos conectados commando recivido {command}")
+            self.log(f"no hay dispositivos conectados commando recivido {command}")
         if not (ds := self.devices.get(device_serial)):
-                    self.window._log("⚠️ No device selected.")
+                    self.log("⚠️ No device selected.")
                     return    
         match command["action"]:
             case "update-connections":
@@ -94,19 +304,12 @@ class AppController:
     def _refresh_gateway_fields(self, gateway):
         print("refresh_gateway_fields", gateway)
 
-    def on_save_gateway_config(self):
-        org_id = self.window.org_id_var.get()
-        gw_id = self.window.gw_id_var.get()
-
+    def on_save_gateway_config(self, org_id, gw_id):
         # Mantenemos las redes conocidas y otras configuraciones que ya estaban guardadas
-        current_config = get_gateway()
-        current_config["organizationId"] = org_id
-        current_config["gatewayId"] = gw_id
-
         try:
-            save_gateway(current_config)
+            self.gateway_cfg = update_gateway({"organizationId": org_id, "gatewayId": gw_id})
             self.log("✅ Configuración de gateway guardada. Reiniciando...")
-            os.execv(sys.executable, [sys.executable] + sys.argv)
+            self.restart()
         except Exception as e:
             self.log(f"❌ Error al guardar la configuración: {e}")
     
@@ -117,19 +320,15 @@ class AppController:
     # === Known Networks Management ===
     def _update_and_save_networks(self, networks):
         """Actualiza las redes en la config, UI, monitor y guarda el archivo."""
-        current_config = get_gateway()
-        current_config["known_networks"] = networks
-        save_gateway(current_config)
-
-        self.gateway_cfg = current_config
-        self.window.update_known_networks_list(networks)
+        self.gateway_cfg = update_gateway({"known_networks": networks})
+        self._notify("on_known_networks", networks)
         
         # Actualizar el monitor de conectividad con las nuevas redes en tiempo real
         self.connectivity_monitor.known_networks = networks
         self.log("ℹ️ Lista de redes Wi-Fi actualizada.")
 
     def on_add_network(self, ssid, password):
-        networks = self.gateway_cfg.get("known_networks", {})
+        networks = dict(self.gateway_cfg.get("known_networks", {}))
         if ssid in networks:
             self.log(f"⚠️ La red '{ssid}' ya existe. Use 'Editar' para modificarla.")
             return
@@ -137,7 +336,7 @@ class AppController:
         self._update_and_save_networks(networks)
 
     def on_edit_network(self, old_ssid, new_ssid, new_password):
-        networks = self.gateway_cfg.get("known_networks", {})
+        networks = dict(self.gateway_cfg.get("known_networks", {}))
         if old_ssid != new_ssid and new_ssid in networks:
             self.log(f"⚠️ Ya existe una red con el nombre '{new_ssid}'.")
             return
@@ -147,7 +346,7 @@ class AppController:
         self._update_and_save_networks(networks)
 
     def on_remove_network(self, ssid):
-        networks = self.gateway_cfg.get("known_networks", {})
+        networks = dict(self.gateway_cfg.get("known_networks", {}))
         if ssid in networks:
             del networks[ssid]
             self._update_and_save_networks(networks)
@@ -160,10 +359,18 @@ class AppController:
         if devices is None:
             devices = {}
 
-        self.devices = self.create_all_devices(devices)
+        with STARTUP.stage(f"devices ({len(devices)})"):
+            self.devices = self.create_all_devices(devices)
         self.services = list(self.devices.values())
-        if self.window:
-            self.window.update_device_list(self.services)
+        self._notify("on_devices", self.services)
+        if STARTUP.enabled and not self._devices_profiled:
+            # Primer arranque completo: config → MQTT → lista de dispositivos
+            self._devices_profiled = True
+            self.log(STARTUP.report())
+
+    def _on_device_updated(self, device_service):
+        """Pushes a single device's status/config change to the observers."""
+        self._notify("on_device_updated", device_service)
 
     def create_all_devices(self, devices):
         for ds in getattr(self, "devices", {}).values():
@@ -175,8 +382,10 @@ class AppController:
                 mqtt_handler=self.mqtt_handler,
                 gateway_cfg=self.gateway_cfg,
                 device=dev,
-                log=self.window._log,
-                update_fields=None # self.update_device_fields -> No longer used
+                log=self.log,
+                update_fields=self._on_device_updated,
+                history=self.history,
+                aggregator=self.aggregator,
             )
 
             device_services[ds.serial] = ds
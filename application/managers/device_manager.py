@@ -1,5 +1,5 @@
 from domain.models.device import Device
-import json
+from infrastructure.codec import json_codec
 
 class DeviceManager:
     def __init__(self, mqtt_client, refresh_devices, log_func=None):
@@ -12,7 +12,7 @@ class DeviceManager:
     def load_devices(self):
         def _cb(c,u,m):
             try:
-                data = json.loads(m.payload.decode("utf-8"))
+                data = json_codec.loads(m.payload)
                 self.set_devices(data["devices"])
             except Exception:
                 data = None
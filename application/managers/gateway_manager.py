@@ -1,5 +1,5 @@
-import json
 from domain.models.gateway import Gateway
+from infrastructure.codec import json_codec
 
 class GatewayManager:
     """
@@ -28,7 +28,7 @@ class GatewayManager:
         self.log(f"Loading gateway")
         def _cb(c,u,m):
             try:
-                data = json.loads(m.payload.decode("utf-8"))
+                data = json_codec.loads(m.payload)
                 self.set_gateway(data)
             except Exception:
                 data = None
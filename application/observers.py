@@ -0,0 +1,42 @@
+import time
+from typing import Any, Dict, List
+
+
+class AppObserver:
+    """
+    Receives state changes from AppController. Every hook is a no-op by
+    default, so a view only overrides what it shows. Hooks may be called
+    from worker threads (MQTT, Modbus, connectivity); implementations must
+    be thread-safe.
+    """
+
+    def log(self, message: str) -> None:
+        pass
+
+    def on_gateway_ids(self, org_id: str, gw_id: str) -> None:
+        pass
+
+    def on_connectivity(self, is_connected: bool, network_name: str) -> None:
+        pass
+
+    def on_known_networks(self, networks: Dict[str, str]) -> None:
+        pass
+
+    def on_devices(self, services: List[Any]) -> None:
+        pass
+
+    def on_device_updated(self, service: Any) -> None:
+        pass
+
+
+class ConsoleObserver(AppObserver):
+    """Headless/systemd observer: log lines and state changes to stdout (journald)."""
+
+    def log(self, message: str) -> None:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+    def on_connectivity(self, is_connected: bool, network_name: str) -> None:
+        self.log(f"🌐 Internet: {'conectado' if is_connected else 'desconectado'} ({network_name})")
+
+    def on_devices(self, services: List[Any]) -> None:
+        self.log(f"📋 {len(services)} dispositivo(s) cargado(s)")
@@ -0,0 +1,133 @@
+# application/services/command_confirmation.py
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Estado esperado tras cada comando (valores devueltos por read_status())
+EXPECTED_STATES = {
+    "turnon": {"run"},
+    "turnoff": {"stop"},
+    "restart": {"run"},
+}
+
+# Comandos que deben pasar por otro estado aunque el equipo ya esté en el esperado
+REQUIRES_TRANSITION = {"restart"}
+
+
+class CommandConfirmation:
+    """
+    Confirms that a command actually changed the equipment state.
+
+    After a write is ACKed, the transport's ``read_status()`` is polled at an
+    elevated rate until it reports one of the expected states or ``timeout``
+    expires. The outcome, with the measured actuation latency, is handed to
+    ``publish_result``. Only one watch runs per device; a new command
+    supersedes the previous one.
+
+    ``before`` is the state read just before the write. A command whose
+    target state is already current is reported as ``already-in-state``
+    (no latency is measured), except for ``REQUIRES_TRANSITION`` commands,
+    which are only confirmed after the state leaves and re-enters the
+    expected set.
+    """
+
+    def __init__(
+        self,
+        log: Callable[[str], None],
+        publish_result: Callable[[Dict[str, Any]], None],
+        timeout: float = 10.0,
+        interval: float = 0.1,
+    ) -> None:
+        self.log = log
+        self.publish_result = publish_result
+        self.timeout = timeout
+        self.interval = interval
+        self._cancel: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+
+    def watch(
+        self,
+        command: str,
+        transport: str,
+        read_status: Callable[[], Optional[str]],
+        expected: Optional[Iterable[str]] = None,
+        issued_at: Optional[float] = None,
+        before: Optional[str] = None,
+    ) -> None:
+        expected = set(expected or EXPECTED_STATES.get(command, ()))
+        issued_at = issued_at if issued_at is not None else time.monotonic()
+        if not expected:
+            self._publish(command, transport, "sent", expected, None, issued_at, time.monotonic())
+            return
+        in_state = before in expected
+        if in_state and command not in REQUIRES_TRANSITION:
+            self.cancel()
+            self._publish(command, transport, "already-in-state", expected, before, issued_at, issued_at)
+            return
+
+        cancel = threading.Event()
+        with self._lock:
+            if self._cancel:
+                self._cancel.set()
+            self._cancel = cancel
+
+        thread = threading.Thread(
+            target=self._run,
+            args=(command, transport, read_status, expected, issued_at, cancel, in_state),
+            daemon=True,
+        )
+        thread.start()
+
+    def failed(self, command: str, transport: Optional[str]) -> None:
+        """Publish a result for a command whose write was not accepted."""
+        now = time.monotonic()
+        self._publish(command, transport, "write-failed", EXPECTED_STATES.get(command, set()), None, now, now)
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancel:
+                self._cancel.set()
+                self._cancel = None
+
+    def _run(self, command, transport, read_status, expected, issued_at, cancel: threading.Event, in_state: bool = False) -> None:
+        deadline = issued_at + self.timeout
+        state = None
+        # Ya en el estado esperado: hay que verlo salir antes de confirmar
+        left = not in_state
+        while not cancel.is_set() and time.monotonic() < deadline:
+            try:
+                state = read_status()
+            except Exception as e:
+                self.log(f"⚠️ Error leyendo estado para confirmar {command}: {e}")
+                state = None
+            if state in expected and left:
+                self._publish(command, transport, "confirmed", expected, state, issued_at, time.monotonic())
+                return
+            if state is not None and state not in expected:
+                left = True
+            cancel.wait(self.interval)
+
+        if cancel.is_set():
+            status = "superseded"
+        elif not left and state in expected:
+            status = "already-in-state"
+        else:
+            status = "timeout"
+        self._publish(command, transport, status, expected, state, issued_at, time.monotonic())
+
+    def _publish(self, command, transport, status, expected, state, issued_at, finished_at) -> None:
+        latency_ms = round((finished_at - issued_at) * 1000, 1)
+        icon = {"confirmed": "✅", "already-in-state": "ℹ️"}.get(status, "⚠️")
+        self.log(f"{icon} Comando {command} ({transport}): {status} en {latency_ms} ms (estado={state})")
+        try:
+            self.publish_result({
+                "command": command,
+                "transport": transport,
+                "status": status,
+                "expected": sorted(expected),
+                "state": state,
+                "latencyMs": latency_ms,
+                "ts": time.time(),
+            })
+        except Exception as e:
+            self.log(f"❌ Error publicando resultado de comando: {e}")
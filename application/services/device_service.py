@@ -1,12 +1,21 @@
 # device_service.py
 import threading
+import time
 from typing import Dict, Any, Optional
 from threading import RLock
 
-# from infrastructure.http.http_client import HttpClient
-from infrastructure.logo.logo_client import LogoModbusClient
-from infrastructure.modbus.modbus_tcp import ModbusTcp
-from infrastructure.modbus.modbus_serial import ModbusSerial
+from application.services.command_confirmation import CommandConfirmation
+from infrastructure.modbus.poll_health import PollHealth
+from infrastructure.metrics.metrics import REGISTRY
+from infrastructure.metrics.startup import STARTUP
+from infrastructure.config.loader import get_fault_cursor, save_fault_cursor
+from infrastructure.profiles.registry import profile_for_device
+
+# Los drivers (pymodbus, pyserial, aiohttp) se importan en _make_reader, solo para
+# los transportes que el connectionConfig del dispositivo realmente usa.
+
+# Protocolo del perfil de modelo que usa cada transporte
+PROFILE_PROTOCOLS = {"tcp": "modbus-tcp", "serial": "modbus-rtu", "logo": "logo"}
 
 
 
@@ -20,6 +29,11 @@ class DeviceService:
       - Modbus Serial (ModbusSerial)
       - LOGO! (LogoModbusClient)
     and publishes readings via MQTT using the device's serial number.
+
+    When both Modbus TCP and Serial are wired, the one that is not the
+    ``defaultReader`` runs as a warm standby (liveness probe only). Reading
+    fails over to it as soon as the active link goes down and fails back to
+    the preferred link once it has been healthy for ``failback_delay`` seconds.
     """
 
     def __init__(
@@ -30,20 +44,24 @@ class DeviceService:
         device: Dict[str, Any],
         log,
         update_fields,
+        history=None,
+        aggregator=None,
     ) -> None:
         self.mqtt = mqtt_handler
         self.gateway_cfg = gateway_cfg
         self.device = device or {}
         self.log = log
         self.update_fields = update_fields
+        self.history = history
+        self.aggregator = aggregator
         self._lock = RLock()
-        # self.http_interval =0.5
+        self.http_interval = 0.5
 
         # Allowed connectionConfig keys
         self._ALLOWED_CC_KEYS = {
             "host", "httpPort", "tcpPort",
             "serialPort", "baudrate", "slaveId",
-            "logoIp", "logoPort", "mode"
+            "logoIp", "logoPort", "logoWindows", "mode", "failover"
         }
 
         # Device identity
@@ -59,16 +77,27 @@ class DeviceService:
         self.cc: Dict[str, Any] = self.device.get("connectionConfig") or {}
 
         # Per-device handlers
-        # self.http: Optional[HttpClient] = None
-        # self.modbus_tcp: Optional[ModbusTcp] = None
-        # self.modbus_serial: Optional[ModbusSerial] = None
-        # self.logo: Optional[LogoModbusClient] = None
-
-        # self.base_url = f"http://{self.cc['host']}:{self.cc['httpPort']}/api/dashboard"
-        # self.http = HttpClient(self, self._send_signal, self.log)
-        self.modbus_serial = ModbusSerial(self, self._send_signal, self.log, self.cc["serialPort"], self.cc["baudrate"], self.cc["slaveId"])
-        self.modbus_tcp = ModbusTcp(self, self._send_signal, self.log, self.cc["host"], self.cc["tcpPort"], self.cc["slaveId"])
-        self.logo = LogoModbusClient(self, self.log, self._send_signal, self.cc.get("logoIp"), self.cc.get("logoPort"))
+        self.http = self._make_reader("http")
+        self.modbus_serial = self._make_reader("serial")
+        self.modbus_tcp = self._make_reader("tcp")
+        self.logo = self._make_reader("logo")
+
+        # Failover de lectura TCP <-> Serial
+        self._readers = {"tcp": self.modbus_tcp, "serial": self.modbus_serial}
+        self.preferred_reader: Optional[str] = self.cc.get("defaultReader")
+        self.active_reader: Optional[str] = self.preferred_reader
+        self.failback_delay = 30.0
+        self._preferred_ok_since: Optional[float] = None
+
+        self.confirmation = CommandConfirmation(
+            self.log, lambda result: self.mqtt.send_command_result(self.serial, result)
+        )
+
+        # Último valor por (grupo, señal), alimentado por las lecturas que ya
+        # se publican: la vista en vivo no genera tráfico Modbus adicional.
+        self._last_values: Dict[tuple, tuple] = {}
+        self._last_values_lock = threading.Lock()
+
         self.connected: bool = False
         self.connected_logo = False
         self.start()
@@ -80,6 +109,8 @@ class DeviceService:
     def stop(self) -> None:
         """Stop all per-device connections and threads."""
         print(f"⏹️ Stopping DeviceService for {self.device_id}")
+        if getattr(self, "confirmation", None):
+            self.confirmation.cancel()
 
         try:
             if self.modbus_tcp:
@@ -102,17 +133,19 @@ class DeviceService:
         try:
             if self.http:
                 self.http.stop()
+                self.http.stop_fault_sync()
         except Exception as e:
             self.log(f"⚠️ Error stopping HTTP: {e}")
 
     def update_connected(self) -> None:
-        """Check device connection status (TCP/Serial/LOGO) and notify via MQTT if changed."""
+        """Check device connection status (TCP/Serial/HTTP/LOGO) and notify via MQTT if changed."""
         prev_connected = getattr(self, "connected", False)
         prev_connected_logo = getattr(self, "connected_logo", False)
 
         self.connected = any([
             self.modbus_tcp and self.modbus_tcp.is_connected(),
-            self.modbus_serial and self.modbus_serial.is_connected()
+            self.modbus_serial and self.modbus_serial.is_connected(),
+            self.http and self.http.is_connected(),
         ])
         self.connected_logo = bool(self.logo and self.logo.is_connected())
         if self.connected != prev_connected or self.connected_logo != prev_connected_logo:
@@ -122,8 +155,34 @@ class DeviceService:
                 self.mqtt.on_change_device_connection(self.serial, status, logo_status)
             except Exception as e:
                 self.log(f"❌ Error notificando conexión de {self.name}: {e}")
+            self._notify_fields()
+
+    def _notify_fields(self) -> None:
+        """Tell the owner (UI row) that connection state or config changed."""
+        if self.update_fields:
+            try:
+                self.update_fields(self)
+            except Exception as e:
+                self.log(f"⚠️ Error actualizando vista de {self.name}: {e}")
         
 
+    def last_values(self) -> list:
+        """Snapshot of the last-value cache: ``[(group, name, entry, updated_at), ...]``."""
+        with self._last_values_lock:
+            return [(g, n, entry, ts) for (g, n), (entry, ts) in self._last_values.items()]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-device stage metrics plus the poll health of each transport."""
+        out = REGISTRY.summary(device=self.serial)
+        out["health"] = {
+            name: reader.health.snapshot()
+            for name, reader in (
+                ("tcp", self.modbus_tcp), ("serial", self.modbus_serial), ("http", self.http), ("logo", self.logo)
+            )
+            if reader
+        }
+        return out
+
     def start(self) -> None:
         """Start all per-device connections according to connectionConfig."""
         # Siempre intentamos arrancar LOGO
@@ -137,84 +196,267 @@ class DeviceService:
         reader = self.cc.get("defaultReader")
         try:
             if reader == "serial" and self.modbus_serial:
+                self.modbus_serial.set_standby(False)
                 self.modbus_serial.start()
             elif reader == "tcp" and self.modbus_tcp:
+                self.modbus_tcp.set_standby(False)
                 self.modbus_tcp.start()
             elif reader == "http" and self.http:
-                self.http.start()
+                self._start_http()
         except Exception as e:
             self.log(f"⚠️ Error starting {reader}: {e}")
 
+        # El historial de fallas se sincroniza por HTTP sea cual sea el lector activo
+        try:
+            if self.http:
+                self._start_http(poll=False)
+        except Exception as e:
+            self.log(f"⚠️ Error starting fault sync: {e}")
+
+        standby = self._standby_name()
+        if standby:
+            try:
+                self.log(f"🛟 {standby} en espera activa para {self.name}")
+                self._readers[standby].set_standby(True)
+                self._readers[standby].start()
+            except Exception as e:
+                self.log(f"⚠️ Error starting standby {standby}: {e}")
+
         print(f"▶️ Conectando dispositivo {self.name}")
         self.update_connected()
 
-    def turn_on(self):
-        changed = False
-        if self.cc["mode"] == "remote":
-            if self.modbus_tcp.is_connected():
-                changed = self.modbus_tcp.turn_on()
-            if not changed and self.modbus_serial.is_connected():
-                changed = self.modbus_serial.turn_on()
-        elif self.cc["mode"] == "local":
-            if self.logo.is_connected():
-                changed = self.logo.turn_on()
-        print(f"Probando encender con {self.cc['mode']}: {changed}")
+    # ---------------------------
+    # Failover TCP <-> Serial
+    # ---------------------------
+    def _wired(self, name: str) -> bool:
+        if name == "tcp":
+            return bool(self.cc.get("host") and self.cc.get("tcpPort"))
+        if name == "serial":
+            return bool(self.cc.get("serialPort") and self.cc.get("baudrate"))
+        if name == "logo":
+            return bool(self.cc.get("logoIp") and self.cc.get("logoPort"))
+        if name == "http":
+            return bool(self.cc.get("host") and self.cc.get("httpPort"))
+        return False
+
+    def _make_reader(self, name: str):
+        """Import and build a transport driver, only if connectionConfig wires it."""
+        if not self._wired(name):
+            return None
+        with STARTUP.stage(f"{name} driver ({self.serial})"):
+            if name == "serial":
+                from infrastructure.modbus.modbus_serial import ModbusSerial
+                return ModbusSerial(
+                    self, self._sink("serial"), self.log, self.cc["serialPort"], self.cc["baudrate"], self.cc.get("slaveId"),
+                    device_profile=self._profile("serial"),
+                )
+            if name == "tcp":
+                from infrastructure.modbus.modbus_tcp import ModbusTcp
+                return ModbusTcp(
+                    self, self._sink("tcp"), self.log, self.cc["host"], self.cc["tcpPort"], self.cc.get("slaveId"),
+                    device_profile=self._profile("tcp"),
+                )
+            if name == "logo":
+                from infrastructure.logo.logo_client import LogoModbusClient
+                return LogoModbusClient(
+                    self, self.log, self._sink("logo"), self.cc.get("logoIp"), self.cc.get("logoPort"),
+                    windows=self.cc.get("logoWindows"), profile=self.cc.get("logoProfile"),
+                    device_profile=self._profile("logo"),
+                )
+            if name == "http":
+                from infrastructure.http.http_client import HttpClient
+                # Sin connect(): se conecta al usarse (ver _start_http)
+                return HttpClient(
+                    self, self._sink("http"), self.log,
+                    on_faults=self._on_fault_events, fault_cursor=get_fault_cursor(self.serial),
+                )
+        return None
+
+    def _profile(self, name: str):
+        """Shared register map of this device's model for a Modbus/LOGO transport."""
+        return profile_for_device(self.device, PROFILE_PROTOCOLS[name])
+
+    def reload_profiles(self) -> None:
+        """Swap in the current model profiles (after a push) and restart the readers whose read plan changed."""
+        for name, reader in (("tcp", self.modbus_tcp), ("serial", self.modbus_serial), ("logo", self.logo)):
+            if reader is None:
+                continue
+            profile = self._profile(name)
+            if profile is reader.device_profile:
+                continue
+            replan = profile.addresses != reader.device_profile.addresses
+            reader.device_profile = profile
+            if replan and reader._thread and reader._thread.is_alive():
+                self.log(f"♻️ Reiniciando {name} ({self.device_id}) por cambio de perfil {profile.model}.")
+                reader.stop()
+                if name == "logo":
+                    reader.windows = reader._normalize_windows(self.cc.get("logoWindows"))
+                reader.start()
+
+    def _start_http(self, poll: bool = True) -> None:
+        """Connect the HTTP client on first use; poll only as defaultReader, sync faults always."""
+        if not self.http.endpoints:
+            self.http.connect(base_url=self._http_base_url(), interval=self.http_interval)
+        if poll:
+            self.http.start()
+        self.http.start_fault_sync()
+
+    def _http_base_url(self) -> str:
+        return f"http://{self.cc['host']}:{self.cc['httpPort']}/api/dashboard"
+
+    def _wire_new_reader(self, name: str):
+        """A transport configured after construction: build it and start it in its role."""
+        reader = self._make_reader(name)
+        if reader is None:
+            return None
+        if name == "logo":
+            self.logo = reader
+            reader.start()
+            return reader
+        if name == "http":
+            # HTTP no participa del failover TCP <-> Serial: solo lee si es el defaultReader
+            self.http = reader
+            self._start_http(poll=self.cc.get("defaultReader") == "http")
+            return reader
+        setattr(self, "modbus_tcp" if name == "tcp" else "modbus_serial", reader)
+        self._readers[name] = reader
+        if name == self.active_reader:
+            reader.set_standby(False)
+            reader.start()
+        elif name == self._standby_name():
+            reader.set_standby(True)
+            reader.start()
+        return reader
+
+    def _standby_name(self) -> Optional[str]:
+        """The alternate Modbus transport, if failover applies to this device."""
+        if self.preferred_reader not in self._readers or self.cc.get("failover") is False:
+            return None
+        other = "serial" if self.preferred_reader == "tcp" else "tcp"
+        return other if self._wired(other) else None
+
+    def _apply_failover(self) -> None:
+        """Start or stop the standby reader after ``failover`` changed at runtime."""
+        running = lambda r: bool(r._thread and r._thread.is_alive())
+        standby = self._standby_name()
+        if standby:
+            reader = self._readers[standby]
+            self.log(f"🛟 {standby} en espera activa para {self.name}")
+            reader.set_standby(True)
+            if not running(reader):
+                reader.start()
+            return
+
+        # Failover deshabilitado: volver al enlace preferido y apagar el alterno
+        preferred = self._readers.get(self.preferred_reader)
+        if preferred is None:
+            return
+        if self.active_reader != self.preferred_reader:
+            self._switch_reader(self.preferred_reader, "failover deshabilitado")
+        if not running(preferred):
+            preferred.start()
+        for name, reader in self._readers.items():
+            if name != self.preferred_reader and running(reader):
+                self.log(f"⏹️ {name} en espera detenido para {self.name} (failover deshabilitado)")
+                reader.stop()
+
+    def on_reader_cycle(self, reader, state: str) -> None:
+        """Called by TCP/Serial readers after every poll (or probe) cycle."""
+        name = getattr(reader, "transport", None)
+        if name not in self._readers or self._standby_name() is None:
+            return
+
+        with self._lock:
+            other = "serial" if name == "tcp" else "tcp"
+            if name == self.active_reader:
+                if state == PollHealth.DOWN and self._usable(other):
+                    self._switch_reader(other, f"{name} caído")
+                return
+
+            # Ciclo del enlace en espera
+            if name == self.preferred_reader and state == PollHealth.OK:
+                if self._preferred_ok_since is None:
+                    self._preferred_ok_since = time.monotonic()
+            elif name == self.preferred_reader:
+                self._preferred_ok_since = None
+
+            if not self._usable(self.active_reader) and state != PollHealth.DOWN:
+                self._switch_reader(name, f"{self.active_reader} no disponible")
+            elif (
+                self._preferred_ok_since is not None
+                and time.monotonic() - self._preferred_ok_since >= self.failback_delay
+            ):
+                self._switch_reader(name, f"{name} estable {self.failback_delay:.0f}s")
+
+    def _usable(self, name: Optional[str]) -> bool:
+        reader = self._readers.get(name)
+        return bool(reader and reader.is_connected() and not reader.health.is_down())
+
+    def _switch_reader(self, name: str, reason: str) -> None:
+        previous = self.active_reader
+        self.active_reader = name
+        self._preferred_ok_since = None
+        self.log(f"🔀 {self.name}: lectura {previous} → {name} ({reason})")
+        REGISTRY.inc("failovers", device=self.serial, transport=name)
+        self._readers[name].set_standby(False)
+        if self._readers.get(previous):
+            self._readers[previous].set_standby(True)
+
+    def _run_command(self, command: str, action: str, label: str) -> bool:
+        """
+        Send ``action`` (turn_on/turn_off/restart) through the first transport
+        that accepts it and start the readback confirmation on that transport.
+        """
+        mode = self.cc.get("mode")
+        if mode == "remote":
+            candidates = [c for c in (self.modbus_tcp, self.modbus_serial) if c]
+        elif mode == "local":
+            candidates = [self.logo] if self.logo else []
+        else:
+            candidates = []
+
+        used = None
+        before = issued_at = None
+        for client in candidates:
+            if not client.is_connected():
+                continue
+            # Estado previo: la confirmación exige una transición, no solo el estado final
+            try:
+                before = client.read_status()
+            except Exception:
+                before = None
+            issued_at = time.monotonic()
+            if getattr(client, action)():
+                used = client
+                break
+        changed = used is not None
+        print(f"Probando {label} con {mode}: {changed}")
+
+        if used is None:
+            self.confirmation.failed(command, None)
+        else:
+            self.confirmation.watch(command, used.transport, used.read_status, issued_at=issued_at, before=before)
+        return changed
 
+    def turn_on(self):
+        return self._run_command("turnon", "turn_on", "encender")
 
     def turn_off(self):
-        changed = False
-        if self.cc["mode"] == "remote":
-            if self.modbus_tcp.is_connected():
-                changed = self.modbus_tcp.turn_off()
-            if not changed and self.modbus_serial.is_connected():
-                changed = self.modbus_serial.turn_off()
-        elif self.cc["mode"] == "local":
-            if self.logo.is_connected():
-                changed = self.logo.turn_off()
-        print(f"Probando apagar con {self.cc['mode']}: {changed}")
+        return self._run_command("turnoff", "turn_off", "apagar")
 
 
     def set_local(self):
-        changed = self.modbus_serial.set_local()
-        if not changed:
+        changed = bool(self.modbus_serial and self.modbus_serial.set_local())
+        if not changed and self.modbus_tcp:
             self.modbus_tcp.set_local()
 
     def set_remote(self):
-        changed = self.modbus_serial.set_remote()
-        if not changed:
+        changed = bool(self.modbus_serial and self.modbus_serial.set_remote())
+        if not changed and self.modbus_tcp:
             self.modbus_tcp.set_remote()
 
     def restart(self):
-        changed = False
-        if self.cc["mode"] == "remote":
-            if self.modbus_tcp.is_connected():
-                changed = self.modbus_tcp.restart()
-            if not changed and self.modbus_serial.is_connected():
-                changed = self.modbus_serial.restart()
-        elif self.cc["mode"] == "local":
-            if self.logo.is_connected():
-                changed = self.logo.restart()
-        print(f"Probando reiniciar con {self.cc['mode']}: {changed}")
-
-    # ---------------------------
-    # Connection helpers (connect/disconnect)
-    # ---------------------------
-
-    # Http
-    # def connect_http(self) -> None:
-    #     if self.cc.get("host") and self.cc.get("httpPort"):
-    #         try:
-    #             self.http.connect(base_url=self.base_url, interval=self.http_interval)
-    #             self.log(f"🌐 HTTP connected: {self.base_url} ({self.device_id})")
-    #         except Exception as e:
-    #             self.log(f"⚠️ HTTP error ({self.device_id}): {e}")
-
-    # def disconnect_http(self) -> None:
-    #     if self.http and hasattr(self.http, "stop"):
-    #         try:
-    #             self.http.stop()
-    #         except Exception:
-    #             pass
+        return self._run_command("restart", "restart", "reiniciar")
 
     # ---------------------------
     # Hot config update (reuses helpers)
@@ -248,10 +490,15 @@ class DeviceService:
             changed_tcp    = any(prev.get(k) != self.cc.get(k) for k in ("host", "tcpPort", "slaveId"))
             changed_serial = any(prev.get(k) != self.cc.get(k) for k in ("serialPort", "baudrate", "slaveId"))
             changed_logo   = any(prev.get(k) != self.cc.get(k) for k in ("logoIp", "logoPort"))
+            changed_logo_windows = prev.get("logoWindows") != self.cc.get("logoWindows")
+            changed_http   = any(prev.get(k) != self.cc.get(k) for k in ("host", "httpPort"))
             changed_mode   = prev.get("mode") != self.cc.get("mode")
+            changed_failover = (prev.get("failover") is False) != (self.cc.get("failover") is False)
 
             # Aplicar cambios
-            if changed_tcp:
+            if changed_tcp and self.modbus_tcp is None:
+                self._wire_new_reader("tcp")
+            elif changed_tcp:
                 self.log(f"♻️ Reiniciando Modbus TCP ({self.device_id}) por cambio de configuración.")
                 self.modbus_tcp.update_config(
                     self.cc.get("host"),
@@ -259,7 +506,9 @@ class DeviceService:
                     self.cc.get("slaveId")
                 )
 
-            if changed_serial:
+            if changed_serial and self.modbus_serial is None:
+                self._wire_new_reader("serial")
+            elif changed_serial:
                 self.log(f"♻️ Reiniciando Modbus Serial ({self.device_id}) por cambio de configuración.")
                 self.modbus_serial.update_config(
                     self.cc.get("serialPort"),
@@ -267,12 +516,29 @@ class DeviceService:
                     self.cc.get("slaveId")
                 )
 
-            if changed_logo:
+            if changed_logo and self.logo is None:
+                self._wire_new_reader("logo")
+            elif changed_logo:
                 self.log(f"♻️ Reiniciando LOGO! ({self.device_id}) por cambio de configuración.")
+                self.logo.windows = self.logo._normalize_windows(self.cc.get("logoWindows"))
                 self.logo.update_config(
                     self.cc.get("logoIp"),
                     self.cc.get("logoPort")
                 )
+            elif changed_logo_windows and self.logo is not None:
+                self.logo.update_windows(self.cc.get("logoWindows"))
+
+            if changed_http and self.http is None:
+                self._wire_new_reader("http")
+            elif changed_http and self._wired("http"):
+                self.log(f"♻️ Reiniciando HTTP ({self.device_id}) por cambio de configuración.")
+                self.http.update_config(self._http_base_url())
+            elif changed_http:
+                self.http.stop()
+                self.http.stop_fault_sync()
+
+            if changed_failover:
+                self._apply_failover()
 
             if changed_mode:
                 self.log(f"♻️ Modo cambiado a {self.cc.get('mode')}")
@@ -281,11 +547,11 @@ class DeviceService:
                 else:
                     self.set_remote()
 
-            if not any((changed_tcp, changed_serial, changed_logo, changed_mode)):
+            if not any((changed_tcp, changed_serial, changed_logo, changed_logo_windows, changed_http, changed_mode, changed_failover)):
                 self.log("ℹ️ update_connection_config: no hubo cambios efectivos.")
 
         # Notificar actualización
-        self.update_fields(self)
+        self._notify_fields()
 
     # ---------------------------
     # Internal helpers
@@ -295,12 +561,47 @@ class DeviceService:
         gw_id  = self.gateway_cfg.get("gateway_id") or self.gateway_cfg.get("gatewayId")
         return org_id, gw_id
 
-    def _send_signal(self, results: Dict[str, Any], group: str) -> None:
+    def _on_fault_events(self, events: list, cursor: Dict[str, Any]) -> bool:
+        """New drive fault events (HTTP /evt/lst): publish them, then persist the cursor."""
+        if events and not self.mqtt.send_fault_events(self.serial, events):
+            return False
+        try:
+            save_fault_cursor(self.serial, cursor)
+        except Exception as e:
+            self.log(f"⚠️ Error guardando cursor de fallas de {self.name}: {e}")
+        return True
+
+    def _sink(self, source: str):
+        """send_signal callback for one transport; tags payloads with their source."""
+        def _send(results: Dict[str, Any], group: str, sampled_at: Optional[float] = None) -> None:
+            self._send_signal(results, group, sampled_at=sampled_at, source=source)
+        return _send
+
+    def _send_signal(
+        self,
+        results: Dict[str, Any],
+        group: str,
+        sampled_at: Optional[float] = None,
+        source: Optional[str] = None,
+    ) -> None:
         """Publish via MQTT with the device's serial number."""
+        if source in self._readers and self.active_reader in self._readers and source != self.active_reader:
+            return  # lectura de un enlace en espera: no se publica
         try:
             if not isinstance(results, dict) or not results:
                 self.log("⚠️ Empty result; MQTT will not be sent.")
                 return
+            now = time.time()
+            with self._last_values_lock:
+                for name, entry in results.items():
+                    self._last_values[(group, name)] = (entry, now)
+            if self.history:
+                self.history.record(self.serial, results, now)
+            if self.aggregator:
+                # Solo sigue en crudo lo que no se publica únicamente agregado
+                results = self.aggregator.split((self.serial, group), results, now)
+                if not results:
+                    return
             org_id, gw_id = self._ids()
             if not org_id or not gw_id:
                 self.log(f"⚠️ Missing IDs in gateway_cfg: org={org_id} gw={gw_id}")
@@ -311,6 +612,8 @@ class DeviceService:
                 "gateway_id":      gw_id,
             }
             payload = {"group": group, "payload": results}
-            self.mqtt.send_signal(topic_info, payload)
+            if source:
+                payload["source"] = source
+            self.mqtt.send_signal(topic_info, payload, sampled_at=sampled_at)
         except Exception as e:
             self.log(f"❌ DeviceService._send_signal error ({self.device_id}): {e}")
@@ -0,0 +1,36 @@
+import json
+import os
+from typing import Any, Union
+
+# Backend JSON: orjson si está instalado (opcional), si no la stdlib.
+# JSON_CODEC=stdlib fuerza la stdlib (p.ej. para comparar o depurar).
+try:
+    if os.getenv("JSON_CODEC", "").lower() == "stdlib":
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "stdlib"
+
+# Encoder stdlib construido una vez (json.dumps con kwargs crea uno por llamada)
+_ENCODER = json.JSONEncoder(default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode ``obj`` as compact UTF-8 JSON bytes, ready for ``publish()``.
+    Unknown types fall back to ``str()`` and non-string keys (Modbus register
+    addresses) become strings, with either backend.
+    """
+    if orjson:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return _ENCODER.encode(obj).encode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON from bytes (MQTT payloads, HTTP bodies) or text."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
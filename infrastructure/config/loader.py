@@ -1,7 +1,7 @@
 # config/loader.py
 import os
-import json
-from dotenv import load_dotenv, find_dotenv
+
+from infrastructure.config.store import JsonStore
 
 # === Paths ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,10 +10,14 @@ DATA_DIR = os.path.join(BASE_DIR, "../..", "data")
 DEVICES_FILE = os.path.join(DATA_DIR, "devices.json")
 SIGNALS_FILE = os.path.join(DATA_DIR, "signals.json")
 GATEWAY_PATH = os.path.join(DATA_DIR, "gateway.json")
+FAULT_CURSORS_FILE = os.path.join(DATA_DIR, "fault_cursors.json")
+HISTORY_DIR = os.path.join(DATA_DIR, "history")
 
 
-# === Internal caches for lazy loading ===
-_gateway_cache = None
+# === Stores (lazy-loaded, atomic debounced writes) ===
+GATEWAY_STORE = JsonStore(GATEWAY_PATH)
+FAULT_CURSORS_STORE = JsonStore(FAULT_CURSORS_FILE, debounce=2.0)
+_env_loaded = False
 
 
 def _env_int(name: str, default: str) -> int:
@@ -28,7 +32,12 @@ def _env_int(name: str, default: str) -> int:
 # Environment & Config Loading
 # -----------------------------
 def load_env():
-    """Load environment variables from .env file if available."""
+    """Load environment variables from .env file if available (once per process)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    from dotenv import load_dotenv, find_dotenv
     dotenv_path = find_dotenv()
     if dotenv_path:
         load_dotenv(dotenv_path)
@@ -47,6 +56,7 @@ def load_config():
         "MQTT_PASS": os.getenv("MQTT_PASS", ""),
         "PORT": os.getenv("RS485_PORT", ""), 
         "BAUDRATE": _env_int("RS485_BAUD", "9600"),
+        "METRICS_PORT": _env_int("METRICS_PORT", "0"),
     }
 
 
@@ -62,38 +72,45 @@ def get_mqtt_config():
 
 
 # -----------------------------
-# JSON Utility
+# Gateway
 # -----------------------------
-def _load_json(path: str, default):
-    """Load JSON from a file. Return default if file not found or invalid."""
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return default
+def get_gateway():
+    """
+    Return the current gateway configuration snapshot (read-only, shared).
+    Change it with ``update_gateway`` / ``save_gateway``, never in place.
+    """
+    return GATEWAY_STORE.snapshot()
+
 
+def reload_gateway():
+    """Re-read gateway.json from disk (after flushing pending edits) and return the new snapshot."""
+    return GATEWAY_STORE.reload()
 
-def _save_json(path: str, data):
-    """Save JSON to a file, creating directories if necessary."""
-    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    print(f"💾 Saved data to {path}")
+
+def update_gateway(changes: dict):
+    """Merge ``changes`` into gateway.json (written atomically, off the caller thread)."""
+    return GATEWAY_STORE.update(changes)
+
+
+def save_gateway(gateway_data: dict):
+    """Replace the whole gateway configuration."""
+    return GATEWAY_STORE.replace(gateway_data)
+
+
+def flush_config():
+    """Persist pending configuration writes now (before restarting or exiting)."""
+    GATEWAY_STORE.flush()
+    FAULT_CURSORS_STORE.flush()
 
 
 # -----------------------------
-# Gateway
+# Fault history cursors
 # -----------------------------
-def get_gateway():
-    """Return a copy of gateway configuration (lazy-loaded from gateway.json)."""
-    global _gateway_cache
-    if _gateway_cache is None:
-        _gateway_cache = _load_json(GATEWAY_PATH, {})
-    return dict(_gateway_cache)
+def get_fault_cursor(serial: str) -> dict:
+    """Return the persisted fault-sync cursor of a device (empty if none)."""
+    return dict(FAULT_CURSORS_STORE.snapshot().get(serial) or {})
 
 
-def save_gateway(gateway_data: dict):
-    """Save gateway configuration to gateway.json and update cache."""
-    global _gateway_cache
-    _save_json(GATEWAY_PATH, gateway_data)
-    _gateway_cache = dict(gateway_data)
+def save_fault_cursor(serial: str, cursor: dict):
+    """Persist one device's fault-sync cursor to fault_cursors.json."""
+    FAULT_CURSORS_STORE.update({serial: cursor})
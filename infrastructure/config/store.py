@@ -0,0 +1,154 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional
+
+
+def write_json_atomic(path: str, data) -> None:
+    """
+    Write JSON so that ``path`` always holds either the old or the new
+    content: temp file in the same directory, fsync, rename, fsync of the
+    directory (best effort where directories can't be opened).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class JsonStore:
+    """
+    In-memory, versioned snapshot of a JSON file with debounced atomic writes.
+
+    ``snapshot()`` returns a read-only view shared by every reader (no copy
+    per call); nested values must be treated as read-only too. ``update()``
+    and ``replace()`` swap in a new snapshot (copy-on-write, bumping
+    ``version``) and return at once: a writer thread persists the latest
+    version after ``debounce`` seconds, so a burst of edits costs one write.
+    ``flush()`` forces the pending write (before a restart or on exit).
+    """
+
+    def __init__(self, path: str, debounce: float = 0.5, log: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.debounce = debounce
+        self.log = log or (lambda msg: print(msg))
+        self._data: Optional[Dict[str, Any]] = None
+        self._view: Mapping[str, Any] = MappingProxyType({})
+        self.version = 0
+        self._written_version = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------------------
+    # Lectura
+    # ---------------------------
+    def snapshot(self) -> Mapping[str, Any]:
+        if self._data is None:
+            self._load()
+        return self._view
+
+    def _read_file(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        return data if isinstance(data, dict) else {}
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._data is not None:
+                return
+            self._data = self._read_file()
+            self._view = MappingProxyType(self._data)
+
+    def reload(self) -> Mapping[str, Any]:
+        """Persist pending edits, then re-read the file (picks up edits made outside the process)."""
+        self.flush()
+        data = self._read_file()
+        with self._lock:
+            # Una edición posterior al flush aún no está en disco: gana la memoria
+            if self.version <= self._written_version:
+                self._data = data
+                self._view = MappingProxyType(data)
+        return self._view
+
+    # ---------------------------
+    # Escritura
+    # ---------------------------
+    def update(self, changes: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Merge ``changes`` (``None`` deletes a key) into a new snapshot and schedule the write."""
+        self.snapshot()
+        changes = copy.deepcopy(dict(changes))
+        with self._lock:
+            data = dict(self._data)
+            for key, value in changes.items():
+                if value is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = value
+            self._swap(data)
+        return self._view
+
+    def replace(self, data: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Replace the whole content with a copy of ``data`` and schedule the write."""
+        data = copy.deepcopy(dict(data))
+        with self._lock:
+            self._swap(data)
+        return self._view
+
+    def _swap(self, data: Dict[str, Any]) -> None:
+        self._data = data
+        self._view = MappingProxyType(data)
+        self.version += 1
+        self._dirty.set()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def flush(self) -> bool:
+        """Write the latest snapshot now if it hasn't been persisted yet."""
+        with self._write_lock:
+            with self._lock:
+                version, data = self.version, self._data
+            if version <= self._written_version:
+                return True
+            try:
+                write_json_atomic(self.path, data)
+            except OSError as e:
+                self.log(f"❌ Error guardando {self.path}: {e}")
+                return False
+            self._written_version = version
+            self.log(f"💾 Saved data to {self.path}")
+            return True
+
+    def _writer(self) -> None:
+        while True:
+            self._dirty.wait()
+            # Ventana de agrupación: las ediciones seguidas se escriben una sola vez
+            time.sleep(self.debounce)
+            self._dirty.clear()
+            if not self.flush():
+                time.sleep(5.0)
+                self._dirty.set()
@@ -1,13 +1,40 @@
+import glob
 import subprocess
-import socket
 import time
 import os
 import threading
-from typing import Callable, Dict
+from typing import Callable, Dict, Iterable
+
+from infrastructure.connectivity.link_watch import LinkWatcher
+from infrastructure.connectivity.probe import DEFAULT_PROBE_TARGETS, ProbeEngine, ProbeResult
+from infrastructure.connectivity.wifi_ranking import parse_scan_results, rank_networks, record_attempt
+from infrastructure.connectivity.wpa_ctrl import WpaCtrl, WpaCtrlError
+from infrastructure.metrics.metrics import REGISTRY
 
 class ConnectivityMonitor:
     """Monitors the internet connection and takes action to restore it if lost.
-    Runs checks in a separate thread."""
+    Runs checks in a separate thread.
+
+    Each check probes several targets concurrently (public DNS plus, when
+    given, the MQTT broker); the online/offline state only flips when a
+    majority of targets agree. While degraded (offline or any target failing)
+    checks run every ``degraded_interval`` seconds instead of ``check_interval``;
+    recovery actions (Wi-Fi reconnection, interface restart) keep their own
+    backoff, from ``check_interval`` doubling up to ``max_recovery_interval``.
+
+    Link changes come from kernel netlink events (sysfs polling as fallback)
+    and wake the loop for an immediate re-probe; the probe quorum alone
+    decides online/offline, since the uplink may be another interface
+    (Ethernet, cellular) while ``wifi_interface`` is down. Wi-Fi status and reconnection go through
+    the wpa_supplicant control socket and wait for its events, falling back
+    to iwgetid/wpa_cli when the socket is not accessible.
+
+    On loss, known networks are tried in ranked order (one scan; visibility,
+    signal, success history and time-to-connect, last good network first).
+    The history lives in ``network_stats`` and is handed to ``stats_callback``
+    so the caller can persist it: right after a successful connection, at
+    most every ``stats_persist_interval`` seconds for failed attempts, and
+    when the monitor stops."""
     def __init__(
         self,
         log_callback: Callable[[str], None],
@@ -15,7 +42,16 @@ class ConnectivityMonitor:
         wifi_interface: str = "wlan0",
         known_networks: Dict[str, str] = None,
         check_interval: int = 60,
-        reboot_timeout: int = 3600
+        reboot_timeout: int = 3600,
+        probe_targets: Iterable = None,
+        degraded_interval: int = 5,
+        probe_timeout: float = 2.0,
+        network_stats: Dict[str, dict] = None,
+        stats_callback: Callable[[Dict[str, dict]], None] | None = None,
+        connect_timeout: float = 15,
+        link_callback: Callable[[bool], None] | None = None,
+        stats_persist_interval: float = 600,
+        max_recovery_interval: float = 600
     ):
         self.log = log_callback
         self.wifi_interface = wifi_interface
@@ -25,11 +61,38 @@ class ConnectivityMonitor:
         self.reboot_timeout = reboot_timeout
         
         self.disconnected_time = 0
+        self._offline_since: float | None = None
         self._stop_event = threading.Event()
         self._thread: threading.Thread | None = None
         self._last_status: bool | None = None
         self._last_ssid: str | None = None
 
+        # Sondeo multi-destino con quórum
+        self.probe = ProbeEngine(probe_targets or DEFAULT_PROBE_TARGETS, timeout=probe_timeout)
+        self._new_probe_targets: list | None = None
+        self.degraded_interval = degraded_interval
+        self.max_recovery_interval = max_recovery_interval
+        self._recovery_backoff = float(check_interval)
+        self._next_recovery_at = 0.0
+        self.last_probe: ProbeResult | None = None
+        self.detection_latency: float | None = None
+        self._online: bool | None = None
+        self._first_failure_at: float | None = None
+
+        # Eventos de enlace del kernel y socket de control de wpa_supplicant
+        self._wake = threading.Event()
+        self.link = LinkWatcher(wifi_interface, self._on_link_change)
+        self.wpa = WpaCtrl(wifi_interface)
+        # Avisado en cada cambio de enlace/estado (p. ej. MqttClient.set_link_state)
+        self.link_callback = link_callback
+
+        # Historial por SSID para ordenar la reconexión
+        self.network_stats: Dict[str, dict] = network_stats if network_stats is not None else {}
+        self.stats_callback = stats_callback
+        self.connect_timeout = connect_timeout
+        self.stats_persist_interval = stats_persist_interval
+        self._stats_dirty = False
+        self._stats_saved_at = 0.0
 
     def start(self):
         """Starts the monitoring thread."""
@@ -39,6 +102,7 @@ class ConnectivityMonitor:
         
         self.log("▶️ Iniciando monitor de conectividad.")
         self._stop_event.clear()
+        self.link.start()
         self._thread = threading.Thread(target=self._run_monitor, daemon=True)
         self._thread.start()
 
@@ -46,20 +110,88 @@ class ConnectivityMonitor:
         """Stops the monitoring thread."""
         self.log("⏹️ Deteniendo monitor de conectividad.")
         self._stop_event.set()
-        if self._thread:
-            self._thread.join(timeout=2)
+        self._wake.set()
+        self.link.stop()
+        if self._thread and self._thread.is_alive():
+            # El hilo cierra su loop de sondeo y el socket de wpa_supplicant al salir,
+            # aunque siga dentro de una espera de conexión más larga que este join
+            self._thread.join(timeout=self.probe.timeout + 1)
+        else:
+            self.probe.close()
+            self._persist_stats(force=True)
+            self.wpa.close()
+
+    def set_probe_targets(self, targets: Iterable) -> None:
+        """Replace the probe targets; the monitor thread rebuilds its ProbeEngine before the next probe."""
+        self._new_probe_targets = list(targets)
+        self._wake.set()
+
+    def _on_link_change(self, up: bool):
+        """Called from the LinkWatcher thread on every carrier/operstate change: only wakes the loop to re-probe."""
+        if up:
+            self.log(f"🔗 Enlace {self.wifi_interface} activo.")
+        else:
+            self.log(f"⛓️ Enlace {self.wifi_interface} caído.")
+        self._wake.set()
+
+    def _notify_link(self, online: bool):
+        if self.link_callback:
+            try:
+                self.link_callback(online)
+            except Exception as e:
+                self.log(f"⚠️ Error notificando estado de enlace: {e}")
 
     def _is_connected(self) -> bool:
-        """Checks if there is an internet connection."""
-        try:
-            # Connect to Google's DNS as a test
-            socket.create_connection(("8.8.8.8", 53), timeout=3)
-            return True
-        except OSError:
-            return False
+        """Probes all targets concurrently and applies the quorum to decide the state."""
+        targets, self._new_probe_targets = self._new_probe_targets, None
+        if targets is not None:
+            # Solo este hilo usa el loop del ProbeEngine: aquí se puede cerrar sin carreras
+            timeout = self.probe.timeout
+            self.probe.close()
+            self.probe = ProbeEngine(targets, timeout=timeout)
+        result = self.probe.run()
+        self.last_probe = result
+        quorum = self.probe.quorum()
+
+        if result.failures == 0:
+            self._first_failure_at = None
+        elif self._first_failure_at is None:
+            self._first_failure_at = result.started_at
+
+        if self._online is None:
+            online = result.successes >= quorum
+        elif self._online:
+            online = result.failures < quorum
+        else:
+            online = result.successes >= quorum
+
+        if self._online and not online:
+            # Desde el primer sondeo con fallos hasta declarar la caída
+            self.detection_latency = time.monotonic() - self._first_failure_at
+            REGISTRY.observe("connectivity_detect", self.detection_latency)
+            REGISTRY.set_gauge("connectivity_detection_latency_seconds", round(self.detection_latency, 3))
+            self.log(
+                f"⏱️ Caída detectada en {self.detection_latency:.1f}s "
+                f"({result.successes}/{len(result.results)} destinos responden)"
+            )
+        self._online = online
+        REGISTRY.set_gauge("connectivity_online", 1 if online else 0)
+        REGISTRY.set_gauge("connectivity_targets_ok", result.successes)
+        return online
+
+    def _is_degraded(self) -> bool:
+        return not self._online or bool(self.last_probe and self.last_probe.failures)
 
     def _get_current_ssid(self) -> str:
         """Gets the SSID of the current Wi-Fi network."""
+        if self.wpa.available:
+            try:
+                status = self.wpa.status()
+                if status.get("wpa_state") != "COMPLETED":
+                    return "Ninguna"
+                return status.get("ssid") or "Desconocida"
+            except WpaCtrlError:
+                pass
         try:
             # We use iwgetid to get the SSID of the interface
             result = subprocess.run(["iwgetid", "-r", self.wifi_interface], capture_output=True, text=True, check=True)
@@ -69,13 +201,32 @@ class ConnectivityMonitor:
             # If the command fails or is not found, we are not connected to a Wi-Fi network
             return "Ninguna"
 
+    @staticmethod
+    def _wifi_soft_blocked() -> bool | None:
+        """Reads the wlan rfkill switches from sysfs; None if there are none to read."""
+        found = False
+        for path in glob.glob("/sys/class/rfkill/rfkill*"):
+            try:
+                with open(os.path.join(path, "type")) as f:
+                    if f.read().strip() != "wlan":
+                        continue
+                found = True
+                with open(os.path.join(path, "soft")) as f:
+                    if f.read().strip() == "1":
+                        return True
+            except OSError:
+                continue
+        return False if found else None
+
     def _unblock_wifi_rfkill(self):
         try:
-            rfkill_output = subprocess.run(["rfkill", "list", "all"], capture_output=True, text=True)
-            if "Soft blocked: yes" in rfkill_output.stdout:
+            blocked = self._wifi_soft_blocked()
+            if blocked is None:
+                rfkill_output = subprocess.run(["rfkill", "list", "all"], capture_output=True, text=True)
+                blocked = "Soft blocked: yes" in rfkill_output.stdout
+            if blocked:
                 self.log("🔓 Desbloqueando Wi-Fi (rfkill)...")
                 subprocess.run(["sudo", "rfkill", "unblock", "wifi"], check=True)
-                time.sleep(1)
         except Exception as e:
             self.log(f"⚠️ Error en rfkill: {e}")
 
@@ -85,38 +236,142 @@ class ConnectivityMonitor:
         self._unblock_wifi_rfkill()
         try:
             subprocess.run(["sudo", "ip", "link", "set", self.wifi_interface, "down"], check=True)
-            time.sleep(3)
+            self.link.wait_for(False, timeout=3)
             subprocess.run(["sudo", "ip", "link", "set", self.wifi_interface, "up"], check=True)
             self.log("✅ Interfaz reiniciada.")
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, OSError) as e:
             self.log(f"❌ Error reiniciando interfaz: {e}")
 
+    def _wait_online(self, timeout: float) -> bool:
+        """Probes every second until online (DHCP may still be running) or ``timeout``."""
+        deadline = time.monotonic() + timeout
+        while not self._stop_event.is_set():
+            if self._is_connected():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            self._stop_event.wait(1)
+        return False
+
+    def _scan(self, timeout: float = 5) -> Dict[str, int] | None:
+        """One scan over the control socket: ``{ssid: dBm}``, or None if unavailable."""
+        try:
+            with self.wpa.events() as events:
+                reply = self.wpa.request("SCAN")
+                if reply not in ("OK", "FAIL-BUSY"):
+                    return None
+                events.wait(("CTRL-EVENT-SCAN-RESULTS",), timeout)
+            return parse_scan_results(self.wpa.request("SCAN_RESULTS"))
+        except WpaCtrlError:
+            return None
+
+    def _wpa_network_id(self, ssid: str) -> str | None:
+        """Id of an already configured network with this SSID (LIST_NETWORKS)."""
+        for line in self.wpa.request("LIST_NETWORKS").splitlines()[1:]:
+            parts = line.split("\t")
+            if len(parts) >= 2 and parts[1] == ssid:
+                return parts[0]
+        return None
+
+    def _wpa_connect(self, ssid: str, password: str, timeout: float = 15) -> bool:
+        """Selects the network over the control socket and waits for CTRL-EVENT-CONNECTED.
+
+        Networks already configured in wpa_supplicant are reused (only the
+        credentials are refreshed) instead of wiping them all."""
+        with self.wpa.events() as events:
+            net_id = self._wpa_network_id(ssid)
+            if net_id is None:
+                net_id = self.wpa.request("ADD_NETWORK")
+                if not net_id.isdigit():
+                    raise WpaCtrlError(f"ADD_NETWORK → {net_id}")
+                self.wpa.command(f'SET_NETWORK {net_id} ssid "{ssid}"')
+            if password:
+                self.wpa.command(f'SET_NETWORK {net_id} psk "{password}"')
+            else:
+                self.wpa.command(f"SET_NETWORK {net_id} key_mgmt NONE")
+            self.wpa.command(f"ENABLE_NETWORK {net_id}")
+            self.wpa.command(f"SELECT_NETWORK {net_id}")
+
+            self.log(f"⏳ Esperando conexión a {ssid}...")
+            event = events.wait(
+                ("CTRL-EVENT-CONNECTED", "CTRL-EVENT-SSID-TEMP-DISABLED", "CTRL-EVENT-NETWORK-NOT-FOUND"),
+                timeout,
+            )
+        if event is None:
+            self.log(f"⌛ {ssid}: sin asociación tras {timeout}s.")
+            return False
+        if not event.startswith("CTRL-EVENT-CONNECTED"):
+            self.log(f"❌ {ssid}: {event}")
+            return False
+        return True
+
+    def _wpa_cli_connect(self, ssid: str, password: str) -> None:
+        subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "remove_network", "all"], stdout=subprocess.DEVNULL)
+        net_id_output = subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "add_network"], check=True, capture_output=True, text=True)
+        net_id = net_id_output.stdout.strip()
+
+        subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "set_network", net_id, "ssid", f'"{ssid}"'], check=True)
+        subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "set_network", net_id, "psk", f'"{password}"'], check=True)
+        subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "enable_network", net_id], check=True)
+        subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "select_network", net_id], check=True)
+        self.log(f"⏳ Esperando conexión a {ssid}...")
+
+    def _record_attempt(self, ssid: str, ok: bool, seconds: float | None = None):
+        entry = record_attempt(self.network_stats, ssid, ok, seconds)
+        # Sin etiqueta de SSID: el detalle por red ya está en network_stats
+        REGISTRY.observe("wifi_connect", seconds or 0.0, ok=ok)
+        self._stats_dirty = True
+        self._persist_stats(force=ok)
+        return entry
+
+    def _persist_stats(self, force: bool = False):
+        """Hand the history to ``stats_callback`` if it changed and the persist interval elapsed (or ``force``)."""
+        if not self._stats_dirty or not self.stats_callback:
+            return
+        now = time.monotonic()
+        if not force and now - self._stats_saved_at < self.stats_persist_interval:
+            return
+        self._stats_dirty = False
+        self._stats_saved_at = now
+        try:
+            self.stats_callback(self.network_stats)
+        except Exception as e:
+            self.log(f"⚠️ Error guardando historial de redes: {e}")
+
     def _connect_to_known_networks(self) -> bool:
-        """Tries to connect to one of the known Wi-Fi networks."""
+        """Tries the known Wi-Fi networks in ranked order."""
         if not self.known_networks:
             return False
-            
-        for ssid, password in self.known_networks.items():
-            self.log(f"📶 Intentando conectar a la red: {ssid}...")
-            try:
-                subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "remove_network", "all"], stdout=subprocess.DEVNULL)
-                net_id_output = subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "add_network"], check=True, capture_output=True, text=True)
-                net_id = net_id_output.stdout.strip()
 
-                subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "set_network", net_id, "ssid", f'"{ssid}"'], check=True)
-                subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "set_network", net_id, "psk", f'"{password}"'], check=True)
-                subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "enable_network", net_id], check=True)
-                subprocess.run(["sudo", "wpa_cli", "-i", self.wifi_interface, "select_network", net_id], check=True)
+        visible = self._scan()
+        order = rank_networks(self.known_networks, self.network_stats, visible)
+        if visible is not None:
+            self.log(f"📡 Redes conocidas visibles: {[s for s in order if s in visible] or 'ninguna'}")
 
-                self.log(f"⏳ Esperando conexión a {ssid}...")
-                time.sleep(15) # Give time for the connection to be established
+        for ssid in order:
+            if self._stop_event.is_set():
+                return False
+            password = self.known_networks[ssid]
+            self.log(f"📶 Intentando conectar a la red: {ssid}...")
+            started = time.monotonic()
+            try:
+                try:
+                    associated = self._wpa_connect(ssid, password, self.connect_timeout)
+                except WpaCtrlError as e:
+                    self.log(f"⚠️ Socket de control wpa_supplicant no disponible ({e}), usando wpa_cli.")
+                    self._wpa_cli_connect(ssid, password)
+                    associated = True
 
-                if self._is_connected():
+                if associated and self._wait_online(self.connect_timeout):
+                    elapsed = time.monotonic() - started
+                    self._record_attempt(ssid, True, elapsed)
                     self.status_callback and self.status_callback(True, ssid)
-                    self.log(f"✅ Conectado a {ssid}.")
+                    self.log(f"✅ Conectado a {ssid} en {elapsed:.1f}s.")
                     return True
+                self._record_attempt(ssid, False)
             except subprocess.CalledProcessError as e:
                 self.log(f"❌ Falló el comando de conexión a {ssid}: {e}")
+                self._record_attempt(ssid, False)
         return False
 
     def _restart_device(self):
@@ -125,36 +380,61 @@ class ConnectivityMonitor:
         os.system("sudo reboot")
 
     def _run_monitor(self):
-        """Main monitoring loop."""
+        """Main monitoring loop (owns the probe's event loop and the wpa socket, and closes them on exit)."""
+        try:
+            self._monitor_loop()
+        finally:
+            self.probe.close()
+            self.wpa.close()
+            self._persist_stats(force=True)
+
+    def _monitor_loop(self):
         while not self._stop_event.is_set():
+            self._wake.clear()
             if self._is_connected():
                 current_ssid = self._get_current_ssid()
                 # Notify only if the status or SSID has changed
                 if self._last_status is not True or self._last_ssid != current_ssid:
                     self.log("✅ Conexión a Internet activa.")
+                    if self._last_status is not True:
+                        self._notify_link(True)
                     if self.status_callback:
                         self.status_callback(True, current_ssid)
                     self._last_status = True
                     self._last_ssid = current_ssid
                 if self.disconnected_time > 0:
                     self.disconnected_time = 0 # Reset counter only if coming from a disconnected state
+                self._offline_since = None
+                self._recovery_backoff = float(self.check_interval)
+                self._next_recovery_at = 0.0
             else:
                 if self._last_status is not False:
                     self.log("⚠️ Sin conexión a Internet.")
+                    self._notify_link(False)
                     if self.status_callback:
                         self.status_callback(False, "Ninguna")
                     self._last_status = False
                     self._last_ssid = "Ninguna"
 
-                self.disconnected_time += self.check_interval
-                if not self._connect_to_known_networks():
-                    self._restart_wifi_interface()
+                # Tiempo real sin conexión (los chequeos degradados son más frecuentes)
+                now = time.monotonic()
+                if self._offline_since is None:
+                    self._offline_since = now
+                self.disconnected_time = now - self._offline_since
+                # El ritmo degradado es solo para sondear: la recuperación espera su turno
+                if now >= self._next_recovery_at:
+                    if not self._connect_to_known_networks():
+                        self._restart_wifi_interface()
+                    self._next_recovery_at = time.monotonic() + self._recovery_backoff
+                    self._recovery_backoff = min(self._recovery_backoff * 2, self.max_recovery_interval)
                 
                 if self.disconnected_time >= self.reboot_timeout:
                     self._restart_device()
                     break # Exit the loop after ordering the reboot
             
-            self._stop_event.wait(self.check_interval)
+            self._persist_stats()
+            # Un evento de enlace despierta el bucle antes de tiempo
+            self._wake.wait(self.degraded_interval if self._is_degraded() else self.check_interval)
 
 if __name__ == '__main__':
     # Example usage
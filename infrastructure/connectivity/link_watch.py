@@ -0,0 +1,105 @@
+import os
+import select
+import socket
+import threading
+from typing import Callable, Optional
+
+# Grupos multicast de rtnetlink (linux/rtnetlink.h)
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+
+
+class LinkWatcher:
+    """
+    Watches the link state of a network interface without forking.
+
+    Subscribes to rtnetlink link/address notifications and, on every event,
+    re-reads ``/sys/class/net/<if>/operstate`` and ``carrier``. Where netlink
+    is not available it falls back to polling sysfs every ``poll_interval``
+    seconds. ``on_change(up)`` is called from the watcher thread.
+    """
+
+    def __init__(self, interface: str, on_change: Callable[[bool], None], poll_interval: float = 2.0):
+        self.interface = interface
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._sysfs = os.path.join("/sys/class/net", interface)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._cond = threading.Condition()
+        self._state: Optional[bool] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._state = self.is_up()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def is_up(self) -> Optional[bool]:
+        """True/False from sysfs, or None when the interface does not exist here."""
+        try:
+            with open(os.path.join(self._sysfs, "operstate")) as f:
+                operstate = f.read().strip()
+        except OSError:
+            return None
+        if operstate == "up":
+            return True
+        if operstate in ("unknown", "dormant"):
+            try:
+                with open(os.path.join(self._sysfs, "carrier")) as f:
+                    return f.read().strip() == "1"
+            except OSError:
+                return False
+        return False
+
+    def wait_for(self, up: bool, timeout: float) -> bool:
+        """Block until the link reaches the given state or ``timeout`` expires."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._refresh() == up, timeout=timeout)
+
+    def _refresh(self) -> Optional[bool]:
+        state = self.is_up()
+        self._state = state
+        return state
+
+    def _open_netlink(self) -> Optional[socket.socket]:
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+            return sock
+        except (AttributeError, OSError):
+            return None
+
+    def _run(self) -> None:
+        sock = self._open_netlink()
+        try:
+            while not self._stop_event.is_set():
+                if sock is not None:
+                    ready, _, _ = select.select([sock], [], [], self.poll_interval)
+                    if ready:
+                        try:
+                            sock.recv(65536)  # solo nos interesa que algo cambió
+                        except OSError:
+                            pass
+                else:
+                    self._stop_event.wait(self.poll_interval)
+
+                with self._cond:
+                    previous = self._state
+                    state = self._refresh()
+                    self._cond.notify_all()
+                if state is not None and state != previous:
+                    try:
+                        self.on_change(state)
+                    except Exception as e:
+                        print(f"⚠️ LinkWatcher callback error: {e}")
+        finally:
+            if sock is not None:
+                sock.close()
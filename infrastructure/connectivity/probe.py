@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Iterable, List, Optional, Tuple
+
+Target = Tuple[str, int]
+
+DEFAULT_PROBE_TARGETS: List[Target] = [("8.8.8.8", 53), ("1.1.1.1", 53)]
+
+
+def parse_targets(raw: Optional[Iterable]) -> List[Target]:
+    """Accept ``["host:port", ...]`` or ``[[host, port], ...]`` from gateway.json."""
+    targets: List[Target] = []
+    for item in raw or []:
+        try:
+            if isinstance(item, str):
+                host, port = item.rsplit(":", 1)
+            else:
+                host, port = item
+            targets.append((str(host), int(port)))
+        except (TypeError, ValueError):
+            continue
+    return targets
+
+
+class ProbeResult:
+    __slots__ = ("results", "successes", "failures", "started_at", "duration")
+
+    def __init__(self, results: List[Tuple[Target, bool, float]], started_at: float, duration: float):
+        self.results = results
+        self.successes = sum(1 for _, ok, _ in results if ok)
+        self.failures = len(results) - self.successes
+        self.started_at = started_at
+        self.duration = duration
+
+
+class ProbeEngine:
+    """
+    Opens TCP connections to several targets concurrently (one short-lived
+    event loop owned by the caller thread) and reports how many answered.
+    """
+
+    def __init__(self, targets: Iterable[Target], timeout: float = 2.0):
+        self.targets: List[Target] = list(dict.fromkeys(targets))
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def quorum(self) -> int:
+        """Majority of the configured targets."""
+        return len(self.targets) // 2 + 1 if self.targets else 1
+
+    def run(self) -> ProbeResult:
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        started = time.monotonic()
+        results = self._loop.run_until_complete(self._probe_all())
+        return ProbeResult(results, started, time.monotonic() - started)
+
+    def close(self) -> None:
+        if self._loop and not self._loop.is_closed():
+            self._loop.close()
+        self._loop = None
+
+    async def _probe_all(self) -> List[Tuple[Target, bool, float]]:
+        return list(await asyncio.gather(*(self._probe(t) for t in self.targets)))
+
+    async def _probe(self, target: Target) -> Tuple[Target, bool, float]:
+        t0 = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(*target), timeout=self.timeout)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return target, True, time.monotonic() - t0
+        except (OSError, asyncio.TimeoutError):
+            return target, False, time.monotonic() - t0
@@ -0,0 +1,82 @@
+import time
+from typing import Dict, List, Optional
+
+# Ventana para tiempos de conexión (media móvil exponencial)
+CONNECT_TIME_ALPHA = 0.3
+MAX_CONNECT_TIME = 15.0
+
+
+def parse_scan_results(raw: str) -> Dict[str, int]:
+    """
+    Parse wpa_supplicant ``SCAN_RESULTS`` (``bssid / frequency / signal level /
+    flags / ssid``) into ``{ssid: best signal dBm}``.
+    """
+    visible: Dict[str, int] = {}
+    for line in raw.splitlines()[1:]:
+        parts = line.split("\t")
+        if len(parts) < 5 or not parts[4]:
+            continue
+        try:
+            signal = int(parts[2])
+        except ValueError:
+            continue
+        ssid = parts[4]
+        if ssid not in visible or signal > visible[ssid]:
+            visible[ssid] = signal
+    return visible
+
+
+def score_network(ssid: str, stats: Dict[str, dict], visible: Optional[Dict[str, int]], last_good: Optional[str]) -> float:
+    """
+    Score in [0, 105]: signal strength (40), smoothed success rate (40),
+    time-to-connect (10) and a bonus for the last network that worked (15).
+    Without scan data signal counts as neutral.
+    """
+    s = stats.get(ssid) or {}
+    attempts = s.get("attempts", 0)
+    successes = s.get("successes", 0)
+    success_rate = (successes + 1) / (attempts + 2)
+
+    if visible is None or ssid not in visible:
+        signal_score = 0.5
+    else:
+        signal_score = min(max(visible[ssid] + 100, 0), 70) / 70
+
+    avg = s.get("avgConnectS")
+    time_score = 0.5 if avg is None else 1 - min(avg, MAX_CONNECT_TIME) / MAX_CONNECT_TIME
+
+    score = 40 * signal_score + 40 * success_rate + 10 * time_score
+    if ssid == last_good:
+        score += 15
+    return score
+
+
+def rank_networks(known: Dict[str, str], stats: Dict[str, dict], visible: Optional[Dict[str, int]] = None) -> List[str]:
+    """Order known SSIDs for reconnection: visible networks first, then by score."""
+    last_good = last_good_network(stats, known)
+    return sorted(
+        known,
+        key=lambda ssid: (
+            visible is not None and ssid not in visible,
+            -score_network(ssid, stats, visible, last_good),
+        ),
+    )
+
+
+def last_good_network(stats: Dict[str, dict], known: Dict[str, str]) -> Optional[str]:
+    candidates = [(s.get("lastGood", 0), ssid) for ssid, s in stats.items() if ssid in known and s.get("lastGood")]
+    return max(candidates)[1] if candidates else None
+
+
+def record_attempt(stats: Dict[str, dict], ssid: str, ok: bool, seconds: Optional[float] = None) -> dict:
+    """Update the per-SSID history in place and return the entry."""
+    s = stats.setdefault(ssid, {"attempts": 0, "successes": 0})
+    s["attempts"] = s.get("attempts", 0) + 1
+    if ok:
+        s["successes"] = s.get("successes", 0) + 1
+        s["lastGood"] = int(time.time())
+        if seconds is not None:
+            prev = s.get("avgConnectS")
+            avg = seconds if prev is None else (1 - CONNECT_TIME_ALPHA) * prev + CONNECT_TIME_ALPHA * seconds
+            s["avgConnectS"] = round(avg, 2)
+    return s
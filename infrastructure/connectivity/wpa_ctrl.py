@@ -0,0 +1,158 @@
+import itertools
+import os
+import select
+import socket
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+DEFAULT_CTRL_DIR = "/var/run/wpa_supplicant"
+
+
+class WpaCtrlError(Exception):
+    """The wpa_supplicant control socket is unavailable or a command failed."""
+
+
+class WpaCtrl:
+    """
+    Minimal client for the wpa_supplicant control interface (the same
+    datagram socket wpa_cli uses), so the monitor can query status and manage
+    networks without forking a process per command.
+    """
+
+    _counter = itertools.count()
+
+    def __init__(self, interface: str, ctrl_dir: str = DEFAULT_CTRL_DIR):
+        self.interface = interface
+        self.path = os.path.join(ctrl_dir, interface)
+        self._sock: Optional[socket.socket] = None
+        self._local: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _open(self):
+        if not self.available:
+            raise WpaCtrlError(f"socket de control no encontrado: {self.path}")
+        local = f"/tmp/wpa_ctrl_{os.getpid()}-{next(self._counter)}"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            try:
+                os.unlink(local)
+            except FileNotFoundError:
+                pass
+            sock.bind(local)
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            try:
+                os.unlink(local)
+            except OSError:
+                pass
+            raise WpaCtrlError(f"no se pudo abrir {self.path}: {e}") from e
+        return sock, local
+
+    @staticmethod
+    def _close(sock: Optional[socket.socket], local: Optional[str]) -> None:
+        if sock:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        if local:
+            try:
+                os.unlink(local)
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._close(self._sock, self._local)
+            self._sock = self._local = None
+
+    def request(self, command: str, timeout: float = 3.0) -> str:
+        """Send a command and return its reply (unsolicited events are skipped)."""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock, self._local = self._open()
+                self._sock.send(command.encode("utf-8"))
+                deadline = time.monotonic() + timeout
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise WpaCtrlError(f"timeout esperando respuesta a {command.split()[0]}")
+                    ready, _, _ = select.select([self._sock], [], [], remaining)
+                    if not ready:
+                        continue
+                    reply = self._sock.recv(8192).decode("utf-8", errors="replace")
+                    if reply.startswith("<"):
+                        continue
+                    return reply.strip()
+            except OSError as e:
+                self._close(self._sock, self._local)
+                self._sock = self._local = None
+                raise WpaCtrlError(str(e)) from e
+
+    def command(self, command: str, timeout: float = 3.0) -> None:
+        """Send a command that must answer ``OK``."""
+        reply = self.request(command, timeout)
+        if reply != "OK":
+            raise WpaCtrlError(f"{command.split()[0]} → {reply}")
+
+    def status(self) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        for line in self.request("STATUS").splitlines():
+            key, sep, value = line.partition("=")
+            if sep:
+                out[key] = value
+        return out
+
+    def events(self) -> "WpaEvents":
+        return WpaEvents(self)
+
+
+class WpaEvents:
+    """Attached control connection used to wait for wpa_supplicant events."""
+
+    def __init__(self, ctrl: WpaCtrl):
+        self.ctrl = ctrl
+        self._sock: Optional[socket.socket] = None
+        self._local: Optional[str] = None
+
+    def __enter__(self) -> "WpaEvents":
+        self._sock, self._local = self.ctrl._open()
+        self._sock.send(b"ATTACH")
+        ready, _, _ = select.select([self._sock], [], [], 3.0)
+        if not ready or self._sock.recv(64).strip() != b"OK":
+            self.__exit__(None, None, None)
+            raise WpaCtrlError("ATTACH rechazado")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._sock:
+            try:
+                self._sock.send(b"DETACH")
+            except OSError:
+                pass
+        WpaCtrl._close(self._sock, self._local)
+        self._sock = self._local = None
+
+    def wait(self, prefixes: Iterable[str], timeout: float) -> Optional[str]:
+        """Block until an event starting with one of ``prefixes`` arrives, or ``timeout``."""
+        prefixes = tuple(prefixes)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            ready, _, _ = select.select([self._sock], [], [], remaining)
+            if not ready:
+                continue
+            msg = self._sock.recv(8192).decode("utf-8", errors="replace").strip()
+            # Formato: "<3>CTRL-EVENT-CONNECTED - Connection to ..."
+            event = msg.split(">", 1)[1] if msg.startswith("<") else msg
+            if event.startswith(prefixes):
+                return event
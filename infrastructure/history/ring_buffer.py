@@ -0,0 +1,227 @@
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAGIC = b"GWRING1\0"
+HEADER_SIZE = 32  # magic + capacity, head, count (uint64)
+RECORD_SIZE = 16  # timestamp, value (float64)
+
+
+class SignalRing:
+    """
+    Fixed-size ring of ``(timestamp, value)`` float64 pairs in a memory-mapped
+    file. Samples are written in place through typed memoryviews, so appending
+    allocates nothing and the history survives restarts; resident memory is
+    only the pages the kernel keeps cached.
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        size = HEADER_SIZE + capacity * RECORD_SIZE
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fresh = True
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            with open(path, "rb") as f:
+                head = f.read(16)
+            fresh = head[:8] != MAGIC or int.from_bytes(head[8:16], sys.byteorder) != capacity
+
+        self._file = open(path, "w+b" if fresh else "r+b")
+        if fresh:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._hdr = memoryview(self._mm)[8:HEADER_SIZE].cast("Q")
+        self._data = memoryview(self._mm)[HEADER_SIZE:].cast("d")
+        if fresh:
+            self._mm[:8] = MAGIC
+            self._hdr[0], self._hdr[1], self._hdr[2] = capacity, 0, 0
+        self._lock = threading.Lock()
+        self.last_ts = self._data[2 * ((self._hdr[1] - 1) % capacity)] if self._hdr[2] else 0.0
+
+    def __len__(self) -> int:
+        return self._hdr[2]
+
+    def append(self, ts: float, value: float) -> None:
+        with self._lock:
+            i = self._hdr[1]
+            self._data[2 * i] = ts
+            self._data[2 * i + 1] = value
+            # Datos antes que cabecera: un lector concurrente nunca ve un hueco
+            self._hdr[1] = (i + 1) % self.capacity
+            if self._hdr[2] < self.capacity:
+                self._hdr[2] += 1
+            self.last_ts = ts
+
+    def _slot(self, k: int) -> int:
+        """Physical slot of the k-th oldest sample."""
+        return (self._hdr[1] - self._hdr[2] + k) % self.capacity
+
+    def _first_at_or_after(self, ts: float) -> int:
+        lo, hi = 0, self._hdr[2]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._data[2 * self._slot(mid)] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Samples with ``start <= ts <= end``, oldest first."""
+        with self._lock:
+            out = []
+            for k in range(self._first_at_or_after(start), self._hdr[2]):
+                s = 2 * self._slot(k)
+                ts = self._data[s]
+                if ts > end:
+                    break
+                out.append((ts, self._data[s + 1]))
+            return out
+
+    def downsample(self, start: float, end: float, buckets: int) -> List[List[float]]:
+        """``[bucket_start, mean, min, max, count]`` per non-empty bucket of the range."""
+        width = max((end - start) / max(buckets, 1), 1e-9)
+        out: List[List[float]] = []
+        current = None
+        for ts, value in self.range(start, end):
+            b = min(int((ts - start) / width), buckets - 1)
+            if current is None or current[0] != b:
+                current = [b, 0.0, value, value, 0]
+                out.append(current)
+            current[1] += value
+            current[2] = min(current[2], value)
+            current[3] = max(current[3], value)
+            current[4] += 1
+        return [
+            [round(start + b * width, 3), total / n, lo, hi, n]
+            for b, total, lo, hi, n in out
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._hdr.release()
+            self._data.release()
+            self._mm.flush()
+            self._mm.close()
+            self._file.close()
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(name)) or "_"
+
+
+class HistoryStore:
+    """
+    Per device/signal rings of numeric samples (``data/history/<serial>/<signal>.ring``).
+
+    Keeps at most one sample per ``period`` seconds over a ``window`` of
+    seconds, i.e. ``window / period`` slots of 16 bytes per signal. Signals
+    are keyed by name across groups; non-numeric values are not recorded.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        window: float = 3600.0,
+        period: float = 1.0,
+        signals: Optional[List[str]] = None,
+        log: Optional[Callable[[str], None]] = None,
+    ):
+        self.directory = directory
+        self.window = float(window)
+        self.period = float(period)
+        self.capacity = max(int(self.window / self.period), 1)
+        self.signals = set(signals) if signals else None
+        self.log = log or (lambda msg: print(msg))
+        self._rings: Dict[Tuple[str, str], SignalRing] = {}
+        self._failed: set = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, directory: str, cfg: Optional[Dict[str, Any]], log=None) -> Optional["HistoryStore"]:
+        """Build from gateway.json ``history`` (``windowS``, ``periodS``, ``signals``, ``enabled``)."""
+        cfg = cfg or {}
+        if cfg.get("enabled") is False:
+            return None
+        return cls(directory, cfg.get("windowS", 3600), cfg.get("periodS", 1.0), cfg.get("signals"), log)
+
+    def _path(self, serial: str, signal: str) -> str:
+        return os.path.join(self.directory, _safe(serial), f"{_safe(signal)}.ring")
+
+    def _ring(self, serial: str, signal: str, create: bool = True) -> Optional[SignalRing]:
+        key = (serial, signal)
+        ring = self._rings.get(key)
+        if ring is not None or key in self._failed:
+            return ring
+        path = self._path(serial, signal)
+        if not create and not os.path.exists(path):
+            return None
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is None:
+                try:
+                    ring = SignalRing(path, self.capacity)
+                except (OSError, ValueError) as e:
+                    self.log(f"⚠️ Historial: no se pudo abrir {path}: {e}")
+                    self._failed.add(key)
+                    return None
+                self._rings[key] = ring
+            return ring
+
+    def record(self, serial: str, results: Dict[str, Any], ts: Optional[float] = None) -> None:
+        """Append the numeric values of one published group."""
+        ts = time.time() if ts is None else ts
+        for name, entry in results.items():
+            value = entry.get("value") if isinstance(entry, dict) else entry
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if self.signals is not None and name not in self.signals:
+                continue
+            ring = self._ring(serial, name)
+            if ring is not None and ts - ring.last_ts >= self.period:
+                ring.append(ts, value)
+
+    def available(self, serial: str) -> List[str]:
+        """Signals with history for ``serial`` (including rings from previous runs)."""
+        names = {s for (d, s) in self._rings if d == serial}
+        try:
+            names.update(f[:-5] for f in os.listdir(os.path.join(self.directory, _safe(serial))) if f.endswith(".ring"))
+        except OSError:
+            pass
+        return sorted(names)
+
+    def query(
+        self,
+        serial: str,
+        signal: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        buckets: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Raw samples (``points: [[ts, value], ...]``) or, with ``buckets``, the
+        downsampled series (``buckets: [[ts, mean, min, max, n], ...]``).
+        """
+        end = time.time() if end is None else float(end)
+        start = end - self.window if start is None else float(start)
+        out: Dict[str, Any] = {"serial": serial, "signal": signal, "start": start, "end": end}
+        ring = self._ring(serial, signal, create=False)
+        if ring is None:
+            out["error"] = "sin historial"
+            return out
+        if buckets:
+            out["buckets"] = ring.downsample(start, end, int(buckets))
+        else:
+            out["points"] = [[ts, v] for ts, v in ring.range(start, end)]
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
@@ -0,0 +1,119 @@
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# Campos que los drives usan para identificar y fechar un evento de /evt/lst
+ID_KEYS = ("id", "evtId", "eventId", "idx", "seq")
+TIME_KEYS = ("ts", "timestamp", "time", "date")
+LIST_KEYS = ("events", "evt", "lst", "list", "data", "items")
+
+
+def extract_events(body: Any) -> List[Dict[str, Any]]:
+    """Return the event list of an ``/evt/lst`` response (bare list or wrapped)."""
+    if isinstance(body, list):
+        return [e for e in body if isinstance(e, dict)]
+    if isinstance(body, dict):
+        for key in LIST_KEYS:
+            if isinstance(body.get(key), list):
+                return [e for e in body[key] if isinstance(e, dict)]
+    return []
+
+
+def _first(event: Dict[str, Any], keys) -> Any:
+    for key in keys:
+        if event.get(key) is not None:
+            return event[key]
+    return None
+
+
+def _ordinal(value: Any) -> tuple:
+    """Sort key: numbers (or numeric strings) as floats, then anything else as text."""
+    try:
+        return (0, float(value))
+    except (TypeError, ValueError):
+        return (1, str(value))
+
+
+def event_key(event: Dict[str, Any]) -> str:
+    event_id = _first(event, ID_KEYS)
+    if event_id is not None:
+        return str(event_id)
+    return json.dumps(event, sort_keys=True, default=str)
+
+
+class FaultSync:
+    """
+    Incremental sync cursor for one device's fault log.
+
+    Keeps the last event ID/timestamp seen, the validators of the last
+    response (``ETag`` / ``Last-Modified``) and a bounded set of recent event
+    keys. ``request()`` returns the conditional headers and the ``since``
+    filter for the next fetch; ``apply()`` takes the response and returns only
+    the events not seen before. Filtering is always repeated locally, so a
+    drive that ignores ``since`` or the validators costs bandwidth, never
+    duplicates.
+    """
+
+    def __init__(self, cursor: Optional[Dict[str, Any]] = None, recent: int = 256):
+        cursor = cursor or {}
+        self.last_id = cursor.get("lastId")
+        self.last_ts = cursor.get("lastTs")
+        self.etag: Optional[str] = cursor.get("etag")
+        self.last_modified: Optional[str] = cursor.get("lastModified")
+        self._recent: deque = deque(cursor.get("recent") or [], maxlen=recent)
+        self.dirty = False
+
+    def request(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        headers, params = {}, {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        if self.last_id is not None:
+            params["since"] = str(self.last_id)
+        return headers, params
+
+    def apply(self, status: int, headers: Dict[str, str], body: Any) -> List[Dict[str, Any]]:
+        """Update the cursor from a response and return the new events, oldest first."""
+        if status != 200:  # 304: nada nuevo desde el último validador
+            return []
+        etag, modified = headers.get("ETag"), headers.get("Last-Modified")
+        if (etag, modified) != (self.etag, self.last_modified):
+            self.etag, self.last_modified = etag, modified
+            self.dirty = True
+
+        events = [e for e in extract_events(body) if self._is_new(e)]
+        events.sort(key=lambda e: _ordinal(_first(e, TIME_KEYS) or _first(e, ID_KEYS) or 0))
+        for event in events:
+            self._advance(event)
+        return events
+
+    def _is_new(self, event: Dict[str, Any]) -> bool:
+        if event_key(event) in self._recent:
+            return False
+        event_id = _first(event, ID_KEYS)
+        if event_id is not None and self.last_id is not None:
+            return _ordinal(event_id) > _ordinal(self.last_id)
+        ts = _first(event, TIME_KEYS)
+        if ts is not None and self.last_ts is not None:
+            # Mismo timestamp que el cursor: lo descarta el conjunto de recientes
+            return _ordinal(ts) >= _ordinal(self.last_ts)
+        return True
+
+    def _advance(self, event: Dict[str, Any]) -> None:
+        self._recent.append(event_key(event))
+        event_id, ts = _first(event, ID_KEYS), _first(event, TIME_KEYS)
+        if event_id is not None and (self.last_id is None or _ordinal(event_id) > _ordinal(self.last_id)):
+            self.last_id = event_id
+        if ts is not None and (self.last_ts is None or _ordinal(ts) > _ordinal(self.last_ts)):
+            self.last_ts = ts
+        self.dirty = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lastId": self.last_id,
+            "lastTs": self.last_ts,
+            "etag": self.etag,
+            "lastModified": self.last_modified,
+            "recent": list(self._recent),
+        }
@@ -1,36 +1,108 @@
-import asyncio, threading, aiohttp
+import asyncio, threading, time, aiohttp
 from typing import Optional
 
-class HttpClient:
-    def __init__(self, app,  on_http_read_callback, log):
-        self.app = app
-        self.log = log
-        self.on_http_read_callback = on_http_read_callback
-        self.running = False
+from infrastructure.codec import json_codec
+from infrastructure.http.fault_sync import FaultSync
+from infrastructure.metrics.metrics import REGISTRY
+from infrastructure.modbus.poll_health import PollHealth
+
+
+class SharedHttp:
+    """
+    One event loop thread and one ``ClientSession``/``TCPConnector`` shared
+    by every HttpClient in the process. The connector keeps connections
+    alive and caps them per host so one slow drive can't starve the rest.
+    """
+
+    def __init__(self, limit: int = 64, limit_per_host: int = 4, keepalive_timeout: float = 30.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
         self.loop: Optional[asyncio.AbstractEventLoop] = None
-        self._loop_thread: Optional[threading.Thread] = None
+        self._thread: Optional[threading.Thread] = None
         self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = threading.Lock()
 
+    def ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None or self.loop.is_closed() or not self.alive():
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, args=(self.loop,), daemon=True)
+                self._thread.start()
+            return self.loop
 
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            # Cerrar en el mismo hilo que lo ejecutó, una vez detenido
+            loop.close()
 
-    # === loop & session ===
-    def _start_loop(self):
-        if self.loop: return
-        self.loop = asyncio.new_event_loop()
-        self._loop_thread = threading.Thread(
-            target=lambda: (asyncio.set_event_loop(self.loop), self.loop.run_forever()),
-            daemon=True
-        )
-        self._loop_thread.start()
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
 
-    async def _ensure_session(self):
+    async def session(self) -> aiohttp.ClientSession:
+        """Must run on the shared loop."""
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
         return self._session
 
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.ensure_loop())
+
     async def _close(self):
         if self._session and not self._session.closed:
             await self._session.close()
+        self._session = None
+
+    def shutdown(self, timeout: float = 3.0) -> None:
+        if not self.alive():
+            return
+        try:
+            self.submit(self._close()).result(timeout=timeout)
+        except Exception:
+            pass
+        with self._lock:
+            loop, thread = self.loop, self._thread
+            self.loop = None
+            self._thread = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+
+
+SHARED_HTTP = SharedHttp()
+
+
+class HttpClient:
+    def __init__(
+        self, app,  on_http_read_callback, log, shared: SharedHttp = SHARED_HTTP,
+        on_faults=None, fault_cursor: Optional[dict] = None, fault_interval: float = 30.0,
+    ):
+        self.app = app
+        self.log = log
+        self.on_http_read_callback = on_http_read_callback
+        self.running = False
+        self.shared = shared
+        self._poll_future = None
+        self.interval = 1
+        self.endpoints: dict[str, str] = {}
+        self.health = PollHealth(log=log, name="HTTP")
+        self.transport = "http"
+        self._labels = {"device": getattr(app, "serial", None), "transport": self.transport}
+
+        # Historial de fallas incremental (/evt/lst)
+        self.on_faults = on_faults
+        self.fault_sync = FaultSync(fault_cursor)
+        self.fault_interval = fault_interval
+        self._fault_future = None
 
     # === public api ===
     def connect(self, base_url: str, interval: int = 1):
@@ -43,53 +115,165 @@ class HttpClient:
         }
         self.faultEndpoint = f'{self.base_url}/evt/lst'
 
+    def start(self) -> None:
+        if self.running:
+            return
+        if not self.endpoints:
+            self.log('⚠️ HTTP sin base_url configurada.')
+            return
+        self.running = True
+        self.health.reset(list(self.endpoints))
+        self._poll_future = self.shared.submit(self._poll_loop())
+        self.log(f'▶️ HTTP polling {self.base_url} cada {self.interval}s')
+
+    def stop(self) -> None:
+        self.running = False
+        self._cancel(self._poll_future)
+        self._poll_future = None
+
+    @staticmethod
+    def _cancel(future) -> None:
+        if future is None or future.done():
+            return
+        try:
+            future.cancel()
+        except RuntimeError:
+            pass  # loop ya cerrado por SharedHttp.shutdown(): la tarea murió con él
+
     def stop_continuous_read(self) -> None:
         if not self.running:
             self.log('⚠️ HTTP polling is not running.')
             return
-        self.running = False
-        fut = asyncio.run_coroutine_threadsafe(self._close(), self.loop)
-        fut.result(timeout=3)
+        self.stop()
         self.log('⏹️ Async HTTP polling stopped.')
 
-    async def read_fault_history(self) -> dict | None:
-        session = await self._ensure_session()
-        return await self._fetch(session, self.faultEndpoint)
+    def update_config(self, base_url: str, interval: Optional[float] = None) -> bool:
+        if not self.endpoints:
+            return False  # aún sin usar: el dueño llama a connect() con la URL vigente
+        if base_url.rstrip('/') == getattr(self, 'base_url', None) and interval in (None, self.interval):
+            return False
+        was_running = self.running
+        was_syncing = self._fault_future is not None
+        self.stop()
+        self.stop_fault_sync()
+        self.connect(base_url, interval if interval is not None else self.interval)
+        if was_running:
+            self.start()
+        if was_syncing:
+            self.start_fault_sync()
+        return True
 
-    def read_fault_history_sync(self) -> dict | None:
-        self._start_loop()
-        fut = asyncio.run_coroutine_threadsafe(self.read_fault_history(), self.loop)
+    def start_fault_sync(self) -> None:
+        """Sync the fault history every ``fault_interval`` s, whichever transport reads the signals."""
+        if self.on_faults is None or self._fault_future is not None:
+            return
+        if not self.endpoints:
+            self.log('⚠️ HTTP sin base_url configurada.')
+            return
+        self._fault_future = self.shared.submit(self._fault_sync_loop())
+
+    def stop_fault_sync(self) -> None:
+        self._cancel(self._fault_future)
+        self._fault_future = None
+
+    async def read_fault_history(self) -> list:
+        """Fetch ``/evt/lst`` and return only the events not seen before."""
+        session = await self.shared.session()
+        headers, params = self.fault_sync.request()
+        status, resp_headers, body = await self._fetch_conditional(session, self.faultEndpoint, headers, params)
+        if status is None:
+            return []
+        before = self.fault_sync.to_dict()
+        events = self.fault_sync.apply(status, resp_headers, body)
+        REGISTRY.inc("fault_sync", device=self._labels["device"], status=str(status))
+        if not self.fault_sync.dirty:
+            return events
+        if self.on_faults and self.on_faults(events, self.fault_sync.to_dict()) is False:
+            # No se pudo publicar: volvemos al cursor anterior y se reintenta en la próxima sync
+            self.fault_sync = FaultSync(before)
+            return []
+        self.fault_sync.dirty = False
+        return events
+
+    def read_fault_history_sync(self) -> list:
+        fut = self.shared.submit(self.read_fault_history())
         return fut.result(timeout=5)
 
+    async def _fault_sync_loop(self) -> None:
+        """One sync at a time, independent of the signal poll loop."""
+        while True:
+            try:
+                events = await self.read_fault_history()
+                if events:
+                    self.log(f"🚨 {len(events)} falla(s) nueva(s) en {self._labels['device']}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log(f"❌ HTTP fault sync error: {e}")
+            await asyncio.sleep(self.fault_interval)
+
     async def _poll_loop(self) -> None:
-        session = await self._ensure_session()
+        session = await self.shared.session()
+        prev_state = PollHealth.OK
         while self.running:
+            plan = self.health.begin_cycle()
+            # Los endpoints del ciclo en paralelo sobre el conector compartido
+            results = await asyncio.gather(*(self._timed_fetch(session, self.endpoints[n]) for n in plan))
             combined = {}
-            for _, url in self.endpoints.items():
-                data = await self._fetch(session, url)
-                if isinstance(data, dict):
+            for name, data in zip(plan, results):
+                ok = isinstance(data, dict)
+                self.health.record(name, ok)
+                if ok:
                     combined.update(data)
+            state = self.health.end_cycle()
+            sampled_at = time.monotonic()
+            REGISTRY.observe("poll", self.health.last_cycle_duration, state != PollHealth.DOWN, **self._labels)
+            if hasattr(self.app, "on_reader_cycle"):
+                self.app.on_reader_cycle(self, state)
+            if (state == PollHealth.DOWN) != (prev_state == PollHealth.DOWN) and hasattr(self.app, "update_connected"):
+                if state == PollHealth.DOWN:
+                    self.log(f"⚠️ HTTP parece desconectado (score={self.health.score:.2f})")
+                self.app.update_connected()
+            prev_state = state
             if combined:
-                self.on_http_read_callback(combined)
-            await asyncio.sleep(self.interval)
+                try:
+                    self.on_http_read_callback(combined, "http", sampled_at=sampled_at)
+                except Exception as e:
+                    self.log(f"❌ HTTP callback error: {e}")
+            await asyncio.sleep(max(0.0, self.interval - self.health.last_cycle_duration))
 
+    async def _timed_fetch(self, session: aiohttp.ClientSession, url: str) -> dict | None:
+        t0 = time.monotonic()
+        data = await self._fetch(session, url)
+        REGISTRY.observe("read", time.monotonic() - t0, data is not None, **self._labels)
+        return data
 
     async def _fetch(self, session: aiohttp.ClientSession, url: str) -> dict | None:
         try:
-            async with session.get(url, timeout=3) as response:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=3)) as response:
                 if response.status == 200:
-                    return await response.json()
+                    return json_codec.loads(await response.read())
                 self.log(f'⚠️ HTTP {response.status} {url}')
         except Exception as e:
             self.log(f'❌ HTTP exception {url}: {e}')
         return None
 
+    async def _fetch_conditional(self, session: aiohttp.ClientSession, url: str, headers: dict, params: dict):
+        """GET with validators; returns ``(status, headers, json)`` or ``(None, {}, None)`` on error."""
+        try:
+            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=3)) as response:
+                body = json_codec.loads(await response.read()) if response.status == 200 else None
+                if response.status not in (200, 304):
+                    self.log(f'⚠️ HTTP {response.status} {url}')
+                validators = {k: response.headers.get(k) for k in ("ETag", "Last-Modified")}
+                return response.status, validators, body
+        except Exception as e:
+            self.log(f'❌ HTTP exception {url}: {e}')
+        return None, {}, None
+
     def is_connected(self) -> bool:
         return (
             self.running
-            and self.loop is not None
-            and self._loop_thread is not None
-            and self._loop_thread.is_alive()
-            and self._session is not None
-            and not self._session.closed
+            and self.shared.alive()
+            and not self.health.is_down()
         )
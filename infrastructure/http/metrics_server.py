@@ -0,0 +1,176 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from infrastructure.metrics.metrics import LATENCY_BUCKETS, REGISTRY
+
+PREFIX = "gateway"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> str:
+    merged = dict(labels)
+    if extra:
+        merged.update(extra)
+    if not merged:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(merged.items())) + "}"
+
+
+def _read_proc_stats() -> Dict[str, float]:
+    """RSS and CPU seconds of this process straight from /proc (Linux only)."""
+    stats: Dict[str, float] = {}
+    try:
+        with open("/proc/self/status", "r", encoding="ascii", errors="ignore") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    stats["process_resident_memory_bytes"] = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    try:
+        with open("/proc/self/stat", "r", encoding="ascii", errors="ignore") as f:
+            # Campos tras el nombre del proceso (que puede contener espacios)
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        stats["process_cpu_seconds_total"] = (int(fields[11]) + int(fields[12])) / ticks
+        stats["process_threads"] = int(fields[17])
+    except (OSError, IndexError, ValueError):
+        pass
+    return stats
+
+
+def render_prometheus() -> str:
+    """Render the in-process registry in Prometheus text exposition format."""
+    lines = []
+
+    stages = REGISTRY.stages()
+    if stages:
+        name = f"{PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Latency per pipeline stage (connect, read, poll, decode, encode, enqueue, publish, sample_age).")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, labels, stats in stages:
+            base = dict(labels, stage=stage)
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(base, {'le': repr(bound)})} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(base, {'le': '+Inf'})} {stats.count}")
+            lines.append(f"{name}_sum{_labels(base)} {stats.total:.6f}")
+            lines.append(f"{name}_count{_labels(base)} {stats.count}")
+
+        name = f"{PREFIX}_stage_errors_total"
+        lines.append(f"# HELP {name} Failed operations per pipeline stage.")
+        lines.append(f"# TYPE {name} counter")
+        for stage, labels, stats in stages:
+            lines.append(f"{name}{_labels(dict(labels, stage=stage))} {stats.errors}")
+
+        name = f"{PREFIX}_stage_error_ratio"
+        lines.append(f"# HELP {name} Errors over total operations per pipeline stage.")
+        lines.append(f"# TYPE {name} gauge")
+        for stage, labels, stats in stages:
+            ratio = stats.errors / stats.count if stats.count else 0.0
+            lines.append(f"{name}{_labels(dict(labels, stage=stage))} {ratio:.4f}")
+
+    by_name: Dict[str, list] = {}
+    for counter, labels, value in REGISTRY.counters():
+        by_name.setdefault(counter, []).append((labels, value))
+    for counter, series in sorted(by_name.items()):
+        name = f"{PREFIX}_{counter}_total"
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in series)
+
+    by_name = {}
+    for gauge, labels, value in REGISTRY.gauges():
+        by_name.setdefault(gauge, []).append((labels, value))
+    for gauge, series in sorted(by_name.items()):
+        name = f"{PREFIX}_{gauge}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in series)
+
+    for name, value in _read_proc_stats().items():
+        kind = "counter" if name.endswith("_total") else "gauge"
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+
+    lines.append(f"# TYPE {PREFIX}_uptime_seconds gauge")
+    lines.append(f"{PREFIX}_uptime_seconds {time.time() - REGISTRY.started_at:.1f}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Optional ``/metrics`` endpoint (Prometheus text format) for headless mode.
+    Runs aiohttp on its own event loop thread and only reads in-memory
+    counters and /proc, never device I/O. Output is cached for
+    ``min_interval`` seconds so aggressive scrapers cost nothing extra.
+    """
+
+    def __init__(self, log: Callable[[str], None], port: int, host: str = "0.0.0.0", min_interval: float = 1.0):
+        self.log = log
+        self.host = host
+        self.port = port
+        self.min_interval = min_interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._runner = None
+        self._cache = ("", 0.0)
+
+    def start(self) -> bool:
+        try:
+            from aiohttp import web
+        except ImportError:
+            self.log("⚠️ aiohttp no disponible; endpoint de métricas deshabilitado")
+            return False
+
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=lambda: (asyncio.set_event_loop(self.loop), self.loop.run_forever()),
+            daemon=True
+        )
+        self._loop_thread.start()
+
+        async def _serve():
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle_metrics)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_serve(), self.loop).result(timeout=5)
+        except Exception as e:
+            self.log(f"❌ No se pudo iniciar el endpoint de métricas en {self.host}:{self.port}: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            return False
+        self.log(f"📈 Métricas Prometheus en http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self) -> None:
+        if not self.loop:
+            return
+        if self._runner:
+            try:
+                asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self.loop).result(timeout=3)
+            except Exception:
+                pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop = None
+
+    async def _handle_metrics(self, request):
+        from aiohttp import web
+
+        body, rendered_at = self._cache
+        now = time.monotonic()
+        if not body or now - rendered_at >= self.min_interval:
+            body = render_prometheus()
+            self._cache = (body, now)
+        return web.Response(
+            body=body.encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
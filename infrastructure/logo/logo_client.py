@@ -3,29 +3,39 @@ import threading
 import time
 from pymodbus.client import ModbusTcpClient
 
-SIGNAL_LOGO_DIR = {
-    "status": 0,
-    "restartTime": 1,
-    "voltageResetTime": 2,
-    "autoResetTime": 4,
-    "workHours": 5,
-    "workMinutes": 6,
-    "lowLevelResetTime": 8,
-    "highPressureCount": 11,
-    "networkPressure": 16,
-    "dischargePressure": 17,
-}
+from infrastructure.logo.status_decoder import get_status_decoder
+from infrastructure.metrics.metrics import REGISTRY
+from infrastructure.modbus.poll_health import PollHealth
+from infrastructure.profiles.registry import DriverProfile, get_profile
+
+# Ventanas leídas con una sola petición por ciclo. Por defecto solo el bloque
+# VM que cubre las señales del perfil; coils/inputs se activan por configuración
+# (connectionConfig.logoWindows), p.ej.:
+#   {"registers": {"start": 0, "count": 18},
+#    "coils": {"start": 8192, "count": 4, "names": {"8192": "Q1"}}}
+LOGO_WINDOW_KINDS = ("registers", "coils", "inputs")
 
 
 class LogoModbusClient:
-    def __init__(self, device, log, send_signal, host, port):
+    def __init__(
+        self, device, log, send_signal, host, port, windows: dict | None = None, profile: str | None = None,
+        device_profile: DriverProfile | None = None,
+    ):
         self.host = host
         self.port = port
         self.log = log
+        # Mapa de registros del modelo; ``profile`` (logoProfile) elige el decodificador de estado
+        self.device_profile = device_profile or get_profile(None, "logo")
+        self.windows = self._normalize_windows(windows)
+        self.status_decoder = get_status_decoder(profile or self.device_profile.status_profile)
         self.device = device
         self.send_signal = send_signal
         self.client = None
+        self.health = PollHealth(log=log, name="LOGO")
+        self.transport = "logo"
+        self._labels = {"device": getattr(device, "serial", None), "transport": self.transport}
 
+        self._lock = threading.Lock()
         self._stop_event = threading.Event()
         self._thread: threading.Thread | None = None
 
@@ -51,7 +61,11 @@ class LogoModbusClient:
     def auto_reconnect(self, delay: float = 5.0):
         """Loop interno de reconexión."""
         while not self._stop_event.is_set():
-            if self.connect():
+            t0 = time.monotonic()
+            connected = self.connect()
+            REGISTRY.observe("connect", time.monotonic() - t0, connected, **self._labels)
+            if connected:
+                REGISTRY.inc("connects", **self._labels)
                 self.log("✅ Conexión establecida a LOGO")
                 self.device.update_connected()
                 self.start_reading()
@@ -125,15 +139,48 @@ class LogoModbusClient:
     # ---------------------------
     def write_coil(self, address: int, value: bool) -> bool:
         try:
-            rr = self.client.write_coil(address, bool(value))
+            with self._lock:
+                rr = self.client.write_coil(address, bool(value))
             return (rr is not None) and (not rr.isError())
         except Exception as e:
             self.log(f"❌ Error escribiendo coil {address}: {e}")
             return False
 
+    def read_bits(self, kind: str, start_address: int, count: int) -> list[bool] | None:
+        """Read a block of coils (``kind="coils"``) or discrete inputs."""
+        try:
+            with self._lock:
+                if kind == "coils":
+                    rr = self.client.read_coils(address=start_address, count=count)
+                else:
+                    rr = self.client.read_discrete_inputs(address=start_address, count=count)
+            if rr and not rr.isError():
+                return list(rr.bits[:count])
+            self.log(f"⚠️ Error leyendo {kind}: {rr}")
+            return None
+        except Exception as e:
+            self.log(f"❌ Exception leyendo {kind}: {e}")
+            return None
+
+    def read_status(self) -> str | None:
+        """Read the status register and reduce it to run/stop/fault."""
+        addr = self.device_profile.registers.get("status")
+        if addr is None:
+            return None
+        regs = self.read_registers(addr, 1)
+        if not regs:
+            return None
+        return self.status_decoder.state(regs[0])
+
+    def _read_window(self, kind: str, window: dict) -> list | None:
+        if kind == "registers":
+            return self.read_registers(window["start"], window["count"])
+        return self.read_bits(kind, window["start"], window["count"])
+
     def read_registers(self, start_address: int, count: int) -> list[int] | None:
         try:
-            rr = self.client.read_holding_registers(address=start_address, count=count)
+            with self._lock:
+                rr = self.client.read_holding_registers(address=start_address, count=count)
             if rr and not rr.isError():
                 return rr.registers
             self.log(f"⚠️ Error leyendo registers: {rr}")
@@ -145,29 +192,37 @@ class LogoModbusClient:
     # ---------------------------
     # Polling
     # ---------------------------
-    def poll_registers(self, addresses: list[int], interval: float = 0.5) -> threading.Thread:
+    def poll_registers(self, windows: dict[str, dict], interval: float = 0.5) -> threading.Thread:
+        """Poll every configured window with one request each and decode from the blocks."""
+        self.health.reset(list(windows))
+
         def _poll():
-            failure_count = 0
             while not self._stop_event.is_set():
-                regs_group: dict[int, int] = {}
-                for addr in addresses:
+                blocks: dict[str, tuple[int, list]] = {}
+                for kind in self.health.begin_cycle():
+                    if self.health.deadline_exceeded():
+                        break
+                    window = windows[kind]
+                    t0 = time.monotonic()
                     try:
-                        regs = self.read_registers(addr, 1)
-                        if regs is not None:
-                            regs_group[addr] = regs[0]
-                            failure_count = 0
-                        else:
-                            failure_count += 1
+                        values = self._read_window(kind, window)
                     except Exception as e:
-                        self.log(f"Exception polling {addr}: {e}")
-                        failure_count += 1
-                if failure_count >= 3:
-                    self.log("⚠️ LOGO parece desconectado")
+                        self.log(f"Exception polling {kind}@{window['start']}: {e}")
+                        values = None
+                    REGISTRY.observe("read", time.monotonic() - t0, values is not None, **self._labels)
+                    self.health.record(kind, values is not None)
+                    if values is not None:
+                        blocks[kind] = (window["start"], values)
+                state = self.health.end_cycle()
+                sampled_at = time.monotonic()
+                REGISTRY.observe("poll", self.health.last_cycle_duration, state != PollHealth.DOWN, **self._labels)
+                if state == PollHealth.DOWN:
+                    self.log(f"⚠️ LOGO parece desconectado (score={self.health.score:.2f})")
                     self.device.update_connected()
                     self.start()  # relanza auto_reconnect
                     return
                 time.sleep(interval)
-                self._read_callback(regs_group)
+                self._read_callback(blocks, sampled_at)
 
         thread = threading.Thread(target=_poll, daemon=True)
         thread.start()
@@ -175,8 +230,55 @@ class LogoModbusClient:
 
     def start_reading(self) -> None:
         if self.is_connected():
-            addrs = list(dict.fromkeys(SIGNAL_LOGO_DIR.values()))
-            self.poll_registers(addrs)
+            self.poll_registers(self.windows)
+
+    def _default_registers_window(self) -> dict:
+        """The VM block covering every register of the profile."""
+        addresses = self.device_profile.addresses or (0,)
+        return {"start": min(addresses), "count": max(addresses) - min(addresses) + 1}
+
+    def _normalize_windows(self, windows: dict | None) -> dict[str, dict]:
+        """Validate the configured windows, falling back to the profile's register block."""
+        if not isinstance(windows, dict) or not windows:
+            return {"registers": self._default_registers_window()}
+
+        out: dict[str, dict] = {}
+        for kind in sorted(windows, key=lambda k: LOGO_WINDOW_KINDS.index(k) if k in LOGO_WINDOW_KINDS else 99):
+            window = windows[kind]
+            if kind not in LOGO_WINDOW_KINDS or not isinstance(window, dict):
+                self.log(f"⚠️ Ventana LOGO inválida: {kind}={window}")
+                continue
+            try:
+                start, count = int(window["start"]), int(window["count"])
+            except (KeyError, TypeError, ValueError):
+                self.log(f"⚠️ Ventana LOGO inválida: {kind}={window}")
+                continue
+            if count <= 0:
+                continue
+            names = {}
+            raw_names = window.get("names") or {}
+            for key, name in (raw_names.items() if isinstance(raw_names, dict) else ()):
+                try:
+                    names[int(key)] = str(name)
+                except (TypeError, ValueError):
+                    self.log(f"⚠️ Nombre LOGO inválido en {kind}: {key}={name} (la clave debe ser la dirección)")
+            out[kind] = {"start": start, "count": count, "names": names}
+        if "registers" not in out:
+            out = {"registers": self._default_registers_window(), **out}
+        return out
+
+    def update_windows(self, windows: dict | None) -> bool:
+        """Apply a new connectionConfig.logoWindows and restart polling if the windows changed."""
+        normalized = self._normalize_windows(windows)
+        if normalized == self.windows:
+            return False
+        self.windows = normalized
+        self.log(f"🔄 Ventanas LOGO! actualizadas: {', '.join(normalized)}")
+        if self._thread and self._thread.is_alive():
+            self.stop()
+            self.start()
+        return True
+
     def update_config(self, host=None, port=None) -> bool:
         """Update LOGO! parameters and reconnect if needed."""
         changed = False
@@ -200,65 +302,25 @@ class LogoModbusClient:
     # ---------------------------
     # Señales
     # ---------------------------
-    def _build_signal_from_regs(self, regs: dict[int, int]) -> dict:
-        signal = {}
-
-        for name, addr in SIGNAL_LOGO_DIR.items():
-            value = regs.get(addr)
-            if value is None:
-                continue
+    def _build_signal_from_bits(self, kind: str, start: int, bits: list) -> dict:
+        names = self.windows.get(kind, {}).get("names") or {}
+        prefix = "coil" if kind == "coils" else "input"
+        return {
+            names.get(start + i, f"{prefix}{start + i}"): {"value": bool(b), "kind": "operation"}
+            for i, b in enumerate(bits)
+        }
 
-            if name == "status":
-                status_map = {
-                    9: {"value": "Falla de voltaje", "kind":"fault"},
-                    8: {"value": "Reiniciando", "kind":"operation"},
-                    0: {"value":"Panel desenergizado", "kind": "operation"},
-                    512: {"value":"Logo reiniciando", "kind": "operation"},
-                    163: {"value": "Operando", "kind": "operation"},
-                    97: {"value": "Alta presión (conteo)", "kind": "operation"},
-                    32: {"value": "Falla: bajo nivel", "kind": "fault"},
-                    35: {"value": "Apagado por selector", "kind": "operation"},
-                    33: {"value": "Selector Fuera", "kind": "operation"},
-                    521:  {"value": "Falla de voltaje", "kind": "fault"},
-                    520:  {"value": "Reiniciando", "kind": "operation"},
-                    608: {"value": "Falla bajo nivel", "kind": "fault"},
-                    577: {"value": "Falla de voltaje", "kind": "fault"},
-                    513: {"value": "Falla de voltaje", "kind": "fault"},
-                    544: {"value": "Falla de bajo nivel", "kind": "fault"},
-                    546: {"value": "Falla de bajo nivel", "kind": "fault"},
-                    4707: {"value": "Desaceleracion", "kind": "operation"},
-                    545: {"value": "Reposo", "kind": "operation"},
-                    547: {"value": "Desaceleracion", "kind": "operation"},
-                    609: {"value": "Paro por alta precion", "kind": "operation"},
-                    673: {"value": "Encendido por selector", "kind": "operation"},
-                    737: {"value": "Aceleracion", "kind": "operation"},
-                    611: {"value": "Desaceleracion", "kind": "operation"},
-                    1569: {"value": "Falla de confirma", "kind": "fault"},
-                    4705: {"value": "En Transito", "kind": "operation"},
-                    739: {"value": "Operacion", "kind": "operation"},
-                    1633: {"value": "Falla de confirma", "kind": "fault"},
-                    34: {"value": "Falla: bajo nivel", "kind": "fault"},
-                    1: {"value": "Falla de voltaje", "kind": "fault"},
-                    3: {"value": "Falla de voltaje", "kind": "fault"},
-                    41: {"value": "Falla térmica/variador", "kind": "fault"},
-                    675: {"value": "Operacion", "kind": "operation"},
-                    161: {"value": "Arranque fallido (LOGO envía señal, contactor/variador no encienden)", "kind": "fault"},
-                }
-
-                signal[name] = status_map.get(
-                    value,
-                    {"value": f"Desconocido ({value})", "kind": "operation"}
-                )
-
-            else:
-                # Para otros registros dejamos el valor numérico
-                signal[name] = { "value":value, "kind": "operation"}
-        return signal
-
-    def _read_callback(self, regs):
-        signal = self._build_signal_from_regs(regs)
+    def _read_callback(self, blocks, sampled_at=None):
+        with REGISTRY.timer("decode", **self._labels):
+            signal = {}
+            if "registers" in blocks:
+                start, values = blocks["registers"]
+                signal.update(self.device_profile.decode({start + i: v for i, v in enumerate(values)}, self.status_decoder))
+            for kind in ("coils", "inputs"):
+                if kind in blocks:
+                    signal.update(self._build_signal_from_bits(kind, *blocks[kind]))
         if not signal:
             return
         payload = {k: v for k, v in signal.items() if v is not None}
         if payload:
-            self.send_signal(payload, "logo")
+            self.send_signal(payload, "logo", sampled_at=sampled_at)
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+# Perfiles empaquetados y perfiles locales (data/profiles/logo) que permiten
+# agregar códigos de firmware nuevos sin publicar una versión.
+PACKAGED_PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+LOCAL_PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../..", "data", "profiles", "logo")
+DEFAULT_PROFILE = "default"
+
+_decoders: Dict[str, "StatusDecoder"] = {}
+_decoders_lock = threading.Lock()
+
+
+class StatusDecoder:
+    """
+    Decodes the LOGO! status word using a model profile:
+
+    - ``codes``: exact raw value -> ``{"value", "kind"}`` (checked first).
+    - ``flags``: single bits (``{"bit", "name", "value", "kind", "activeLow"?}``);
+      raw values not in ``codes`` are decomposed into their active flags,
+      faults first. ``activeLow`` flags are active while the bit is clear
+      (e.g. a "voltage OK" input reported as a voltage fault when it drops).
+    - ``fields``: multi-bit groups (``{"name", "mask", "shift", "values"}``),
+      e.g. a selector position.
+
+    Results are cached by raw value and shared between calls; treat them as
+    read-only.
+    """
+
+    MAX_CACHE = 4096
+
+    def __init__(self, profile: Dict[str, Any]) -> None:
+        self.model = profile.get("model", DEFAULT_PROFILE)
+        self._codes = {int(k): dict(v) for k, v in (profile.get("codes") or {}).items()}
+        self._flags = [dict(f) for f in profile.get("flags") or []]
+        self._fields = [dict(f) for f in profile.get("fields") or []]
+        self._unknown = dict(profile.get("unknown") or {"value": "Desconocido ({raw})", "kind": "operation"})
+        self._cache: Dict[int, Dict[str, Any]] = {}
+
+    def decode(self, raw: int) -> Dict[str, Any]:
+        result = self._cache.get(raw)
+        if result is None:
+            result = self._codes.get(raw) or self._decompose(raw)
+            if len(self._cache) >= self.MAX_CACHE:
+                self._cache.clear()
+            self._cache[raw] = result
+        return result
+
+    def state(self, raw: int) -> str:
+        """Coarse equipment state (``run``/``stop``/``fault``) used to confirm commands."""
+        if self.decode(raw).get("kind") == "fault":
+            return "fault"
+        running = next((f for f in self._flags if f.get("name") == "running"), None)
+        if running is not None and bool(raw & (1 << int(running["bit"]))) != bool(running.get("activeLow")):
+            return "run"
+        return "stop"
+
+    def _decompose(self, raw: int) -> Dict[str, Any]:
+        active = [f for f in self._flags if bool(raw & (1 << int(f["bit"]))) != bool(f.get("activeLow"))]
+        faults = [f for f in active if f.get("kind") == "fault"]
+        shown = faults or active
+
+        result: Dict[str, Any]
+        if shown:
+            result = {
+                "value": " / ".join(f["value"] for f in shown),
+                "kind": "fault" if faults else "operation",
+            }
+        else:
+            result = {
+                "value": self._unknown["value"].format(raw=raw),
+                "kind": self._unknown.get("kind", "operation"),
+            }
+
+        result["raw"] = raw
+        if active:
+            result["flags"] = [f["name"] for f in active]
+        for field in self._fields:
+            code = (raw & int(field["mask"])) >> int(field.get("shift", 0))
+            values = field.get("values") or {}
+            result[field["name"]] = values.get(str(code), code)
+        return result
+
+
+def _read_profile(name: str) -> Optional[Dict[str, Any]]:
+    for base in (LOCAL_PROFILES_DIR, PACKAGED_PROFILES_DIR):
+        path = os.path.join(base, f"{name}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            continue
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Perfil LOGO inválido {path}: {e}")
+    return None
+
+
+def get_status_decoder(name: Optional[str] = None) -> StatusDecoder:
+    """Return the shared decoder for a profile, loading it on first use."""
+    name = name or DEFAULT_PROFILE
+    decoder = _decoders.get(name)
+    if decoder is not None:
+        return decoder
+    with _decoders_lock:
+        decoder = _decoders.get(name)
+        if decoder is None:
+            profile = _read_profile(name)
+            if profile is None and name != DEFAULT_PROFILE:
+                print(f"⚠️ Perfil LOGO '{name}' no encontrado, usando '{DEFAULT_PROFILE}'")
+                profile = _read_profile(DEFAULT_PROFILE)
+            decoder = StatusDecoder(profile or {})
+            _decoders[name] = decoder
+    return decoder
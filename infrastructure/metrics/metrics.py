@@ -0,0 +1,182 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Tuple
+
+# Límites superiores de los buckets de latencia (segundos)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _label_str(key: LabelKey) -> str:
+    return ",".join(f"{k}={v}" for k, v in key)
+
+
+class StageStats:
+    """Latency histogram plus ok/error counters for one stage and label set."""
+
+    __slots__ = ("buckets", "count", "errors", "total", "max")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, ok: bool = True) -> None:
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(LATENCY_BUCKETS[i], self.max) if i < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "n": self.count,
+            "err": self.errors,
+            "avgMs": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p95Ms": round(self.quantile(0.95) * 1000, 2),
+            "maxMs": round(self.max * 1000, 2),
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process store of stage latencies, counters and gauges.
+
+    Stages (connect, read, poll, decode, encode, enqueue, publish, sample_age)
+    are labelled by ``device`` and ``transport``. Gauges that are cheaper to
+    compute on demand (queue depths, thread count) come from collectors that
+    run only when a snapshot is taken.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[Tuple[str, LabelKey], StageStats] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self.started_at = time.time()
+
+    # ---------------------------
+    # Registro
+    # ---------------------------
+    def observe(self, stage: str, seconds: float, ok: bool = True, **labels) -> None:
+        key = (stage, _key(labels))
+        with self._lock:
+            stats = self._stages.get(key)
+            if stats is None:
+                stats = self._stages[key] = StageStats()
+            stats.observe(seconds, ok)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Time a block; an exception counts as an error and is re-raised."""
+        t0 = time.monotonic()
+        ok = True
+        try:
+            yield
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.observe(stage, time.monotonic() - t0, ok, **labels)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[(name, _key(labels))] = value
+
+    def register_collector(self, name: str, fn: Callable[[], Dict[str, float]]) -> None:
+        """``fn`` returns ``{gauge_name: value}`` and is called on every snapshot."""
+        with self._lock:
+            self._collectors[name] = fn
+
+    def unregister_collector(self, name: str) -> None:
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    # ---------------------------
+    # Consulta
+    # ---------------------------
+    def stages(self) -> list[tuple[str, Dict[str, str], StageStats]]:
+        with self._lock:
+            return [(name, dict(key), stats) for (name, key), stats in self._stages.items()]
+
+    def counters(self) -> list[tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(name, dict(key), v) for (name, key), v in self._counters.items()]
+
+    def gauges(self) -> list[tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(name, dict(key), v) for (name, key), v in self._gauges.items()]
+            collectors = list(self._collectors.items())
+        for source, fn in collectors:
+            try:
+                for name, value in fn().items():
+                    items.append((name, {"source": source}, value))
+            except Exception:
+                continue
+        return items
+
+    def summary(self, **filters) -> Dict[str, Any]:
+        """
+        Compact nested view used for the MQTT health message and in-process queries.
+        ``filters`` (e.g. ``device="SN1"``) keep only series carrying those labels.
+        """
+        want = {k: str(v) for k, v in filters.items()}
+
+        def _match(labels: Dict[str, str]) -> bool:
+            return all(labels.get(k) == v for k, v in want.items())
+
+        stages: Dict[str, Dict[str, Any]] = {}
+        for name, labels, stats in self.stages():
+            if _match(labels):
+                stages.setdefault(name, {})[_label_str(_key(labels))] = stats.summary()
+
+        counters: Dict[str, Dict[str, float]] = {}
+        for name, labels, value in self.counters():
+            if _match(labels):
+                counters.setdefault(name, {})[_label_str(_key(labels))] = value
+
+        out: Dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            "uptime": round(time.time() - self.started_at, 1),
+            "stages": stages,
+            "counters": counters,
+        }
+        if not want:
+            out["gauges"] = {
+                (f"{name}[{_label_str(_key(labels))}]" if labels else name): value
+                for name, labels, value in self.gauges()
+            }
+        return out
+
+
+# Registro único del proceso
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,48 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupProfile:
+    """
+    Optional wall-clock profile of imports and initialisation per subsystem
+    (``--profile-startup``). Disabled it costs one attribute check per stage.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._t0 = time.perf_counter()
+        self._stages: List[Tuple[float, float, int, str]] = []
+        self._lock = threading.Lock()
+        self._depth = threading.local()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        depth = getattr(self._depth, "value", 0)
+        self._depth.value = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth.value = depth
+            with self._lock:
+                self._stages.append((start - self._t0, time.perf_counter() - start, depth, name))
+
+    def report(self) -> str:
+        with self._lock:
+            stages = sorted(self._stages)
+        lines = ["⏱️ Perfil de arranque (inicio, duración, etapa):"]
+        for start, duration, depth, name in stages:
+            lines.append(f"  +{start:7.3f}s {duration * 1000:9.1f} ms  {'  ' * depth}{name}")
+        lines.append(f"  total hasta ahora: {time.perf_counter() - self._t0:.3f}s")
+        return "\n".join(lines)
+
+
+STARTUP = StartupProfile()
@@ -6,54 +6,32 @@ from pymodbus.client import ModbusSerialClient
 from pymodbus.exceptions import ModbusException
 from serial.rs485 import RS485Settings
 
-MODBUS_SCALES = {
-    "curr": 0.1,      # /10
-    "power": 0.1,     # /10
-    "freqRef": 0.01,  # /100
-    "freq": 0.01,     # /100
-}
-
-SIGNAL_MODBUS_SERIAL_DIR = {
-    "freqRef": 4,
-    "accTime": 6,
-    "decTime": 7,
-    "curr": 8,
-    "freq": 9,
-    "volt": 10,
-    "power": 12,
-    "stat": 16,
-    "dir": 5,       
-    "speed": 785,
-    "alarm": 815,
-    "temp": 859,
-}
-
-DEVICE = {
-    "status": {
-        "address": 897,
-        "values": {"on": 3, "off": 0}
-    },
-    "mode": {
-        "address": 4357,
-        "values": {"local": 2, "remote": 3}
-    }
-}
-
-STATUS_TYPES_DIR = {0: "stop", 1: "fault", 2: "run", 7:"run"}
-DIR_TYPE_DIR = {4: "reverse", 1: "stop", 129: "auto", 130: "fwd", 193: "acc", 194: "fwd", 66:"fwd"}
+from infrastructure.metrics.metrics import REGISTRY
+from infrastructure.modbus.poll_health import PollHealth
+from infrastructure.profiles.registry import DriverProfile, get_profile
 
 
 class ModbusSerial:
     """
     Manages a Modbus RTU connection over a serial port (RS-485).
     """
-    def __init__(self, device, send_signal, log, port, baudrate, slave_id):
+    def __init__(self, device, send_signal, log, port, baudrate, slave_id, device_profile: DriverProfile | None = None):
         self.device = device
         self.log = log
         self.send_signal = send_signal
         self.client: ModbusSerialClient | None = None
         self._lock = threading.Lock()
         self.poll_interval = 0.5
+        # Mapa de registros compartido por todos los equipos del mismo modelo
+        self.device_profile = device_profile or get_profile(None, "modbus-rtu")
+        self.health = PollHealth(log=log, name="Modbus Serial")
+        self.transport = "serial"
+        self._labels = {"device": getattr(device, "serial", None), "transport": self.transport}
+
+        # Hot-standby: solo una sonda de vida cada standby_interval, sin publicar
+        self.standby = False
+        self.standby_interval = 5.0
+        self._wake = threading.Event()
         self.port = port
         self.baudrate = baudrate
         self.slave_id = slave_id
@@ -62,28 +40,6 @@ class ModbusSerial:
         self._stop_event = threading.Event()
         self._thread: threading.Thread | None = None
         self._reconnecting = False
-
-    def _get_signal_map(self) -> dict[str, int]:
-        modbus_config = getattr(self.device, "device", {}).get("modbusConfig")
-        if not isinstance(modbus_config, dict):
-            return SIGNAL_MODBUS_SERIAL_DIR
-
-        if modbus_config.get("protocol") != "modbus-rtu":
-            return SIGNAL_MODBUS_SERIAL_DIR
-
-        config_map = modbus_config.get("registers")
-        if not isinstance(config_map, dict):
-            return SIGNAL_MODBUS_SERIAL_DIR
-
-        registers: dict[str, int] = {}
-        for key, value in config_map.items():
-            try:
-                address = value.get("address") if isinstance(value, dict) else value
-                registers[str(key)] = int(address)
-            except (TypeError, ValueError):
-                self.log(f"⚠️ Registro serial inválido para {key}: {value}")
-
-        return registers or SIGNAL_MODBUS_SERIAL_DIR
 
     # ---------------------------
     # Ciclo de vida
@@ -102,6 +58,7 @@ class ModbusSerial:
         """Detiene el loop de reconnect y cierra la conexión."""
         self.log("⏹️ STOP Modbus Serial")
         self._stop_event.set()
+        self._wake.set()
         if self._thread and self._thread.is_alive():
             if threading.current_thread() != self._thread:  # evita self-join
                 self._thread.join(timeout=1)
@@ -118,7 +75,11 @@ class ModbusSerial:
         self.log("🔄 Iniciando auto_reconnect...")
 
         while not self._stop_event.is_set():
-            if self.connect():
+            t0 = time.monotonic()
+            connected = self.connect()
+            REGISTRY.observe("connect", time.monotonic() - t0, connected, **self._labels)
+            if connected:
+                REGISTRY.inc("connects", **self._labels)
                 self.log("✅ Conexión Modbus Serial establecida")
                 self.device.update_connected()
                 self.start_reading()
@@ -194,30 +155,40 @@ class ModbusSerial:
     # Polling de registros
     # ---------------------------
     def poll_registers(self, addresses: list[int], interval: float = 0.5):
+        self.health.reset(addresses)
+
         def _poll():
-            failure_count = 0
             while not self._stop_event.is_set():
                 regs_group = {}
-                for addr in addresses:
+                standby = self.standby
+                for addr in self.health.begin_cycle(limit=1 if standby else None):
+                    if self.health.deadline_exceeded():
+                        break
+                    t0 = time.monotonic()
                     try:
                         regs = self.read_holding_registers(addr, count=1)
-                        if regs:
-                            regs_group[addr] = regs[0]
-                            failure_count = 0
-                        else:
-                            failure_count += 1
                     except Exception as e:
                         self.log(f"❌ Error polling {addr}: {e}")
-                        failure_count += 1
-
-                if failure_count >= 3:
-                    self.log("⚠️ Modbus serial parece desconectado")
+                        regs = None
+                    REGISTRY.observe("read", time.monotonic() - t0, bool(regs), **self._labels)
+                    self.health.record(addr, bool(regs))
+                    if regs:
+                        regs_group[addr] = regs[0]
+
+                state = self.health.end_cycle()
+                sampled_at = time.monotonic()
+                REGISTRY.observe("poll", self.health.last_cycle_duration, state != PollHealth.DOWN, **self._labels)
+                self.device.on_reader_cycle(self, state)
+                if state == PollHealth.DOWN:
+                    self.log(f"⚠️ Modbus serial parece desconectado (score={self.health.score:.2f})")
                     self.device.update_connected()
                     self.start()  # relanza auto_reconnect
                     return
 
-                self._stop_event.wait(interval)
-                self.on_modbus_serial_read_callback(regs_group)
+                self._wake.wait(self.standby_interval if standby else interval)
+                self._wake.clear()
+                if not standby and not self._stop_event.is_set():
+                    self.on_modbus_serial_read_callback(regs_group, sampled_at)
 
         thread = threading.Thread(target=_poll, daemon=True)
         thread.start()
@@ -226,6 +197,12 @@ class ModbusSerial:
     # ---------------------------
     # Utilidades
     # ---------------------------
+    def set_standby(self, standby: bool) -> None:
+        """Switch between active reading and warm standby (liveness probe only)."""
+        if standby != self.standby:
+            self.standby = standby
+            self._wake.set()
+
     def is_connected(self) -> bool:
         if not self.client:
             return False
@@ -267,56 +244,55 @@ class ModbusSerial:
             self.log(f"❌ Excepción writing register {address}: {e}")
         return False
 
-    def restart(self):
-        self.write_register(900, 1)
-        self.write_register(900, 0)
-        self.turn_on()
+    def _write_command(self, name: str, value: str | None = None, raw: int | None = None) -> bool:
+        cmd = self.device_profile.command(name, value)
+        if cmd is None:
+            self.log(f"⚠️ El perfil {self.device_profile.model} no define el comando {name}:{value}")
+            return False
+        address, mapped = cmd
+        return self.write_register(address, mapped if raw is None else raw)
+
+    def restart(self) -> bool:
+        self._write_command("reset", raw=1)
+        self._write_command("reset", raw=0)
+        return self.turn_on()
+
+    def read_status(self) -> str | None:
+        """Read the drive status register (stop/fault/run) for command confirmation."""
+        addr = self.device_profile.registers.get("stat")
+        if addr is None:
+            return None
+        regs = self.read_holding_registers(addr, count=1)
+        if not regs:
+            return None
+        return self.device_profile.status(regs[0])
 
     def turn_on(self) -> bool:
-        return self.write_register(DEVICE["status"]["address"], DEVICE["status"]["values"]["on"])
+        return self._write_command("run", "on")
 
     def turn_off(self) -> bool:
-        return self.write_register(DEVICE["status"]["address"], DEVICE["status"]["values"]["off"])
-
-    def _build_signal_from_regs(self, regs: dict[int, int], modbus_dir) -> dict:
-        s = {}
-        for name, addr in modbus_dir.items():
-            v = regs.get(addr)
-            if v is None:
-                s[name] = None
-                continue
-            if name in MODBUS_SCALES:
-                s[name] = {"value": v * MODBUS_SCALES[name], "kind": "operation"}
-            else:
-                s[name] = {"value": v, "kind": "operation"}
-            if name == "stat":
-                s[name] = {"value": STATUS_TYPES_DIR.get(v, f"Desconocido ({v})"), "kind": "operation"}
-            if name == "dir":
-                s[name] = {"value": DIR_TYPE_DIR.get(v, f"Desconocido ({v})"), "kind": "operation"}
-        return s
+        return self._write_command("run", "off")
 
     def set_local(self) -> bool:
-        ok = self.write_register(DEVICE["mode"]["address"], DEVICE["mode"]["values"]["local"])
+        ok = self._write_command("mode", "local")
         self.log("✅ Puesto en local" if ok else "❌ No se pudo poner en local")
         return ok
 
     def set_remote(self) -> bool:
-        ok = self.write_register(DEVICE["mode"]["address"], DEVICE["mode"]["values"]["remote"])
+        ok = self._write_command("mode", "remote")
         self.log("✅ Puesto en remoto" if ok else "❌ No se pudo poner en remoto")
         return ok
 
     def start_reading(self):
         if not self.is_connected():
             return
-        signal_map = self._get_signal_map()
-        addrs = list(dict.fromkeys(signal_map.values()))
-        self.serial_poll = self.poll_registers(addresses=addrs, interval=self.poll_interval)
+        self.serial_poll = self.poll_registers(addresses=list(self.device_profile.addresses), interval=self.poll_interval)
 
-    def on_modbus_serial_read_callback(self, regs):
-        signal = self._build_signal_from_regs(regs, self._get_signal_map())
-        payload = {k: v for k, v in signal.items() if v is not None}
-        if payload:
-            self.send_signal(payload, "drive")
+    def on_modbus_serial_read_callback(self, regs, sampled_at=None):
+        with REGISTRY.timer("decode", **self._labels):
+            signal = self.device_profile.decode(regs)
+        if signal:
+            self.send_signal(signal, "drive", sampled_at=sampled_at)
     def update_config(self, port=None, baudrate=None, slave_id=None) -> bool:
         """Update TCP parameters and reconnect if needed."""
         changed = False
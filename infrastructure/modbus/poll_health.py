@@ -0,0 +1,185 @@
+import time
+from collections import deque
+from typing import Callable, Optional
+
+
+class PollHealth:
+    """
+    Cycle bookkeeping shared by the Modbus TCP / RTU and LOGO! poll loops.
+
+    - Deadline budget: each cycle has ``cycle_budget`` seconds; once it is spent
+      the remaining addresses are skipped and the next cycle starts where this
+      one stopped, so a slow register cannot starve the others.
+    - Register isolation: an address that fails ``quarantine_after`` times in a
+      row is quarantined for ``quarantine_cycles`` cycles (doubling on every
+      relapse up to ``max_quarantine_cycles``) and only probed once when due.
+    - Health score: success ratio over the last ``window`` reads. The link is
+      considered down when the ratio drops below ``1 - unhealthy_ratio`` or when
+      no read succeeds during ``dead_cycles`` consecutive cycles.
+    """
+
+    OK = "ok"
+    DEGRADED = "degraded"
+    DOWN = "down"
+
+    def __init__(
+        self,
+        log: Optional[Callable[[str], None]] = None,
+        name: str = "poll",
+        cycle_budget: float = 2.0,
+        window: int = 60,
+        min_samples: int = 10,
+        degraded_ratio: float = 0.2,
+        unhealthy_ratio: float = 0.8,
+        dead_cycles: int = 3,
+        quarantine_after: int = 5,
+        quarantine_cycles: int = 20,
+        max_quarantine_cycles: int = 640,
+    ) -> None:
+        self.log = log or (lambda msg: print(msg))
+        self.name = name
+        self.cycle_budget = cycle_budget
+        self.min_samples = min_samples
+        self.degraded_ratio = degraded_ratio
+        self.unhealthy_ratio = unhealthy_ratio
+        self.dead_cycles = dead_cycles
+        self.quarantine_after = quarantine_after
+        self.quarantine_cycles = quarantine_cycles
+        self.max_quarantine_cycles = max_quarantine_cycles
+
+        self._results: deque[bool] = deque(maxlen=window)
+        self.reset([])
+
+    # ---------------------------
+    # Ciclo
+    # ---------------------------
+    def reset(self, addresses: list) -> None:
+        """Start over with a new address list (called on every (re)connection)."""
+        self.addresses = list(dict.fromkeys(addresses))
+        self._cursor = 0
+        self._cycle = 0
+        self._deadline = 0.0
+        self._attempted = 0
+        self._planned = 0
+        self._last_address = None
+        self._cycle_successes = 0
+        self._cycles_without_success = 0
+        self._consecutive_failures: dict = {a: 0 for a in self.addresses}
+        self._quarantine_until: dict = {}
+        self._quarantine_length: dict = {}
+        self._results.clear()
+        self.state = self.OK
+        self.last_cycle_duration = 0.0
+        self.cycles_over_budget = 0
+
+    def begin_cycle(self, limit: Optional[int] = None) -> list:
+        """
+        Open a cycle and return the addresses to read, in order. ``limit`` caps
+        the plan (e.g. a single liveness probe on a standby link).
+        """
+        self._cycle += 1
+        self._cycle_started = time.monotonic()
+        self._deadline = self._cycle_started + self.cycle_budget
+        self._attempted = 0
+        self._cycle_successes = 0
+
+        ordered = self.addresses[self._cursor:] + self.addresses[:self._cursor]
+        plan = [a for a in ordered if self._quarantine_until.get(a, 0) <= self._cycle][:limit]
+        self._planned = len(plan)
+        return plan
+
+    def deadline_exceeded(self) -> bool:
+        return time.monotonic() >= self._deadline
+
+    def record(self, address, ok: bool) -> None:
+        """Register the outcome of one read."""
+        self._attempted += 1
+        self._last_address = address
+        self._results.append(ok)
+
+        if ok:
+            self._cycle_successes += 1
+            self._consecutive_failures[address] = 0
+            if address in self._quarantine_until:
+                del self._quarantine_until[address]
+                self._quarantine_length.pop(address, None)
+                self.log(f"✅ {self.name}: registro {address} sale de cuarentena")
+            return
+
+        fails = self._consecutive_failures.get(address, 0) + 1
+        self._consecutive_failures[address] = fails
+        if address in self._quarantine_until:
+            # Falló la sonda de re-prueba: cuarentena más larga
+            length = min(self._quarantine_length[address] * 2, self.max_quarantine_cycles)
+            self._quarantine(address, length)
+        elif fails >= self.quarantine_after:
+            self._quarantine(address, self.quarantine_cycles)
+
+    def end_cycle(self) -> str:
+        """Close the cycle, advance the rotation cursor and return the health state."""
+        self.last_cycle_duration = time.monotonic() - self._cycle_started
+        if self._attempted < self._planned:
+            self.cycles_over_budget += 1
+            # El siguiente ciclo arranca donde se cortó éste
+            if self._attempted:
+                self._cursor = (self.addresses.index(self._last_address) + 1) % len(self.addresses)
+
+        if self._attempted:
+            if self._cycle_successes:
+                self._cycles_without_success = 0
+            else:
+                self._cycles_without_success += 1
+
+        new_state = self._evaluate()
+        if new_state != self.state:
+            self.log(f"ℹ️ {self.name}: salud {self.state} → {new_state} (score={self.score:.2f})")
+            self.state = new_state
+        return self.state
+
+    # ---------------------------
+    # Estado
+    # ---------------------------
+    @property
+    def score(self) -> float:
+        """Success ratio over the sliding window (1.0 when there is no data)."""
+        if not self._results:
+            return 1.0
+        return sum(self._results) / len(self._results)
+
+    @property
+    def quarantined(self) -> list:
+        return sorted(self._quarantine_until, key=str)
+
+    def is_down(self) -> bool:
+        return self.state == self.DOWN
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "score": round(self.score, 3),
+            "quarantined": self.quarantined,
+            "cycleDuration": round(self.last_cycle_duration, 3),
+            "cyclesOverBudget": self.cycles_over_budget,
+        }
+
+    # ---------------------------
+    # Internos
+    # ---------------------------
+    def _quarantine(self, address, length: int) -> None:
+        self._quarantine_length[address] = length
+        self._quarantine_until[address] = self._cycle + length
+        self.log(f"🚧 {self.name}: registro {address} en cuarentena por {length} ciclos")
+
+    def _evaluate(self) -> str:
+        if self.addresses and len(self._quarantine_until) >= len(self.addresses):
+            return self.DOWN
+        if self._cycles_without_success >= self.dead_cycles:
+            return self.DOWN
+        if len(self._results) < self.min_samples:
+            return self.OK
+        failure_ratio = 1.0 - self.score
+        if failure_ratio >= self.unhealthy_ratio:
+            return self.DOWN
+        if failure_ratio >= self.degraded_ratio:
+            return self.DEGRADED
+        return self.OK
@@ -0,0 +1,162 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from infrastructure.mqtt.bandwidth import CRITICAL_FIELDS
+
+MODES = ("raw", "aggregated", "both")
+
+
+class _Window:
+    __slots__ = ("start", "stats")
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        # nombre -> [min, max, suma, n, último]
+        self.stats: Dict[str, list] = {}
+
+
+class WindowAggregator:
+    """
+    Edge aggregation between the drivers and MqttClient.
+
+    Numeric signals in ``aggregated``/``both`` mode are folded into a
+    wall-clock-aligned window of ``window`` seconds per (device, group):
+    min/max/sum/count/last, updated in place, so memory depends on the
+    number of signals and never on the sampling rate. Closed windows are
+    handed to ``publish(serial, group, aggregate)``. ``split()`` returns the
+    part of each sample that still goes out raw (``raw``/``both`` signals,
+    non-numeric values and ``CRITICAL_FIELDS``: states and faults are never
+    delayed).
+
+    Config (gateway.json ``aggregation``)::
+
+        {"windowS": 60, "default": "raw", "signals": {"freq": "aggregated", "curr": "both"}}
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, str, Dict[str, Any]], None],
+        window: float = 60.0,
+        default: str = "raw",
+        modes: Optional[Dict[str, str]] = None,
+        log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.publish = publish
+        self.window = float(window)
+        self.default = default if default in MODES else "raw"
+        self.modes = {k: v for k, v in (modes or {}).items() if v in MODES}
+        self.log = log or (lambda msg: print(msg))
+        self._windows: Dict[tuple, _Window] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, publish, cfg: Optional[Dict[str, Any]], log=None) -> Optional["WindowAggregator"]:
+        cfg = cfg or {}
+        log = log or (lambda msg: print(msg))
+        try:
+            window = float(cfg.get("windowS", 60))
+        except (TypeError, ValueError):
+            window = 0.0
+        if not window > 0:
+            log(f"⚠️ aggregation.windowS inválido ({cfg.get('windowS')!r}): agregación deshabilitada")
+            return None
+        aggregator = cls(publish, window, cfg.get("default", "raw"), cfg.get("signals"), log)
+        if aggregator.default == "raw" and all(m == "raw" for m in aggregator.modes.values()):
+            return None  # todo en crudo: la etapa no hace falta
+        return aggregator
+
+    def mode(self, name: str) -> str:
+        return self.modes.get(name, self.default)
+
+    # ---------------------------
+    # Ciclo de vida
+    # ---------------------------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._tick_loop, daemon=True)
+        self._thread.start()
+        self.log(f"📉 Agregación de señales cada {self.window:.0f}s (por defecto: {self.default})")
+
+    def stop(self) -> None:
+        """Stop the window timer and publish the windows in progress."""
+        self._stop_event.set()
+        self.flush()
+
+    def flush(self) -> None:
+        """Publish the windows in progress now (e.g. before the gateway identity changes)."""
+        self._close_windows(force=True)
+
+    # ---------------------------
+    # Etapa
+    # ---------------------------
+    def split(self, key: tuple, results: Dict[str, Any], ts: Optional[float] = None) -> Dict[str, Any]:
+        """Fold the aggregated signals of one sample and return the raw remainder."""
+        ts = time.time() if ts is None else ts
+        raw: Dict[str, Any] = {}
+        closed = None
+        with self._lock:
+            win = self._windows.get(key)
+            if win is not None and ts >= win.start + self.window:
+                closed = self._windows.pop(key)
+                win = None
+            for name, entry in results.items():
+                mode = self.mode(name)
+                value = entry.get("value") if isinstance(entry, dict) else entry
+                numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+                critical = name in CRITICAL_FIELDS or isinstance(entry, dict) and entry.get("kind") == "fault"
+                if mode == "raw" or not numeric or critical:
+                    raw[name] = entry
+                    continue
+                if mode == "both":
+                    raw[name] = entry
+                if win is None:
+                    win = self._windows[key] = _Window(ts - ts % self.window)
+                s = win.stats.get(name)
+                if s is None:
+                    win.stats[name] = [value, value, value, 1, value]
+                else:
+                    if value < s[0]:
+                        s[0] = value
+                    if value > s[1]:
+                        s[1] = value
+                    s[2] += value
+                    s[3] += 1
+                    s[4] = value
+        if closed is not None:
+            self._emit(key, closed)
+        return raw
+
+    def _tick_loop(self) -> None:
+        while not self._stop_event.wait(1.0):
+            self._close_windows()
+
+    def _close_windows(self, force: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            due = [k for k, w in self._windows.items() if force or now >= w.start + self.window]
+            closed = [(k, self._windows.pop(k)) for k in due]
+        for key, win in closed:
+            self._emit(key, win)
+
+    def _emit(self, key: tuple, win: _Window) -> None:
+        if not win.stats:
+            return
+        serial, group = key
+        aggregate = {
+            "group": group,
+            "start": win.start,
+            "windowS": self.window,
+            "signals": {
+                name: {"min": s[0], "max": s[1], "mean": s[2] / s[3], "last": s[4], "count": s[3]}
+                for name, s in win.stats.items()
+            },
+        }
+        try:
+            self.publish(serial, group, aggregate)
+        except Exception as e:
+            self.log(f"❌ Error publicando agregado de {serial}/{group}: {e}")
@@ -0,0 +1,232 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Sobrecarga aproximada por PUBLISH QoS1 (cabecera fija, packet id, propiedades v5, PUBACK)
+MQTT_OVERHEAD_BYTES = 10
+
+# Niveles de ahorro: intervalo mínimo entre envíos por (dispositivo, grupo)
+# y banda muerta relativa para valores numéricos. Las muestras retenidas se
+# resumen (min/max/media) en el siguiente envío.
+LEVELS = (
+    {"interval": 0.0, "deadband": 0.0},
+    {"interval": 5.0, "deadband": 0.005},
+    {"interval": 30.0, "deadband": 0.02},
+    {"interval": 300.0, "deadband": 0.05},
+)
+
+# Campos que siempre pasan cuando cambian (estado y fallos)
+CRITICAL_FIELDS = {"stat", "status", "fault", "alarm", "dir"}
+
+# Una falla activa se reenvía al menos con este intervalo aunque no cambie
+FAULT_HEARTBEAT_S = 60.0
+
+PERIODS = {"hourlyBytes": 3600, "dailyBytes": 86400}
+
+
+class _Stream:
+    __slots__ = ("last_sent_at", "sent", "agg", "held")
+
+    def __init__(self) -> None:
+        self.last_sent_at = 0.0
+        self.sent: Dict[str, Any] = {}
+        self.agg: Dict[str, list] = {}
+        self.held = 0
+
+
+class BandwidthGovernor:
+    """
+    Keeps telemetry within a per-gateway byte budget (``hourlyBytes`` and/or
+    ``dailyBytes``, calendar periods).
+
+    Every MQTT publish is accounted with ``account()``. From the usage
+    projected to the end of each period the governor picks a level in
+    ``LEVELS``; ``admit()`` then throttles signal payloads per
+    (device, group): minimum interval and relative deadband on numeric
+    values. Held samples are folded into a min/max/mean ``summary`` on the
+    next publish. Changes in status/fault fields (``CRITICAL_FIELDS``,
+    non-numeric values or ``kind == "fault"``) always go through, and an
+    active fault is repeated every ``FAULT_HEARTBEAT_S``. With no budget set
+    everything passes.
+
+    ``clock`` (wall time, for the calendar periods) and ``monotonic`` (for
+    the per-stream intervals) are injectable for tests.
+    """
+
+    def __init__(
+        self,
+        log,
+        budget: Optional[Dict[str, Any]] = None,
+        reevaluate_every: float = 10.0,
+        clock: Callable[[], float] = time.time,
+        monotonic: Callable[[], float] = time.monotonic,
+    ):
+        self.log = log
+        self.reevaluate_every = reevaluate_every
+        self.level = 0
+        self._clock = clock
+        self._monotonic = monotonic
+        self._lock = threading.Lock()
+        self._streams: Dict[tuple, _Stream] = {}
+        now = clock()
+        self._usage = {key: [self._period_start(p, now), 0] for key, p in PERIODS.items()}
+        self._evaluated_at = 0.0
+        self.budget: Dict[str, int] = {}
+        self.set_budget(budget)
+
+    # ---------- Budget ----------
+    def set_budget(self, budget: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        clean = {}
+        for key in PERIODS:
+            try:
+                value = int((budget or {}).get(key) or 0)
+            except (TypeError, ValueError):
+                value = 0
+            if value > 0:
+                clean[key] = value
+        with self._lock:
+            self.budget = clean
+            self._evaluated_at = 0.0
+        self.log(f"📊 Presupuesto de datos: {clean or 'sin límite'}")
+        return clean
+
+    def usage(self) -> Dict[str, float]:
+        with self._lock:
+            self._roll(self._clock())
+            out = {f"bandwidth_{key}": used for key, (_, used) in self._usage.items()}
+        out["bandwidth_level"] = self.level
+        return out
+
+    # ---------- Accounting ----------
+    def account(self, topic: str, payload) -> None:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        size = len(topic.encode()) + len(payload) + MQTT_OVERHEAD_BYTES
+        with self._lock:
+            self._roll(self._clock())
+            for entry in self._usage.values():
+                entry[1] += size
+
+    @staticmethod
+    def _period_start(seconds: int, now: float) -> float:
+        if seconds == 86400:
+            t = time.localtime(now)
+            return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1))
+        return now - now % seconds
+
+    def _roll(self, now: float) -> None:
+        for key, seconds in PERIODS.items():
+            entry = self._usage[key]
+            if now - entry[0] >= seconds:
+                entry[0] = self._period_start(seconds, now)
+                entry[1] = 0
+
+    def _evaluate(self, now: float) -> None:
+        """Pick the level from the usage projected to the end of each period."""
+        level = 0
+        self._roll(now)
+        for key, limit in self.budget.items():
+            start, used = self._usage[key]
+            elapsed = max((now - start) / PERIODS[key], 0.1)
+            ratio = max(used / elapsed, used) / limit
+            if used >= limit or ratio >= 1.5:
+                level = max(level, 3)
+            elif ratio >= 1.0:
+                level = max(level, 2)
+            elif ratio >= 0.8:
+                level = max(level, 1)
+        if level != self.level:
+            self.log(f"📉 Nivel de ahorro de datos {self.level} → {level}")
+            self.level = level
+        self._evaluated_at = now
+
+    # ---------- Admission ----------
+    def admit(self, key: tuple, signal_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the payload to publish now (possibly with a ``summary``), or None to hold it."""
+        payload = signal_info.get("payload")
+        if not self.budget or not isinstance(payload, dict):
+            return signal_info
+
+        now = self._clock()
+        mono = self._monotonic()
+        with self._lock:
+            if now - self._evaluated_at >= self.reevaluate_every:
+                self._evaluate(now)
+            cfg = LEVELS[self.level]
+            stream = self._streams.setdefault(key, _Stream())
+
+            if self.level == 0 and not stream.held:
+                stream.last_sent_at = mono
+                stream.sent = {name: self._value(v) for name, v in payload.items()}
+                stream.agg = {}
+                return signal_info
+
+            for name, value in self._numeric(payload).items():
+                agg = stream.agg.get(name)
+                if agg is None:
+                    stream.agg[name] = [value, value, value, 1]
+                else:
+                    agg[0] = min(agg[0], value)
+                    agg[1] = max(agg[1], value)
+                    agg[2] += value
+                    agg[3] += 1
+
+            elapsed = mono - stream.last_sent_at
+            critical = self._critical_change(stream.sent, payload)
+            fault_due = elapsed >= FAULT_HEARTBEAT_S and self._fault_active(payload)
+            due = elapsed >= cfg["interval"]
+            heartbeat = elapsed >= max(cfg["interval"] * 10, 60)
+            if not (critical or fault_due or self.level == 0) and not (
+                due and (heartbeat or self._moved(stream.sent, payload, cfg["deadband"]))
+            ):
+                stream.held += 1
+                return None
+
+            out = signal_info
+            if stream.held and stream.agg:
+                out = dict(signal_info)
+                out["summary"] = {
+                    "windowS": round(mono - stream.last_sent_at, 1) if stream.last_sent_at else None,
+                    "fields": {
+                        name: {"min": a[0], "max": a[1], "mean": a[2] / a[3], "n": a[3]}
+                        for name, a in stream.agg.items()
+                    },
+                }
+            stream.agg = {}
+            stream.held = 0
+            stream.last_sent_at = mono
+            stream.sent = {name: self._value(v) for name, v in payload.items()}
+            return out
+
+    @staticmethod
+    def _value(entry):
+        return entry.get("value") if isinstance(entry, dict) else entry
+
+    def _numeric(self, payload: Dict[str, Any]) -> Dict[str, float]:
+        out = {}
+        for name, entry in payload.items():
+            value = self._value(entry)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and name not in CRITICAL_FIELDS:
+                out[name] = value
+        return out
+
+    def _critical_change(self, sent: Dict[str, Any], payload: Dict[str, Any]) -> bool:
+        for name, entry in payload.items():
+            value = self._value(entry)
+            is_fault = isinstance(entry, dict) and entry.get("kind") == "fault"
+            numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if (name in CRITICAL_FIELDS or is_fault or not numeric) and sent.get(name, object()) != value:
+                return True
+        return False
+
+    def _fault_active(self, payload: Dict[str, Any]) -> bool:
+        return any(isinstance(entry, dict) and entry.get("kind") == "fault" for entry in payload.values())
+
+    def _moved(self, sent: Dict[str, Any], payload: Dict[str, Any], deadband: float) -> bool:
+        for name, value in self._numeric(payload).items():
+            previous = sent.get(name)
+            if previous is None:
+                return True
+            if abs(value - previous) > deadband * max(abs(previous), 1e-9):
+                return True
+        return False
@@ -1,22 +1,16 @@
-import json
+import collections
 import threading
 import ssl
 import time
 from typing import Any, Dict, Optional, Callable
 
-import certifi
 from paho.mqtt import client as mqtt
 from paho.mqtt.client import topic_matches_sub
-from bson import ObjectId
 
-from infrastructure.config.loader import load_config
-
-cfg = load_config()
-
-MQTT_HOST = cfg["MQTT_HOST"]
-MQTT_PORT = cfg["MQTT_PORT"]
-MQTT_USER = cfg.get("MQTT_USER")
-MQTT_PASS = cfg.get("MQTT_PASS")
+from infrastructure.codec import json_codec
+from infrastructure.config.loader import get_mqtt_config
+from infrastructure.metrics.metrics import REGISTRY
+from infrastructure.mqtt.bandwidth import BandwidthGovernor
 
 
 class MqttClient:
@@ -26,12 +20,22 @@ class MqttClient:
         on_initial_load: Callable[[], None],
         log_callback: Callable[[str], None],
         command_callback: Callable[[Optional[str], Any], None],
-        command_gateway_callback: Callable[[Optional[str], Any], None]
+        command_gateway_callback: Callable[[Optional[str], Any], None],
+        mqtt_config: Optional[Dict[str, Any]] = None,
+        history_callback: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
     ) -> None:
         self.log = log_callback
+
+        # Broker: se lee al instanciar (no al importar el módulo)
+        mqtt_config = mqtt_config or get_mqtt_config()
+        self.host = mqtt_config.get("MQTT_HOST")
+        self.port = mqtt_config.get("MQTT_PORT")
+        self.user = mqtt_config.get("MQTT_USER")
+        self.password = mqtt_config.get("MQTT_PASS")
         self.command_gateway_callback = command_gateway_callback
         self.command_callback = command_callback
         self.on_initial_load = on_initial_load
+        self.history_callback = history_callback
 
         self.client: Optional[mqtt.Client] = None
         self._loop_started = False
@@ -43,25 +47,54 @@ class MqttClient:
         self._cfg_ev = threading.Event()
         self._cfg_out: Dict[str, Any] = {}
 
+        # Metrics: mid -> (enqueued_at, sampled_at, labels) until PUBACK
+        self._inflight: Dict[int, tuple] = {}
+        self._inflight_lock = threading.Lock()
+        self._max_inflight_tracked = 5000
+        self._connect_started: Optional[float] = None
+        self.metrics_interval = 60
+        self._metrics_thread: Optional[threading.Thread] = None
+        REGISTRY.register_collector("mqtt", self._queue_depths)
+
+        # Modo offline: sin sesión con el broker no se codifica telemetría; se
+        # retiene solo el último valor por (tópico, grupo). ``_link_down`` es el
+        # estado confirmado por los sondeos y solo acelera la reconexión.
+        self._link_down = False
+        self._pending: Dict[tuple, tuple] = {}
+        self._pending_lock = threading.Lock()
+        # Agregados por ventana: pocos y valiosos, se retienen (acotados) sin enlace
+        self._pending_aggregates: collections.deque = collections.deque(maxlen=2000)
+        self._reconnect_lock = threading.Lock()
+        self._link_restored_at: Optional[float] = None
+
+        # Presupuesto de datos (gateway.json "bandwidth_budget")
+        self.governor = BandwidthGovernor(self.log, gateway.get("bandwidth_budget"))
+        REGISTRY.register_collector("bandwidth", self.governor.usage)
+
         # Cache org/gw ids
         self.org_id = self._get(self.gateway, "organizationId", "organization_id")
         self.gw_id = self._get(self.gateway, "gatewayId", "gateway_id")
         if not self.org_id or not self.gw_id:
             self.log("⚠️ Missing organizationId / gatewayId in config")
+        self._build_topics()
 
-        # Topics (convenience variables built once)
+        self._log_initial_config()
+
+    def _build_topics(self) -> None:
+        """Topics (convenience variables) for the current org/gateway ids."""
         self.deviceCommandTopic = self._topic_subscribe_command(self.org_id, self.gw_id)
         self.gatewayCommandTopic = self._topic_subscribe_gateway_command(self.org_id, self.gw_id)
         self.gatewayRespTopic = self._topic_subscribe_gateway_resp(self.org_id, self.gw_id)
         self.gatewayReqTopic = self._topic_publish_gateway_req(self.org_id, self.gw_id)
         self.deviceReqTopic = self._topic_publish_device_req(self.org_id, self.gw_id)
         self.deviceRespTopic = self._topic_subscribe_device_resp(self.org_id, self.gw_id)
-
-        self._log_initial_config()
+        self.gatewayMetricsTopic = self._topic_publish_gateway_metrics(self.org_id, self.gw_id)
+        self.historyReqTopic = self._topic_subscribe_history_req(self.org_id, self.gw_id)
+        self.historyRespTopic = self._topic_publish_history_resp(self.org_id, self.gw_id)
 
     # ---------- Helpers ----------
     def _log_initial_config(self) -> None:
-        self.log(f"🔧 MQTT -> host={MQTT_HOST}, port={MQTT_PORT}")
+        self.log(f"🔧 MQTT -> host={self.host}, port={self.port}")
 
     @staticmethod
     def _get(gw: Dict[str, Any], *keys: str) -> Optional[str]:
@@ -102,26 +135,49 @@ class MqttClient:
     def _topic_publish_device_status(self, org_id:str, gw_id: str, serial:str) -> str:
         return f"tenant/{org_id}/gateway/{gw_id}/device/{serial}/status"
 
+    def _topic_publish_fault_events(self, org_id: str, gw_id: str, serial: str) -> str:
+        return f"tenant/{org_id}/gateway/{gw_id}/device/{serial}/faults"
+
+    def _topic_publish_aggregate(self, org_id: str, gw_id: str, serial: str) -> str:
+        return f"tenant/{org_id}/gateway/{gw_id}/device/{serial}/aggregate"
+
+    def _topic_publish_command_result(self, org_id: str, gw_id: str, serial: str) -> str:
+        return f"tenant/{org_id}/gateway/{gw_id}/device/{serial}/command/result"
+
+    def _topic_publish_gateway_metrics(self, org_id: str, gw_id: str) -> str:
+        return f"tenant/{org_id}/gateway/{gw_id}/metrics"
+
+    def _topic_subscribe_history_req(self, org_id: str, gw_id: str) -> str:
+        return f"tenant/{org_id}/gateway/{gw_id}/history/request"
+
+    def _topic_publish_history_resp(self, org_id: str, gw_id: str) -> str:
+        return f"tenant/{org_id}/gateway/{gw_id}/history/response"
+
     # ---------- Connection ----------
     def connect(self) -> None:
         """Configura el cliente, TLS/LWT y activa auto-reconnect en background."""
-        broker = MQTT_HOST
-        port = MQTT_PORT
+        broker = self.host
+        port = self.port
         if not broker:
             self.log("MQTT_HOST not configured")
             return
 
-        client_id = f"gateway_py_{self.gw_id or ObjectId()}"
+        if self.gw_id:
+            client_id = f"gateway_py_{self.gw_id}"
+        else:
+            from bson import ObjectId
+            client_id = f"gateway_py_{ObjectId()}"
         self.client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv5)
 
-        if MQTT_USER and MQTT_PASS:
-            self.client.username_pw_set(MQTT_USER, MQTT_PASS)
+        if self.user and self.password:
+            self.client.username_pw_set(self.user, self.password)
             self.log("🔐 Credentials set")
 
         lwt_topic = f"tenant/{self.org_id}/gateway/{self.gw_id}/status"
-        self.client.will_set(lwt_topic, json.dumps({"status": "offline"}), qos=1, retain=False)
+        self.client.will_set(lwt_topic, json_codec.dumps({"status": "offline"}), qos=1, retain=False)
 
         if port == 8883:
+            import certifi
             ca = certifi.where()
             self.client.tls_set(ca_certs=ca, tls_version=ssl.PROTOCOL_TLS_CLIENT)
             self.client.tls_insecure_set(False)
@@ -130,16 +186,22 @@ class MqttClient:
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
         self.client.on_message = self.on_message
+        self.client.on_publish = self.on_publish
         self.client.on_log = self.on_log
 
         self.client.reconnect_delay_set(min_delay=1, max_delay=30)
 
+        self._connect_started = time.monotonic()
         self.client.connect_async(broker, port, keepalive=30)
         if not self._loop_started:
             self.client.loop_start()
             self._loop_started = True
             self.log("⌛ MQTT loop started (auto-reconnect enabled)")
 
+        if not (self._metrics_thread and self._metrics_thread.is_alive()):
+            self._metrics_thread = threading.Thread(target=self._metrics_loop, daemon=True)
+            self._metrics_thread.start()
+
     def disconnect(self) -> None:
         """Disconnect the MQTT client and stop loop."""
         self._stop_event.set()
@@ -155,9 +217,45 @@ class MqttClient:
             self._loop_started = False
             self.log("👋 MQTT disconnected")
 
+    @classmethod
+    def identity_of(cls, gateway: Dict[str, Any]) -> tuple:
+        """``(organizationId, gatewayId)`` of a gateway config."""
+        return cls._get(gateway, "organizationId", "organization_id"), cls._get(gateway, "gatewayId", "gateway_id")
+
+    def identity_changed(self, gateway: Dict[str, Any]) -> bool:
+        return self.identity_of(gateway) != (self.org_id, self.gw_id)
+
+    def set_identity(self, gateway: Dict[str, Any]) -> bool:
+        """
+        Adopt a new gateway config. Only a change of organizationId/gatewayId
+        needs a new session (client id, LWT and topics); otherwise the live
+        connection is kept. Returns True if the client reconnected.
+        """
+        self.gateway = gateway
+        org_id, gw_id = self.identity_of(gateway)
+        if (org_id, gw_id) == (self.org_id, self.gw_id):
+            return False
+
+        self.log(f"🔁 Nueva identidad MQTT: {self.org_id}/{self.gw_id} → {org_id}/{gw_id}")
+        self.disconnect()
+        self.org_id, self.gw_id = org_id, gw_id
+        self._build_topics()
+        # Lo retenido pertenece a los tópicos de la identidad anterior
+        with self._pending_lock:
+            self._pending.clear()
+            self._pending_aggregates.clear()
+        self._connected_evt.clear()
+        self._stop_event.clear()
+        self.connect()
+        return True
+
     # ---------- Paho callbacks ----------
     def on_connect(self, client: mqtt.Client, userdata, flags, reason_code, properties=None) -> None:
         self.log(f"✅ Connected (rc={reason_code})")
+        if self._connect_started is not None:
+            REGISTRY.observe("connect", time.monotonic() - self._connect_started, transport="mqtt")
+            self._connect_started = None
+        REGISTRY.inc("connects", transport="mqtt")
 
         if not self.org_id or not self.gw_id:
             self.log("⚠️ Missing organizationId / gatewayId in config")
@@ -168,20 +266,59 @@ class MqttClient:
 
         client.subscribe(self.gatewayCommandTopic, qos=1)
         self.log(f"Subscribed to commands: {self.gatewayCommandTopic}")
+
+        if self.history_callback:
+            client.subscribe(self.historyReqTopic, qos=1)
+            self.log(f"Subscribed to history requests: {self.historyReqTopic}")
         # Publish online status
         online_topic = f"tenant/{self.org_id}/gateway/{self.gw_id}/status"
-        self._publish(online_topic, json.dumps({"status": "online"}), qos=1)
+        self._publish(online_topic, json_codec.dumps({"status": "online"}), qos=1)
         self.on_initial_load()
         self._connected_evt.set()
+        self._flush_pending()
+
+    def send_command_result(self, device_serial: str, result: Dict[str, Any]) -> None:
+        topic = self._topic_publish_command_result(self.org_id, self.gw_id, device_serial)
+        self._publish(topic, json_codec.dumps(result), qos=1)
+
+    def send_fault_events(self, device_serial: str, events: list) -> bool:
+        """Publish new drive fault events. False when offline: the caller keeps its cursor and retries."""
+        if self._is_offline():
+            return False
+        topic = self._topic_publish_fault_events(self.org_id, self.gw_id, device_serial)
+        return self._publish(topic, json_codec.dumps({"events": events}), qos=1)
 
     def on_change_device_connection(self, device_serial, status, logo_status):
         device_connection_topic = self._topic_publish_device_status(self.org_id, self.gw_id, device_serial)
-        self._publish(device_connection_topic, json.dumps({"status": status, "logoStatus": logo_status}), qos=1)
+        self._publish(device_connection_topic, json_codec.dumps({"status": status, "logoStatus": logo_status}), qos=1)
 
     def on_disconnect(self, client: mqtt.Client, userdata, flags, reason_code, properties=None) -> None:
         print("on_disconnect mqtt")
         self.log(f"⚠️ Disconnected (rc={reason_code})")
         self._connected_evt.clear()
+        REGISTRY.inc("disconnects", transport="mqtt")
+        # paho reintenta solo; medimos la reconexión desde aquí
+        self._connect_started = time.monotonic()
+
+    def on_publish(self, client, userdata, mid) -> None:
+        with self._inflight_lock:
+            entry = self._inflight.pop(mid, None)
+        if entry is None:
+            return
+        enqueued_at, sampled_at, labels = entry
+        now = time.monotonic()
+        REGISTRY.observe("publish", now - enqueued_at, **labels)
+        if sampled_at is not None:
+            REGISTRY.observe("sample_age", now - sampled_at, **labels)
+
+        restored_at = self._link_restored_at
+        if restored_at is not None:
+            # Primera muestra entregada (PUBACK) tras recuperar el enlace
+            self._link_restored_at = None
+            elapsed = now - restored_at
+            REGISTRY.observe("link_recovery", elapsed)
+            REGISTRY.set_gauge("link_recovery_seconds", round(elapsed, 3))
+            self.log(f"⏱️ Primera muestra entregada {elapsed:.1f}s después de recuperar el enlace")
 
     def on_log(self, client, userdata, level, buf) -> None:
         if level >= mqtt.MQTT_LOG_INFO:
@@ -197,7 +334,7 @@ class MqttClient:
             except Exception:
                 device_id = None
             try:
-                payload = json.loads(msg.payload.decode("utf-8"))
+                payload = json_codec.loads(msg.payload)
             except Exception:
                 payload = msg.payload  # raw if not JSON
             self.command_callback(device_id, payload)
@@ -207,17 +344,21 @@ class MqttClient:
 
             parts = msg.topic.split("/")
             try:
-                payload = json.loads(msg.payload.decode("utf-8"))
+                payload = json_codec.loads(msg.payload)
             except Exception:
                 payload = msg.payload
             self.command_gateway_callback(payload)
             self.log(f"[MQTT-CMD] payload={payload}")
             return
 
+        if msg.topic == self.historyReqTopic and self.history_callback:
+            self._on_history_request(msg.payload)
+            return
+
         # Config response
         if msg.topic == self.gatewayRespTopic and self._cfg_ev is not None:
             try:
-                data = json.loads(msg.payload.decode("utf-8"))
+                data = json_codec.loads(msg.payload)
             except Exception as e:
                 self.log(f"[CFG] json error: {e}")
                 return
@@ -230,13 +371,101 @@ class MqttClient:
         # Other
         self.log(f"[RX] {msg.topic} ({len(msg.payload)} bytes)")
 
+    def _on_history_request(self, raw: bytes) -> None:
+        """Answer a history query on history/response, echoing its ``requestId``."""
+        request: Any = {}
+        try:
+            request = json_codec.loads(raw)
+            response = self.history_callback(request)
+        except Exception as e:
+            response = {"error": str(e)}
+        response["requestId"] = request.get("requestId") if isinstance(request, dict) else None
+        self._publish(self.historyRespTopic, json_codec.dumps(response), qos=1)
+
+    # ---------- Connectivity ----------
+    def set_link_state(self, online: bool) -> None:
+        """
+        Fed by ConnectivityMonitor with the probe-confirmed state. Link-up
+        retries the broker immediately instead of waiting for paho's backoff.
+        Offline mode itself follows the broker session (``_is_offline``): a
+        broker reachable over another route keeps receiving telemetry.
+        """
+        if not online:
+            if not self._link_down:
+                self.log("📴 Sin conexión a Internet según los sondeos")
+            self._link_down = True
+            self._link_restored_at = None
+            return
+
+        was_down = self._link_down
+        self._link_down = False
+        if was_down:
+            self._link_restored_at = time.monotonic()
+            self.log("📶 Enlace recuperado")
+        if self._connected_evt.is_set():
+            self._flush_pending()
+        elif was_down:
+            threading.Thread(target=self.reconnect_now, daemon=True).start()
+
+    def reconnect_now(self) -> None:
+        """Reconnect right away, cutting short paho's reconnect backoff."""
+        if not self.client or self._connected_evt.is_set() or self._stop_event.is_set():
+            return
+        if not self._reconnect_lock.acquire(blocking=False):
+            return
+        try:
+            self.log("🔄 Reconectando MQTT tras recuperar el enlace...")
+            self._connect_started = time.monotonic()
+            try:
+                # loop_stop corta la espera de backoff del hilo de paho (≤1 s)
+                self.client.loop_stop()
+            except Exception:
+                pass
+            try:
+                self.client.reconnect()
+            except Exception as e:
+                self.log(f"⚠️ Reconexión inmediata fallida, paho reintentará: {e}")
+            self.client.loop_start()
+        finally:
+            self._reconnect_lock.release()
+
+    def _is_offline(self) -> bool:
+        return not self._connected_evt.is_set()
+
+    def _flush_pending(self) -> None:
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            aggregates = list(self._pending_aggregates)
+            self._pending_aggregates.clear()
+        for topic, payload in aggregates:
+            self._publish(topic, payload, qos=1)
+        if not pending:
+            return
+        self.log(f"📤 Enviando {len(pending)} valores retenidos en modo offline")
+        for topic, signal_info, sampled_at, labels in pending:
+            # También pasan por el presupuesto: una reconexión no debe saturar el enlace medido
+            self._admit_and_publish(topic, signal_info, sampled_at, labels)
+
     # ---------- Publish utilities ----------
-    def _publish(self, topic: str, payload: str, qos: int = 1) -> bool:
+    def _publish(self, topic: str, payload: bytes, qos: int = 1, track: Optional[tuple] = None) -> bool:
+        """
+        Publish ``payload``. ``track`` = ``(sampled_at, labels)`` records enqueue,
+        publish (until PUBACK) and sample-age metrics for this message.
+        """
         if not self.client:
             self.log("⚠️ MQTT client not ready to publish.")
             return False
         try:
+            t0 = time.monotonic()
             info = self.client.publish(topic, payload, qos=qos)
+            if track is not None:
+                sampled_at, labels = track
+                REGISTRY.observe("enqueue", time.monotonic() - t0, info.rc == mqtt.MQTT_ERR_SUCCESS, **labels)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self._track_inflight(info.mid, t0, sampled_at, labels)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.governor.account(topic, payload)
             if info.rc != mqtt.MQTT_ERR_SUCCESS:
                 self.log(f"⚠️ publish() failed rc={info.rc} topic={topic}")
                 print(self.log(f"⚠️ publish() failed rc={info.rc} topic={topic}"))
@@ -246,8 +475,35 @@ class MqttClient:
             self.log(f"❌ Error publishing to {topic}: {e}")
             return False
 
+    def _track_inflight(self, mid: int, enqueued_at: float, sampled_at: Optional[float], labels: Dict[str, str]) -> None:
+        with self._inflight_lock:
+            if len(self._inflight) >= self._max_inflight_tracked:
+                # Sin PUBACK durante mucho tiempo: descartamos el más antiguo
+                self._inflight.pop(next(iter(self._inflight)))
+            self._inflight[mid] = (enqueued_at, sampled_at, labels)
+
+    def _queue_depths(self) -> Dict[str, float]:
+        client = self.client
+        return {
+            "queue_out": len(getattr(client, "_out_messages", {}) or {}) if client else 0,
+            "queue_inflight": len(self._inflight),
+            "queue_offline": len(self._pending),
+            "queue_offline_aggregates": len(self._pending_aggregates),
+        }
+
+    def _metrics_loop(self) -> None:
+        """Publish a compact gateway health message every ``metrics_interval`` seconds."""
+        while not self._stop_event.wait(self.metrics_interval):
+            if not self._connected_evt.is_set():
+                continue
+            try:
+                payload = json_codec.dumps(REGISTRY.summary())
+                self._publish(self.gatewayMetricsTopic, payload, qos=0)
+            except Exception as e:
+                self.log(f"⚠️ Error publicando métricas: {e}")
+
     # ---------- Public API ----------
-    def send_signal(self, topic_info: Dict[str, str], signal_info: Dict[str, Any]) -> None:
+    def send_signal(self, topic_info: Dict[str, str], signal_info: Dict[str, Any], sampled_at: Optional[float] = None) -> None:
         org_id = topic_info.get("organization_id") or topic_info.get("organizationId")
         gw_id = topic_info.get("gateway_id") or topic_info.get("gatewayId")
         serial = topic_info.get("serial_number") or topic_info.get("serialNumber")
@@ -257,15 +513,46 @@ class MqttClient:
             return
 
         topic = self._topic_publish_signal(org_id, gw_id, serial)
-        if self._publish(topic, json.dumps(signal_info, default=str), qos=1):
+        labels = {"device": serial, "group": signal_info.get("group"), "transport": signal_info.get("source")}
+        if self._is_offline():
+            # Sin enlace no tiene sentido codificar ni encolar: solo el último valor
+            with self._pending_lock:
+                if self._pending.pop((topic, labels["group"]), None) is not None:
+                    REGISTRY.inc("offline_coalesced", device=serial)
+                self._pending[(topic, labels["group"])] = (topic, signal_info, sampled_at, labels)
+            return
+        self._admit_and_publish(topic, signal_info, sampled_at, labels)
+
+    def _admit_and_publish(self, topic: str, signal_info: Dict[str, Any], sampled_at: Optional[float], labels: Dict[str, Any]) -> None:
+        signal_info = self.governor.admit((labels["device"], labels["group"]), signal_info)
+        if signal_info is None:
+            REGISTRY.inc("budget_held", device=labels["device"])
+            return
+        self._publish_signal(topic, signal_info, sampled_at, labels)
+
+    def send_aggregate(self, device_serial: str, group: str, aggregate: Dict[str, Any]) -> None:
+        """Publish one closed aggregation window on device/<serial>/aggregate."""
+        topic = self._topic_publish_aggregate(self.org_id, self.gw_id, device_serial)
+        payload = json_codec.dumps(aggregate)
+        if self._is_offline():
+            with self._pending_lock:
+                self._pending_aggregates.append((topic, payload))
+            return
+        if self._publish(topic, payload, qos=1):
+            self.log(f"📤 Aggregate → {topic}")
+
+    def _publish_signal(self, topic: str, signal_info: Dict[str, Any], sampled_at: Optional[float], labels: Dict[str, Any]) -> None:
+        with REGISTRY.timer("encode", **labels):
+            payload = json_codec.dumps(signal_info)
+        if self._publish(topic, payload, qos=1, track=(sampled_at, labels)):
             self.log(f"📤 Signal → {topic}")
 
     def request_gateway_config(self, cb: Callable) -> None:
         self.client.message_callback_add(self.gatewayRespTopic, cb)
         self.client.subscribe(self.gatewayRespTopic, qos=1)
-        self.client.publish(self.gatewayReqTopic, json.dumps({"timestamp": time.time()}), qos=1)
+        self.client.publish(self.gatewayReqTopic, json_codec.dumps({"timestamp": time.time()}), qos=1)
 
     def request_devices(self, cb: Callable) -> None:
         self.client.message_callback_add(self.deviceRespTopic, cb)
         self.client.subscribe(self.deviceRespTopic, qos=1)
-        self.client.publish(self.deviceReqTopic, json.dumps({"timestamp": time.time()}), qos=1)
+        self.client.publish(self.deviceReqTopic, json_codec.dumps({"timestamp": time.time()}), qos=1)
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from infrastructure.config.store import write_json_atomic
+
+# Perfiles de modelo empaquetados y perfiles locales (data/profiles/models),
+# estos últimos instalados desde la nube sin publicar una versión.
+PACKAGED_MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+LOCAL_MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../..", "data", "profiles", "models")
+DEFAULT_MODEL = "default"
+PROTOCOLS = ("modbus-tcp", "modbus-rtu", "logo")
+
+_profiles: Dict[Tuple[str, str], "DriverProfile"] = {}
+_overlays: Dict[Tuple[str, str], "DriverProfile"] = {}
+_lock = threading.Lock()
+# Destino de los diagnósticos de perfiles inválidos (ver set_logger)
+_log: Callable[[str], None] = print
+
+
+def set_logger(log: Callable[[str], None]) -> None:
+    """Send invalid-profile diagnostics to ``log`` (the app log) instead of stdout."""
+    global _log
+    _log = log or print
+
+
+class DriverProfile:
+    """
+    Immutable register map of one device model over one protocol.
+
+    ``signals`` entries are ``{"address", "scale"?, "enum"?, "decoder"?}``;
+    ``commands`` map a command name to ``{"address", "values"?}``. The read
+    plan (``addresses``) and the decode plan are compiled once, and a single
+    instance is shared by every device of the model: drivers must not mutate
+    it nor the entries returned by ``decode()``.
+
+    Invalid entries (address, scale, enum key, command) are logged and
+    skipped; ``errors`` lists them so an incoming profile can be rejected.
+    """
+
+    def __init__(self, model: str, protocol: str, spec: Mapping[str, Any]) -> None:
+        self.model = model
+        self.protocol = protocol
+        self.errors: list = []
+        if not isinstance(spec, dict):
+            self._invalid("perfil", spec)
+            spec = {}
+        signals = spec.get("signals") or {}
+        commands = spec.get("commands") or {}
+        if not isinstance(signals, dict):
+            self._invalid("signals", signals)
+            signals = {}
+        if not isinstance(commands, dict):
+            self._invalid("commands", commands)
+            commands = {}
+
+        plan = []
+        for name, entry in signals.items():
+            if not isinstance(entry, dict):
+                entry = {"address": entry}
+            try:
+                address = int(entry["address"])
+                scale = entry.get("scale")
+                scale = float(scale) if scale is not None else None
+                raw_enum = entry.get("enum") or {}
+                if not isinstance(raw_enum, dict):
+                    raise TypeError("enum")
+            except (KeyError, TypeError, ValueError):
+                self._invalid(f"registro {name}", entry)
+                continue
+            enum = {}
+            for k, v in raw_enum.items():
+                try:
+                    enum[int(k)] = {"value": v, "kind": "operation"}
+                except (TypeError, ValueError):
+                    self._invalid(f"enum de {name}", k)
+            plan.append((str(name), address, scale, enum, entry.get("decoder")))
+
+        compiled = {}
+        for name, cmd in commands.items():
+            try:
+                values = cmd.get("values") or {}
+                if not isinstance(values, dict):
+                    raise TypeError("values")
+                compiled[name] = MappingProxyType({"address": int(cmd["address"]), "values": MappingProxyType(dict(values))})
+            except (AttributeError, KeyError, TypeError, ValueError):
+                self._invalid(f"comando {name}", cmd)
+
+        self._plan: Tuple[tuple, ...] = tuple(plan)
+        self.registers: Mapping[str, int] = MappingProxyType({name: addr for name, addr, *_ in plan})
+        self.addresses: Tuple[int, ...] = tuple(dict.fromkeys(self.registers.values()))
+        self.commands: Mapping[str, Mapping[str, Any]] = MappingProxyType(compiled)
+        self.status_profile: Optional[str] = spec.get("statusProfile")
+
+    def _invalid(self, what: str, value: Any) -> None:
+        self.errors.append(f"{what}: {value!r}")
+        _log(f"⚠️ Perfil {self.model}/{self.protocol}: {what} inválido: {value!r}")
+
+    def __repr__(self) -> str:
+        return f"DriverProfile({self.model!r}, {self.protocol!r}, {len(self._plan)} señales)"
+
+    def decode(self, regs: Mapping[int, int], status_decoder=None) -> Dict[str, Any]:
+        """Signals present in ``regs`` (address -> raw word), decoded per the plan."""
+        signal: Dict[str, Any] = {}
+        for name, address, scale, enum, decoder in self._plan:
+            value = regs.get(address)
+            if value is None:
+                continue
+            if decoder == "status" and status_decoder is not None:
+                signal[name] = status_decoder.decode(value)
+            elif enum:
+                signal[name] = enum.get(value) or {"value": f"Desconocido ({value})", "kind": "operation"}
+            elif scale is not None:
+                signal[name] = {"value": value * scale, "kind": "operation"}
+            else:
+                signal[name] = {"value": value, "kind": "operation"}
+        return signal
+
+    def status(self, raw: int) -> str:
+        """Map the raw ``stat`` word to ``stop``/``fault``/``run`` for command confirmation."""
+        for name, _, _, enum, _ in self._plan:
+            if name == "stat":
+                entry = enum.get(raw)
+                return entry["value"] if entry else f"Desconocido ({raw})"
+        return f"Desconocido ({raw})"
+
+    def command(self, name: str, value: Optional[str] = None) -> Optional[Tuple[int, Any]]:
+        """``(address, raw value)`` of a write command, or ``None`` if the model lacks it."""
+        cmd = self.commands.get(name)
+        if cmd is None:
+            return None
+        if value is None:
+            return cmd["address"], None
+        raw = cmd["values"].get(value)
+        return None if raw is None else (cmd["address"], raw)
+
+
+def _read_model(model: str) -> Optional[Dict[str, Any]]:
+    for base in (LOCAL_MODELS_DIR, PACKAGED_MODELS_DIR):
+        path = os.path.join(base, f"{model}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            continue
+        except (OSError, json.JSONDecodeError) as e:
+            _log(f"⚠️ Perfil de modelo inválido {path}: {e}")
+    return None
+
+
+def get_profile(model: Optional[str], protocol: str) -> DriverProfile:
+    """Return the shared profile of ``model`` for ``protocol``, loading it on first use."""
+    key = (model or DEFAULT_MODEL, protocol)
+    profile = _profiles.get(key)
+    if profile is not None:
+        return profile
+    with _lock:
+        profile = _profiles.get(key)
+        if profile is None:
+            data = _read_model(key[0]) if key[0] != DEFAULT_MODEL else None
+            spec = ((data or {}).get("protocols") or {}).get(protocol)
+            if spec is None:
+                # Modelo sin perfil propio para este protocolo: mapa por defecto
+                spec = ((_read_model(DEFAULT_MODEL) or {}).get("protocols") or {}).get(protocol) or {}
+            profile = DriverProfile(key[0], protocol, spec)
+            _profiles[key] = profile
+    return profile
+
+
+def profile_for_device(device: Mapping[str, Any], protocol: str) -> DriverProfile:
+    """
+    Profile for one device: its model's, or a compiled overlay when the device
+    carries its own ``modbusConfig`` for ``protocol``. Overlays are cached by
+    content, so devices with the same register list share one instance.
+    """
+    base = get_profile(device.get("deviceModel"), protocol)
+    modbus_config = device.get("modbusConfig")
+    if not isinstance(modbus_config, dict) or modbus_config.get("protocol") != protocol:
+        return base
+    registers = modbus_config.get("registers")
+    if not isinstance(registers, dict) or not registers:
+        return base
+
+    key = (f"{base.model}/{protocol}", json.dumps(registers, sort_keys=True, default=str))
+    profile = _overlays.get(key)
+    if profile is not None:
+        return profile
+
+    known = {name: (scale, enum, decoder) for name, _, scale, enum, decoder in base._plan}
+    signals = {}
+    for name, value in registers.items():
+        entry = dict(value) if isinstance(value, dict) else {"address": value}
+        scale, enum, decoder = known.get(str(name), (None, None, None))
+        if scale is not None:
+            entry.setdefault("scale", scale)
+        if enum:
+            entry.setdefault("enum", {str(k): v["value"] for k, v in enum.items()})
+        if decoder:
+            entry.setdefault("decoder", decoder)
+        signals[str(name)] = entry
+    spec = {
+        "signals": signals,
+        "commands": {name: {"address": c["address"], "values": dict(c["values"])} for name, c in base.commands.items()},
+        "statusProfile": base.status_profile,
+    }
+    profile = DriverProfile(base.model, protocol, spec)
+    if not profile.addresses:
+        profile = base
+    with _lock:
+        profile = _overlays.setdefault(key, profile)
+    return profile
+
+
+def install_profile(model: str, data: Mapping[str, Any]) -> None:
+    """
+    Compile a cloud-pushed model profile, persist it and drop the cached ones
+    so the next lookup reloads it. Raises ValueError (nothing is written) if
+    any protocol has an invalid entry.
+    """
+    protocols = data.get("protocols") if isinstance(data, Mapping) else None
+    if not model or not isinstance(protocols, dict) or not set(protocols) & set(PROTOCOLS):
+        raise ValueError(f"perfil de modelo inválido para '{model}'")
+    for protocol, spec in protocols.items():
+        errors = DriverProfile(model, protocol, spec).errors
+        if errors:
+            raise ValueError(f"perfil '{model}' ({protocol}) inválido: {'; '.join(errors)}")
+    write_json_atomic(os.path.join(LOCAL_MODELS_DIR, f"{os.path.basename(model)}.json"), {**data, "model": model})
+    invalidate()
+
+
+def invalidate() -> None:
+    with _lock:
+        _profiles.clear()
+        _overlays.clear()
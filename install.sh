@@ -74,7 +74,7 @@ Description=${APP_NAME} Application
 After=network.target
 
 [Service]
-ExecStart=${EXECUTABLE_PATH} --mode gui
+ExecStart=${EXECUTABLE_PATH} --mode headless
 Restart=always
 User=${DESKTOP_USER}
 
@@ -6,20 +6,42 @@ import argparse
 from threading import Event
 import traceback
 
-# Intentar importar el controlador principal de la lógica
-try:
-    from application.app_controller import AppController
-except Exception as e:
-    print("[main] Error importando AppController:", e)
-    traceback.print_exc()
-    AppController = None
+from infrastructure.metrics.startup import STARTUP
 
 
-def run_headless():
+def import_controller():
+    """
+    Importa el controlador bajo demanda (paho, drivers, etc. no se cargan
+    hasta que hacen falta).
+    """
+    try:
+        with STARTUP.stage("import application.app_controller"):
+            from application.app_controller import AppController
+        return AppController
+    except Exception as e:
+        print("[main] Error importando AppController:", e)
+        traceback.print_exc()
+        return None
+
+
+def start_metrics_server(port: int):
+    """
+    Levanta el endpoint Prometheus (/metrics) si se pidió un puerto.
+    """
+    if not port:
+        return None
+    with STARTUP.stage("metrics server"):
+        from infrastructure.http.metrics_server import MetricsServer
+        server = MetricsServer(log=print, port=port)
+        return server if server.start() else None
+
+
+def run_headless(metrics_port: int = 0):
     """
     Ejecuta la lógica sin GUI (para uso con systemd).
     """
     stop_event = Event()
+    metrics_server = start_metrics_server(metrics_port)
 
     def _graceful(signum, _):
         print(f"[headless] señal {signum} recibida, saliendo…")
@@ -28,6 +50,7 @@ def run_headless():
     signal.signal(signal.SIGTERM, _graceful)
     signal.signal(signal.SIGINT, _graceful)
 
+    AppController = import_controller()
     if AppController is None:
         print("[headless] AppController no disponible, bucle dummy.")
         try:
@@ -37,12 +60,19 @@ def run_headless():
             print("[headless] terminado.")
         return
 
-    ctrl = AppController(ui=None)  # sin GUI
+    from application.observers import ConsoleObserver
+    with STARTUP.stage("AppController init"):
+        ctrl = AppController(observers=[ConsoleObserver()])  # sin GUI, sin tkinter
+    if STARTUP.enabled:
+        ctrl.start()
+        print(STARTUP.report())
     try:
         ctrl.run(stop_event=stop_event)  # método bloqueante
     finally:
         if hasattr(ctrl, "close"):
             ctrl.close()
+        if metrics_server:
+            metrics_server.stop()
         print("[headless] shutdown completo.")
 
 
@@ -50,19 +80,39 @@ def run_gui():
     """
     Ejecuta la interfaz Tkinter.
     """
-    from ui.main_window import MainWindow
-    app = MainWindow()
+    with STARTUP.stage("import ui.main_window"):
+        from ui.main_window import MainWindow
+    with STARTUP.stage("MainWindow init"):
+        app = MainWindow()
+    if STARTUP.enabled:
+        print(STARTUP.report())
     app.mainloop()
 
 
 def main():
+    from infrastructure.config.loader import load_config
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--mode",
         choices=["gui", "headless"],
         default=os.getenv("APP_MODE", "gui")  # por defecto GUI si no se define
     )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=load_config()["METRICS_PORT"],
+        help="Puerto del endpoint Prometheus /metrics en modo headless (0 = deshabilitado)"
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        default=os.getenv("PROFILE_STARTUP", "") == "1",
+        help="Informa el tiempo de importación e inicialización por subsistema"
+    )
     args = parser.parse_args()
+    if args.profile_startup:
+        STARTUP.enable()
 
     if args.mode == "gui":
         try:
@@ -71,11 +121,11 @@ def main():
             # fallback: si no hay DISPLAY, intenta headless
             if "no display name and no $display" in str(e).lower():
                 print("[main] No hay DISPLAY → cambiando a modo headless")
-                run_headless()
+                run_headless(args.metrics_port)
             else:
                 raise
     else:
-        run_headless()
+        run_headless(args.metrics_port)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark of the JSON codec on the gateway's real payload shapes.
+
+    python -m simulator.bench_json_codec [--n 20000]
+
+Prints encode/decode cost per sample for the stdlib path used before
+(``json.dumps(..., default=str)`` + UTF-8) and for ``json_codec`` with the
+backend available here (orjson if installed).
+"""
+import argparse
+import json
+import timeit
+
+from infrastructure.codec import json_codec
+
+
+def drive_signal() -> dict:
+    """Modbus TCP/RTU 'drive' group as published by DeviceService."""
+    values = {
+        "freqRef": 50.0, "accTime": 30, "decTime": 40, "curr": 12.3, "freq": 49.98,
+        "volt": 398, "voltDcLink": 562, "power": 5.4, "fault": 0, "speed": 1480,
+        "alarm": 0, "temp": 41,
+    }
+    payload = {k: {"value": v, "kind": "operation"} for k, v in values.items()}
+    payload["stat"] = {"value": "run", "kind": "operation"}
+    payload["dir"] = {"value": "fwd", "kind": "operation"}
+    return {"group": "drive", "payload": payload, "source": "tcp"}
+
+
+def logo_signal() -> dict:
+    return {
+        "group": "logo",
+        "payload": {
+            "status": {"value": "Marcha / Remoto", "kind": "operation"},
+            "pressure": {"value": 4.21, "kind": "operation"},
+            "level": {"value": 73, "kind": "operation"},
+        },
+        "source": "logo",
+    }
+
+
+def http_signal() -> dict:
+    """Merged drive/mntr/dashboard response of the HTTP reader."""
+    payload = {f"p{i:03d}": {"value": i * 0.5, "kind": "operation"} for i in range(60)}
+    return {"group": "http", "payload": payload, "source": "http"}
+
+
+def aggregated_signal() -> dict:
+    """Bandwidth-governor summary level: min/max/mean per signal."""
+    sig = drive_signal()
+    sig["summary"] = {k: {"min": 1.0, "max": 2.0, "mean": 1.5, "n": 60} for k in sig["payload"]}
+    return sig
+
+
+def command() -> bytes:
+    return b'{"command":"turnon","requestId":"66f0c1d2e3a4b5c6d7e8f901","ts":1718000000.123}'
+
+
+SHAPES = {
+    "drive": drive_signal(),
+    "logo": logo_signal(),
+    "http": http_signal(),
+    "aggregated": aggregated_signal(),
+}
+
+
+def _per_sample_us(fn, n: int) -> float:
+    return min(timeit.repeat(fn, number=n, repeat=5)) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000)
+    n = parser.parse_args().n
+
+    print(f"backend: {json_codec.BACKEND}  (n={n})")
+    print(f"{'shape':<12}{'bytes':>7}{'stdlib µs':>12}{'codec µs':>11}{'speedup':>9}")
+    for name, obj in SHAPES.items():
+        size = len(json_codec.dumps(obj))
+        std = _per_sample_us(lambda: json.dumps(obj, default=str).encode("utf-8"), n)
+        fast = _per_sample_us(lambda: json_codec.dumps(obj), n)
+        print(f"{name:<12}{size:>7}{std:>12.2f}{fast:>11.2f}{std / fast:>8.1f}x")
+
+    raw = command()
+    std = _per_sample_us(lambda: json.loads(raw.decode("utf-8")), n)
+    fast = _per_sample_us(lambda: json_codec.loads(raw), n)
+    print(f"{'cmd decode':<12}{len(raw):>7}{std:>12.2f}{fast:>11.2f}{std / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
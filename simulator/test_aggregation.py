@@ -0,0 +1,57 @@
+from infrastructure.mqtt.aggregation import WindowAggregator
+
+
+def _aggregator(published, **kwargs):
+    return WindowAggregator(lambda serial, group, agg: published.append((serial, group, agg)), log=lambda msg: None, **kwargs)
+
+
+def test_from_config_all_raw_is_disabled():
+    assert WindowAggregator.from_config(lambda *a: None, {"default": "raw"}) is None
+    assert WindowAggregator.from_config(lambda *a: None, {"signals": {"freq": "both"}}) is not None
+
+
+def test_from_config_rejects_invalid_window():
+    logs = []
+    for window in (0, -5, "x", None):
+        cfg = {"windowS": window, "default": "aggregated"}
+        assert WindowAggregator.from_config(lambda *a: None, cfg, log=logs.append) is None
+    assert len(logs) == 4
+
+
+def test_split_by_mode_and_critical_fields():
+    published = []
+    agg = _aggregator(published, window=60, default="aggregated", modes={"curr": "both", "volt": "raw"})
+    sample = {
+        "freq": {"value": 50.0, "kind": "operation"},
+        "curr": {"value": 3.0, "kind": "operation"},
+        "volt": {"value": 220, "kind": "operation"},
+        "stat": {"value": 2, "kind": "operation"},
+        "alarmCode": {"value": 7, "kind": "fault"},
+        "dir": {"value": "fwd", "kind": "operation"},
+    }
+    raw = agg.split(("SN1", "g"), sample, ts=120.0)
+    assert set(raw) == {"curr", "volt", "stat", "alarmCode", "dir"}
+    assert published == []
+
+
+def test_window_closes_with_stats():
+    published = []
+    agg = _aggregator(published, window=60, default="aggregated")
+    for ts, value in ((120.0, 10.0), (130.0, 30.0), (150.0, 20.0)):
+        agg.split(("SN1", "g"), {"freq": {"value": value}}, ts=ts)
+    agg.split(("SN1", "g"), {"freq": {"value": 99.0}}, ts=181.0)
+    assert len(published) == 1
+    serial, group, aggregate = published[0]
+    assert (serial, group, aggregate["start"], aggregate["windowS"]) == ("SN1", "g", 120.0, 60.0)
+    assert aggregate["signals"]["freq"] == {"min": 10.0, "max": 30.0, "mean": 20.0, "last": 20.0, "count": 3}
+
+
+def test_flush_publishes_open_windows():
+    published = []
+    agg = _aggregator(published, window=3600, default="aggregated")
+    agg.split(("SN1", "a"), {"freq": 1.0})
+    agg.split(("SN2", "b"), {"freq": 2.0})
+    agg.flush()
+    assert sorted((s, g) for s, g, _ in published) == [("SN1", "a"), ("SN2", "b")]
+    agg.flush()
+    assert len(published) == 2
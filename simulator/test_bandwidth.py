@@ -0,0 +1,101 @@
+from infrastructure.mqtt.bandwidth import FAULT_HEARTBEAT_S, MQTT_OVERHEAD_BYTES, BandwidthGovernor
+
+KEY = ("SN1", "group")
+HOUR = 3600
+
+
+class FakeClock:
+    def __init__(self, now=1000 * HOUR):
+        self.now = float(now)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _governor(budget=None, clock=None):
+    clock = clock or FakeClock()
+    return BandwidthGovernor(lambda msg: None, budget, clock=clock, monotonic=clock)
+
+
+def _saving(clock):
+    """Governor already at the top saving level: the hourly budget is spent."""
+    governor = _governor({"hourlyBytes": 1000}, clock)
+    governor.account("t", "x" * 2000)
+    return governor
+
+
+def _signal(**values):
+    return {"payload": {name: {"value": v, "kind": "operation"} for name, v in values.items()}}
+
+
+def test_account_counts_utf8_bytes():
+    governor = _governor()
+    governor.account("t/ñ", "ñ" * 10)
+    usage = governor.usage()
+    assert usage["bandwidth_hourlyBytes"] == 4 + 20 + MQTT_OVERHEAD_BYTES
+    governor.account("t", b"abc")
+    assert governor.usage()["bandwidth_dailyBytes"] == 4 + 20 + 1 + 3 + 2 * MQTT_OVERHEAD_BYTES
+
+
+def test_usage_resets_with_the_period():
+    clock = FakeClock()
+    governor = _governor(clock=clock)
+    governor.account("t", "x" * 100)
+    clock.advance(HOUR)
+    assert governor.usage()["bandwidth_hourlyBytes"] == 0
+
+
+def test_set_budget_ignores_invalid_values():
+    governor = _governor()
+    assert governor.set_budget({"hourlyBytes": "x", "dailyBytes": 1000}) == {"dailyBytes": 1000}
+    assert governor.set_budget(None) == {}
+
+
+def test_no_budget_passes_everything():
+    governor = _governor()
+    signal = _signal(freq=50.0)
+    assert all(governor.admit(KEY, signal) is signal for _ in range(5))
+
+
+def test_level_follows_projected_usage():
+    clock = FakeClock()
+    governor = _governor({"hourlyBytes": 10 ** 6}, clock)
+    governor.admit(KEY, _signal(freq=50.0))
+    assert governor.usage()["bandwidth_level"] == 0
+    governor.account("t", "x" * (2 * 10 ** 6))
+    clock.advance(governor.reevaluate_every)
+    governor.admit(KEY, _signal(freq=50.0))
+    assert governor.usage()["bandwidth_level"] == 3
+
+
+def test_held_samples_are_summarized_on_next_publish():
+    clock = FakeClock()
+    governor = _saving(clock)
+    assert governor.admit(KEY, _signal(freq=10.0)) is not None
+    assert governor.admit(KEY, _signal(freq=10.1)) is None
+    assert governor.admit(KEY, _signal(freq=10.2)) is None
+    clock.advance(400)
+    out = governor.admit(KEY, _signal(freq=20.0))
+    assert out["summary"]["windowS"] == 400
+    assert out["summary"]["fields"]["freq"]["n"] == 3
+    assert out["summary"]["fields"]["freq"]["max"] == 20.0
+
+
+def test_critical_change_always_passes():
+    governor = _saving(FakeClock())
+    governor.admit(KEY, _signal(stat="run", freq=50.0))
+    assert governor.admit(KEY, _signal(stat="run", freq=50.0)) is None
+    assert governor.admit(KEY, _signal(stat="fault", freq=50.0)) is not None
+
+
+def test_active_fault_repeats_on_heartbeat():
+    clock = FakeClock()
+    governor = _saving(clock)
+    fault = {"payload": {"alarmCode": {"value": 7, "kind": "fault"}}}
+    assert governor.admit(KEY, fault) is not None
+    assert governor.admit(KEY, fault) is None
+    clock.advance(FAULT_HEARTBEAT_S)
+    assert governor.admit(KEY, fault) is not None
@@ -0,0 +1,70 @@
+import threading
+
+from application.services.command_confirmation import CommandConfirmation
+
+
+def _confirmation(timeout=2.0):
+    results = []
+    done = threading.Event()
+
+    def publish(result):
+        results.append(result)
+        done.set()
+
+    return CommandConfirmation(lambda msg: None, publish, timeout=timeout, interval=0.01), results, done
+
+
+def _reader(states):
+    """read_status() that walks ``states`` and then repeats the last one."""
+    states = list(states)
+    return lambda: states.pop(0) if len(states) > 1 else states[0]
+
+
+def test_confirms_on_transition():
+    confirmation, results, done = _confirmation()
+    confirmation.watch("turnon", "tcp", _reader(["stop", "stop", "run"]), before="stop")
+    assert done.wait(2)
+    assert results[0]["status"] == "confirmed"
+    assert results[0]["state"] == "run"
+    assert results[0]["expected"] == ["run"]
+
+
+def test_already_in_state_is_not_confirmed():
+    confirmation, results, done = _confirmation()
+    confirmation.watch("turnoff", "tcp", _reader(["stop"]), before="stop")
+    assert done.wait(1)
+    assert results[0]["status"] == "already-in-state"
+    assert results[0]["latencyMs"] == 0.0
+
+
+def test_restart_requires_leaving_the_run_state():
+    confirmation, results, done = _confirmation()
+    confirmation.watch("restart", "tcp", _reader(["run", "stop", "run"]), before="run")
+    assert done.wait(2)
+    assert results[0]["status"] == "confirmed"
+
+    confirmation, results, done = _confirmation(timeout=0.2)
+    confirmation.watch("restart", "tcp", _reader(["run"]), before="run")
+    assert done.wait(2)
+    assert results[0]["status"] == "already-in-state"
+
+
+def test_timeout_and_write_failed():
+    confirmation, results, done = _confirmation(timeout=0.1)
+    confirmation.watch("turnon", "serial", _reader(["fault"]), before="stop")
+    assert done.wait(2)
+    assert results[0]["status"] == "timeout"
+    assert results[0]["state"] == "fault"
+
+    confirmation.failed("turnoff", None)
+    assert results[1]["status"] == "write-failed"
+
+
+def test_new_command_supersedes_previous_watch():
+    confirmation, results, _ = _confirmation(timeout=5)
+    superseded = threading.Event()
+    confirmation.publish_result = lambda r: (results.append(r), r["status"] == "superseded" and superseded.set())
+    confirmation.watch("turnon", "tcp", _reader(["stop"]), before="stop")
+    confirmation.watch("turnoff", "tcp", _reader(["stop"]), before="stop")
+    assert superseded.wait(2)
+    assert [r["status"] for r in results if r["command"] == "turnon"] == ["superseded"]
@@ -0,0 +1,106 @@
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+
+from infrastructure.connectivity import connectivity
+from infrastructure.connectivity.connectivity import ConnectivityMonitor
+from infrastructure.connectivity.link_watch import LinkWatcher
+
+
+@pytest.fixture
+def listener():
+    """A local TCP target that always answers the probe."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    yield server.getsockname()
+    server.close()
+
+
+def test_online_over_another_uplink_while_wifi_is_down(listener, monkeypatch):
+    # wlan0 caído (p. ej. gateway por Ethernet): el quórum de sondeos decide
+    monkeypatch.setattr(LinkWatcher, "is_up", lambda self: False)
+    status, links = [], []
+    reported = threading.Event()
+
+    def on_status(ok, name):
+        status.append(ok)
+        reported.set()
+
+    monitor = ConnectivityMonitor(
+        log_callback=lambda msg: None,
+        status_callback=on_status,
+        link_callback=links.append,
+        wifi_interface="wlan-test0",
+        check_interval=60,
+        probe_targets=[listener],
+        probe_timeout=1.0,
+    )
+    monitor.start()
+    try:
+        assert reported.wait(5)
+    finally:
+        monitor.stop()
+    assert status == [True]
+    assert links == [True]
+
+
+def test_recovery_actions_back_off_while_probing_fast(monkeypatch):
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    target = closed.getsockname()
+    closed.close()
+    monkeypatch.setattr(connectivity.subprocess, "run", lambda *a, **k: subprocess.CompletedProcess(a, 0, "", ""))
+    monkeypatch.setattr(LinkWatcher, "wait_for", lambda self, up, timeout: True)
+    logs = []
+
+    monitor = ConnectivityMonitor(
+        log_callback=logs.append,
+        wifi_interface="wlan-test0",
+        check_interval=0.2,
+        degraded_interval=0.02,
+        probe_targets=[target],
+        probe_timeout=0.5,
+    )
+    monitor.start()
+    time.sleep(1.5)
+    monitor.stop()
+    restarts = sum("Reiniciando interfaz" in line for line in logs)
+    # Sin espera creciente serían decenas (un reinicio por sondeo degradado)
+    assert 2 <= restarts <= 5
+
+
+def test_new_probe_targets_apply_on_the_next_probe(listener, monkeypatch):
+    monkeypatch.setattr(LinkWatcher, "is_up", lambda self: True)
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    dead = closed.getsockname()
+    closed.close()
+    status = []
+    online = threading.Event()
+
+    def on_status(ok, name):
+        status.append(ok)
+        if ok:
+            online.set()
+
+    monitor = ConnectivityMonitor(
+        log_callback=lambda msg: None,
+        status_callback=on_status,
+        wifi_interface="wlan-test0",
+        check_interval=60,
+        probe_targets=[dead],
+        probe_timeout=1.0,
+    )
+    old_probe = monitor.probe
+    monitor.set_probe_targets([listener])
+    monitor.start()
+    try:
+        assert online.wait(5)
+    finally:
+        monitor.stop()
+    assert monitor.probe is not old_probe
+    assert status == [True]
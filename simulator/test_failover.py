@@ -0,0 +1,107 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from application.services.device_service import DeviceService
+from infrastructure.modbus.poll_health import PollHealth
+
+
+class FakeReader:
+    def __init__(self, transport):
+        self.transport = transport
+        self.connected = True
+        self.standby = None
+        self.health = SimpleNamespace(down=False)
+        self.health.is_down = lambda: self.health.down
+        self._thread = None
+
+    def is_connected(self):
+        return self.connected
+
+    def set_standby(self, standby):
+        self.standby = standby
+
+    def start(self):
+        self._thread = SimpleNamespace(is_alive=lambda: True)
+
+    def stop(self):
+        self._thread = None
+
+
+class FakeClock:
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+def _service(monkeypatch, **cc):
+    monkeypatch.setattr(DeviceService, "_make_reader", lambda self, name: FakeReader(name) if self._wired(name) else None)
+    logs = []
+    mqtt = SimpleNamespace(on_change_device_connection=lambda *a: None, send_command_result=lambda *a: None)
+    device = {
+        "name": "VFD", "serialNumber": "SN1",
+        "connectionConfig": {"host": "10.0.0.2", "tcpPort": 502, "serialPort": "/dev/ttyUSB0", "baudrate": 9600,
+                             "defaultReader": "tcp", **cc},
+    }
+    service = DeviceService(mqtt_handler=mqtt, gateway_cfg={}, device=device, log=logs.append, update_fields=None)
+    return service, logs
+
+
+def test_standby_starts_with_the_preferred_reader(monkeypatch):
+    service, _ = _service(monkeypatch)
+    assert service.modbus_tcp.standby is False
+    assert service.modbus_serial.standby is True
+    assert service.modbus_serial._thread is not None
+
+
+def test_fails_over_when_active_link_goes_down(monkeypatch, clock):
+    service, logs = _service(monkeypatch)
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.DOWN)
+    assert service.active_reader == "serial"
+    assert service.modbus_serial.standby is False
+    assert service.modbus_tcp.standby is True
+    assert any("tcp → serial" in line for line in logs)
+
+
+def test_no_failover_to_an_unusable_standby(monkeypatch, clock):
+    service, _ = _service(monkeypatch)
+    service.modbus_serial.connected = False
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.DOWN)
+    assert service.active_reader == "tcp"
+
+
+def test_fails_back_after_preferred_is_stable(monkeypatch, clock):
+    service, _ = _service(monkeypatch)
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.DOWN)
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.OK)
+    clock.now += service.failback_delay - 1
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.OK)
+    assert service.active_reader == "serial"
+
+    # Un ciclo malo reinicia la ventana de estabilidad
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.DEGRADED)
+    clock.now += 2
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.OK)
+    assert service.active_reader == "serial"
+
+    clock.now += service.failback_delay
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.OK)
+    assert service.active_reader == "tcp"
+    assert service.modbus_tcp.standby is False
+    assert service.modbus_serial.standby is True
+
+
+def test_failover_disabled(monkeypatch, clock):
+    service, _ = _service(monkeypatch, failover=False)
+    assert service.modbus_serial._thread is None
+    service.on_reader_cycle(service.modbus_tcp, PollHealth.DOWN)
+    assert service.active_reader == "tcp"
@@ -0,0 +1,50 @@
+from infrastructure.http.fault_sync import FaultSync, extract_events
+
+
+def test_extract_events_bare_and_wrapped():
+    assert extract_events([{"id": 1}, "x"]) == [{"id": 1}]
+    assert extract_events({"evt": [{"id": 2}]}) == [{"id": 2}]
+    assert extract_events({"other": 1}) == []
+    assert extract_events(None) == []
+
+
+def test_request_uses_cursor_and_validators():
+    sync = FaultSync({"lastId": 7, "etag": "abc", "lastModified": "Mon"})
+    headers, params = sync.request()
+    assert headers == {"If-None-Match": "abc", "If-Modified-Since": "Mon"}
+    assert params == {"since": "7"}
+    assert FaultSync().request() == ({}, {})
+
+
+def test_apply_returns_only_new_events_in_order():
+    sync = FaultSync()
+    body = {"events": [{"id": 3, "code": "F3"}, {"id": 1, "code": "F1"}, {"id": 2, "code": "F2"}]}
+    events = sync.apply(200, {"ETag": "e1"}, body)
+    assert [e["id"] for e in events] == [1, 2, 3]
+    assert sync.last_id == 3 and sync.etag == "e1" and sync.dirty
+
+    # El drive ignora ``since`` y repite la lista: no hay duplicados
+    more = sync.apply(200, {"ETag": "e2"}, {"events": body["events"] + [{"id": 4}]})
+    assert [e["id"] for e in more] == [4]
+
+
+def test_not_modified_returns_nothing():
+    sync = FaultSync({"lastId": 5})
+    assert sync.apply(304, {}, None) == []
+    assert not sync.dirty
+
+
+def test_events_without_id_use_timestamp_and_recent_keys():
+    sync = FaultSync()
+    first = sync.apply(200, {}, [{"ts": 10, "code": "A"}, {"ts": 20, "code": "B"}])
+    assert len(first) == 2 and sync.last_ts == 20
+    again = sync.apply(200, {}, [{"ts": 20, "code": "B"}, {"ts": 20, "code": "C"}, {"ts": 5, "code": "old"}])
+    assert again == [{"ts": 20, "code": "C"}]
+
+
+def test_cursor_round_trip():
+    sync = FaultSync()
+    sync.apply(200, {"ETag": "x", "Last-Modified": "Tue"}, [{"id": "9", "ts": 1}])
+    restored = FaultSync(sync.to_dict())
+    assert restored.to_dict() == sync.to_dict()
+    assert restored.apply(200, {"ETag": "x", "Last-Modified": "Tue"}, [{"id": "9", "ts": 1}]) == []
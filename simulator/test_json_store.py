@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from infrastructure.config.store import JsonStore, write_json_atomic
+
+
+def _store(path):
+    return JsonStore(str(path), debounce=0.0, log=lambda msg: None)
+
+
+def test_write_json_atomic(tmp_path):
+    path = tmp_path / "sub" / "data.json"
+    write_json_atomic(str(path), {"a": "ñ"})
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": "ñ"}
+    assert not (tmp_path / "sub" / "data.json.tmp").exists()
+
+
+def test_missing_or_invalid_file_is_empty(tmp_path):
+    assert dict(_store(tmp_path / "none.json").snapshot()) == {}
+    bad = tmp_path / "bad.json"
+    bad.write_text("[1, 2", encoding="utf-8")
+    assert dict(_store(bad).snapshot()) == {}
+
+
+def test_snapshot_is_read_only_and_shared(tmp_path):
+    path = tmp_path / "g.json"
+    path.write_text('{"a": 1}', encoding="utf-8")
+    store = _store(path)
+    view = store.snapshot()
+    assert view is store.snapshot()
+    with pytest.raises(TypeError):
+        view["a"] = 2
+
+
+def test_update_is_copy_on_write_and_flush_persists(tmp_path):
+    path = tmp_path / "g.json"
+    path.write_text('{"a": 1, "b": 2}', encoding="utf-8")
+    store = _store(path)
+    before = store.snapshot()
+    nested = {"x": [1]}
+    after = store.update({"a": None, "c": nested})
+    nested["x"].append(2)
+    assert dict(before) == {"a": 1, "b": 2}
+    assert dict(after) == {"b": 2, "c": {"x": [1]}}
+    assert store.version == 1
+    assert store.flush()
+    assert json.loads(path.read_text(encoding="utf-8")) == {"b": 2, "c": {"x": [1]}}
+
+
+def test_reload_picks_up_external_edits(tmp_path):
+    path = tmp_path / "g.json"
+    path.write_text('{"a": 1}', encoding="utf-8")
+    store = _store(path)
+    store.update({"b": 2})
+    store.flush()
+    path.write_text('{"a": 3}', encoding="utf-8")
+    assert dict(store.reload()) == {"a": 3}
@@ -0,0 +1,78 @@
+from infrastructure.modbus.poll_health import PollHealth
+
+
+def _health(**kwargs):
+    return PollHealth(log=lambda msg: None, **kwargs)
+
+
+def _cycle(health, outcome):
+    for address in health.begin_cycle():
+        health.record(address, outcome(address))
+    return health.end_cycle()
+
+
+def test_ok_with_no_samples():
+    health = _health()
+    health.reset([1, 2, 3])
+    assert health.state == PollHealth.OK
+    assert health.score == 1.0
+
+
+def test_down_after_dead_cycles():
+    health = _health(dead_cycles=3, quarantine_after=100)
+    health.reset([1, 2])
+    states = [_cycle(health, lambda a: False) for _ in range(3)]
+    assert states[:2] == [PollHealth.OK, PollHealth.OK]
+    assert states[2] == PollHealth.DOWN
+    assert health.is_down()
+
+
+def test_degraded_by_failure_ratio():
+    health = _health(min_samples=10, degraded_ratio=0.2, unhealthy_ratio=0.8, quarantine_after=100)
+    health.reset([1, 2, 3, 4])
+    for _ in range(5):
+        state = _cycle(health, lambda a: a != 4)
+    assert state == PollHealth.DEGRADED
+    assert health.score == 0.75
+
+
+def test_quarantine_skips_failing_address_and_recovers():
+    health = _health(quarantine_after=2, quarantine_cycles=3)
+    health.reset([1, 2])
+    _cycle(health, lambda a: a != 2)
+    _cycle(health, lambda a: a != 2)
+    assert health.quarantined == [2]
+    assert health.begin_cycle() == [1]
+    health.record(1, True)
+    health.end_cycle()
+    # Vuelve a sondearse cuando vence la cuarentena
+    for _ in range(2):
+        _cycle(health, lambda a: True)
+    assert health.quarantined == []
+
+
+def test_all_quarantined_is_down():
+    health = _health(quarantine_after=1, dead_cycles=100)
+    health.reset([1, 2])
+    assert _cycle(health, lambda a: False) == PollHealth.DOWN
+
+
+def test_budget_resumes_where_the_cycle_stopped():
+    health = _health()
+    health.reset([1, 2, 3, 4])
+    plan = health.begin_cycle()
+    health.record(plan[0], True)
+    health.record(plan[1], True)
+    health.end_cycle()
+    assert health.cycles_over_budget == 1
+    assert health.begin_cycle() == [3, 4, 1, 2]
+
+
+def test_limit_and_snapshot():
+    health = _health()
+    health.reset([1, 2, 2, 3])
+    assert health.addresses == [1, 2, 3]
+    assert health.begin_cycle(limit=1) == [1]
+    snapshot = health.snapshot()
+    assert snapshot["state"] == PollHealth.OK
+    assert set(snapshot) == {"state", "score", "quarantined", "cycleDuration", "cyclesOverBudget"}
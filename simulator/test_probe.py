@@ -0,0 +1,50 @@
+import socket
+
+import pytest
+
+from infrastructure.connectivity.probe import ProbeEngine, parse_targets
+
+
+@pytest.fixture
+def open_port():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    yield server.getsockname()
+    server.close()
+
+
+@pytest.fixture
+def closed_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    address = sock.getsockname()
+    sock.close()
+    return address
+
+
+def test_parse_targets():
+    assert parse_targets(["1.1.1.1:53", ["broker", "1883"], "bad", None, ("h", "x")]) == [("1.1.1.1", 53), ("broker", 1883)]
+    assert parse_targets(None) == []
+
+
+def test_quorum_is_a_majority():
+    assert ProbeEngine([]).quorum() == 1
+    assert ProbeEngine([("a", 1)]).quorum() == 1
+    assert ProbeEngine([("a", 1), ("b", 1)]).quorum() == 2
+    assert ProbeEngine([("a", 1), ("b", 1), ("c", 1)]).quorum() == 2
+    # Destinos duplicados cuentan una vez
+    assert ProbeEngine([("a", 1), ("a", 1), ("b", 1)]).quorum() == 2
+
+
+def test_run_probes_all_targets_concurrently(open_port, closed_port):
+    engine = ProbeEngine([open_port, closed_port, open_port], timeout=1.0)
+    try:
+        result = engine.run()
+        assert (result.successes, result.failures) == (1, 1)
+        assert {target: ok for target, ok, _ in result.results} == {open_port: True, closed_port: False}
+        # El loop se reutiliza entre sondeos
+        assert engine.run().successes == 1
+    finally:
+        engine.close()
+    engine.close()
@@ -0,0 +1,120 @@
+import pytest
+
+from infrastructure.profiles import registry
+from infrastructure.profiles.registry import DriverProfile, get_profile, install_profile, profile_for_device
+
+# Constantes originales de modbus_tcp.py / modbus_serial.py, antes de los perfiles
+MODBUS_SCALES = {"curr": 0.1, "power": 0.1, "freqRef": 0.01, "freq": 0.01}
+SIGNAL_MODBUS_TCP_DIR = {
+    "freqRef": 5, "accTime": 7, "decTime": 8, "curr": 9, "freq": 10, "volt": 11, "voltDcLink": 12,
+    "power": 13, "fault": 15, "stat": 17, "dir": 6, "speed": 786, "alarm": 816, "temp": 861,
+}
+TCP_STATUS_TYPES = {0: "stop", 1: "fault", 2: "run"}
+TCP_DIR_TYPES = {1: "stop", 4: "reverse", 65: "auto", 66: "fwd", 129: "auto", 130: "fwd", 193: "auto", 257: "acc", 258: "fwd"}
+SIGNAL_MODBUS_SERIAL_DIR = {
+    "freqRef": 4, "accTime": 6, "decTime": 7, "curr": 8, "freq": 9, "volt": 10, "power": 12,
+    "stat": 16, "dir": 5, "speed": 785, "alarm": 815, "temp": 859,
+}
+SERIAL_STATUS_TYPES = {0: "stop", 1: "fault", 2: "run", 7: "run"}
+SERIAL_DIR_TYPES = {4: "reverse", 1: "stop", 129: "auto", 130: "fwd", 193: "acc", 194: "fwd", 66: "fwd"}
+
+
+def _baseline_decode(regs, signal_map, status_types, dir_types):
+    s = {}
+    for name, addr in signal_map.items():
+        v = regs.get(addr)
+        if v is None:
+            continue
+        if name == "stat":
+            s[name] = {"value": status_types.get(v, f"Desconocido ({v})"), "kind": "operation"}
+        elif name == "dir":
+            s[name] = {"value": dir_types.get(v, f"Desconocido ({v})"), "kind": "operation"}
+        elif name in MODBUS_SCALES:
+            s[name] = {"value": v * MODBUS_SCALES[name], "kind": "operation"}
+        else:
+            s[name] = {"value": v, "kind": "operation"}
+    return s
+
+
+@pytest.fixture(autouse=True)
+def _isolated(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "LOCAL_MODELS_DIR", str(tmp_path))
+    registry.invalidate()
+    yield
+    registry.invalidate()
+
+
+@pytest.mark.parametrize("protocol, signal_map, status_types, dir_types", [
+    ("modbus-tcp", SIGNAL_MODBUS_TCP_DIR, TCP_STATUS_TYPES, TCP_DIR_TYPES),
+    ("modbus-rtu", SIGNAL_MODBUS_SERIAL_DIR, SERIAL_STATUS_TYPES, SERIAL_DIR_TYPES),
+])
+def test_default_profile_matches_baseline(protocol, signal_map, status_types, dir_types):
+    profile = get_profile(None, protocol)
+    assert profile.errors == []
+    assert dict(profile.registers) == signal_map
+    assert set(profile.addresses) == set(signal_map.values())
+    for raw in (0, 1, 2, 3, 4, 7, 65, 66, 129, 193, 194, 257, 1234, 65535):
+        regs = {addr: raw for addr in signal_map.values()}
+        assert profile.decode(regs) == _baseline_decode(regs, signal_map, status_types, dir_types)
+    assert profile.decode({}) == {}
+
+
+def test_default_commands_match_baseline():
+    tcp, rtu = get_profile(None, "modbus-tcp"), get_profile(None, "modbus-rtu")
+    assert tcp.command("run", "on") == (898, 3)
+    assert tcp.command("run", "off") == (898, 0)
+    assert tcp.command("run", "reset") == (898, 2)
+    assert tcp.command("mode", "remote") == (4358, 4)
+    assert tcp.command("reset") == (901, None)
+    assert rtu.command("run", "on") == (897, 3)
+    assert rtu.command("mode", "remote") == (4357, 3)
+    assert rtu.command("run", "reset") is None
+    assert tcp.status(2) == "run" and tcp.status(9) == "Desconocido (9)"
+
+
+def test_profiles_are_shared_and_unknown_models_fall_back():
+    assert get_profile("default", "modbus-tcp") is get_profile(None, "modbus-tcp")
+    fallback = get_profile("no-such-model", "modbus-tcp")
+    assert dict(fallback.registers) == SIGNAL_MODBUS_TCP_DIR
+
+
+def test_invalid_entries_are_skipped_and_reported():
+    profile = DriverProfile("m", "modbus-tcp", {
+        "signals": {"ok": {"address": 1}, "bad": {"address": "x"}, "scale": {"address": 2, "scale": "x"},
+                    "enum": {"address": 3, "enum": {"a": "run", "1": "stop"}}},
+        "commands": {"run": {"values": {"on": 1}}},
+    })
+    assert dict(profile.registers) == {"ok": 1, "enum": 3}
+    assert len(profile.errors) == 4
+    assert profile.decode({3: 1}) == {"enum": {"value": "stop", "kind": "operation"}}
+
+
+def test_device_overlay_keeps_model_decoding():
+    device = {"modbusConfig": {"protocol": "modbus-tcp", "registers": {"freq": 20, "stat": 21, "extra": 22}}}
+    profile = profile_for_device(device, "modbus-tcp")
+    assert profile is profile_for_device(dict(device), "modbus-tcp")
+    assert profile.decode({20: 5000, 21: 2, 22: 7}) == {
+        "freq": {"value": 50.0, "kind": "operation"},
+        "stat": {"value": "run", "kind": "operation"},
+        "extra": {"value": 7, "kind": "operation"},
+    }
+    broken = {"modbusConfig": {"protocol": "modbus-tcp", "registers": {"freq": {"address": 20, "scale": "x"}}}}
+    assert profile_for_device(broken, "modbus-tcp") is get_profile(None, "modbus-tcp")
+
+
+def test_install_profile_validates_before_writing(tmp_path):
+    with pytest.raises(ValueError):
+        install_profile("pump", {"protocols": {"modbus-tcp": {"signals": {"freq": {"address": "x"}}}}})
+    assert not (tmp_path / "pump.json").exists()
+
+    install_profile("pump", {"protocols": {"modbus-tcp": {"signals": {"freq": {"address": 40, "scale": 0.1}}}}})
+    assert (tmp_path / "pump.json").exists()
+    assert get_profile("pump", "modbus-tcp").decode({40: 500}) == {"freq": {"value": 50.0, "kind": "operation"}}
+
+
+def test_invalid_entries_go_to_the_registry_logger(monkeypatch):
+    logs = []
+    monkeypatch.setattr(registry, "_log", print)
+    registry.set_logger(logs.append)
+    DriverProfile("m", "modbus-tcp", {"signals": {"freq": {"address": "x"}}})
+    assert len(logs) == 1 and "freq" in logs[0]
@@ -0,0 +1,47 @@
+from infrastructure.history.ring_buffer import HistoryStore, SignalRing
+
+
+def test_wraps_and_keeps_newest(tmp_path):
+    ring = SignalRing(str(tmp_path / "r.ring"), 4)
+    for i in range(6):
+        ring.append(float(i), i * 10.0)
+    assert len(ring) == 4
+    assert ring.range(0, 100) == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0), (5.0, 50.0)]
+    assert ring.range(3, 4) == [(3.0, 30.0), (4.0, 40.0)]
+    ring.close()
+
+
+def test_survives_reopen_and_resets_on_new_capacity(tmp_path):
+    path = str(tmp_path / "r.ring")
+    ring = SignalRing(path, 3)
+    ring.append(1.0, 1.5)
+    ring.append(2.0, 2.5)
+    ring.close()
+
+    reopened = SignalRing(path, 3)
+    assert reopened.range(0, 10) == [(1.0, 1.5), (2.0, 2.5)]
+    assert reopened.last_ts == 2.0
+    reopened.close()
+
+    resized = SignalRing(path, 5)
+    assert len(resized) == 0
+    resized.close()
+
+
+def test_downsample(tmp_path):
+    ring = SignalRing(str(tmp_path / "r.ring"), 10)
+    for ts, value in ((0, 1.0), (1, 3.0), (5, 10.0), (6, 20.0)):
+        ring.append(float(ts), value)
+    assert ring.downsample(0, 10, 2) == [[0.0, 2.0, 1.0, 3.0, 2], [5.0, 15.0, 10.0, 20.0, 2]]
+    ring.close()
+
+
+def test_history_store_records_numeric_at_period(tmp_path):
+    store = HistoryStore(str(tmp_path), window=10, period=1.0, log=lambda msg: None)
+    store.record("SN/1", {"freq": {"value": 50.0}, "stat": {"value": "run"}, "on": True}, ts=100.0)
+    store.record("SN/1", {"freq": {"value": 51.0}}, ts=100.5)
+    store.record("SN/1", {"freq": 52}, ts=101.0)
+    assert store.available("SN/1") == ["freq"]
+    assert store.query("SN/1", "freq", start=0, end=200)["points"] == [[100.0, 50.0], [101.0, 52.0]]
+    assert store.query("SN/1", "stat", start=0, end=200)["error"] == "sin historial"
+    store.close()
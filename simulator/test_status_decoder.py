@@ -0,0 +1,58 @@
+from infrastructure.logo.status_decoder import StatusDecoder, get_status_decoder
+
+NIVEL_Y_VOLTAJE_OK = 1 | 32
+
+
+def test_exact_codes_take_precedence():
+    decoder = get_status_decoder()
+    assert decoder.decode(163) == {"value": "Operando", "kind": "operation"}
+    assert decoder.decode(9)["kind"] == "fault"
+
+
+def test_unlisted_value_is_decomposed_into_flags():
+    decoder = get_status_decoder()
+    result = decoder.decode(NIVEL_Y_VOLTAJE_OK | 128 | 512 | 4096)
+    assert result["value"] == "Operando / En Transito"
+    assert result["kind"] == "operation"
+    assert result["flags"] == ["running", "transit"]
+    assert result["selector"] == "Automático"
+
+
+def test_faults_are_shown_first():
+    decoder = get_status_decoder()
+    result = decoder.decode(NIVEL_Y_VOLTAJE_OK | 128 | 1024)
+    assert result["value"] == "Falla de confirma"
+    assert result["kind"] == "fault"
+    assert result["flags"] == ["running", "confirmFault"]
+    assert result["selector"] == "Fuera"
+
+
+def test_active_low_flags():
+    decoder = get_status_decoder()
+    result = decoder.decode(32 | 2048)  # bit 0 (nivel OK) en 0
+    assert result["value"] == "Falla de bajo nivel"
+    assert result["kind"] == "fault"
+
+
+def test_unknown_when_no_flag_is_active():
+    decoder = get_status_decoder()
+    raw = NIVEL_Y_VOLTAJE_OK | 2048
+    assert decoder.decode(raw)["value"] == f"Desconocido ({raw})"
+    assert decoder.decode(raw) is decoder.decode(raw)
+
+
+def test_state_for_command_confirmation():
+    decoder = get_status_decoder()
+    assert decoder.state(163) == "run"
+    assert decoder.state(545) == "stop"
+    assert decoder.state(9) == "fault"
+
+
+def test_missing_profile_falls_back_to_default():
+    assert get_status_decoder("no-existe").model == "default"
+
+
+def test_empty_profile():
+    decoder = StatusDecoder({})
+    assert decoder.decode(5) == {"value": "Desconocido (5)", "kind": "operation", "raw": 5}
+    assert decoder.state(5) == "stop"
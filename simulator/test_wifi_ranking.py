@@ -0,0 +1,49 @@
+from infrastructure.connectivity.wifi_ranking import parse_scan_results, rank_networks, record_attempt
+
+SCAN = (
+    "bssid / frequency / signal level / flags / ssid\n"
+    "aa:bb:cc:00:00:01\t2412\t-70\t[WPA2-PSK-CCMP][ESS]\tplanta\n"
+    "aa:bb:cc:00:00:02\t2437\t-55\t[WPA2-PSK-CCMP][ESS]\tplanta\n"
+    "aa:bb:cc:00:00:03\t5180\t-80\t[WPA2-PSK-CCMP][ESS]\toficina\n"
+    "aa:bb:cc:00:00:04\t2462\t-40\t[ESS]\t\n"
+    "aa:bb:cc:00:00:05\t2462\tx\t[ESS]\troto\n"
+)
+KNOWN = {"planta": "pw1", "oficina": "pw2", "bodega": "pw3"}
+
+
+def test_parse_scan_results_keeps_best_signal_per_ssid():
+    assert parse_scan_results(SCAN) == {"planta": -55, "oficina": -80}
+    assert parse_scan_results("") == {}
+
+
+def test_visible_networks_rank_first():
+    ranking = rank_networks(KNOWN, {}, parse_scan_results(SCAN))
+    assert ranking == ["planta", "oficina", "bodega"]
+
+
+def test_success_history_beats_signal():
+    stats = {}
+    for _ in range(5):
+        record_attempt(stats, "planta", False)
+        record_attempt(stats, "oficina", True, 3.0)
+    visible = {"planta": -50, "oficina": -60}
+    assert rank_networks(KNOWN, stats, visible)[0] == "oficina"
+
+
+def test_last_good_network_wins_without_scan():
+    stats = {}
+    record_attempt(stats, "bodega", True, 2.0)
+    stats["bodega"]["lastGood"] = 200
+    record_attempt(stats, "planta", True, 2.0)
+    stats["planta"]["lastGood"] = 100
+    assert rank_networks(KNOWN, stats)[0] == "bodega"
+
+
+def test_record_attempt_tracks_connect_time():
+    stats = {}
+    record_attempt(stats, "planta", True, 10.0)
+    entry = record_attempt(stats, "planta", True, 0.0)
+    assert entry["attempts"] == entry["successes"] == 2
+    assert entry["avgConnectS"] == 7.0
+    assert record_attempt(stats, "planta", False) is entry
+    assert entry["attempts"] == 3 and entry["successes"] == 2
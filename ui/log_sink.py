@@ -0,0 +1,105 @@
+import collections
+import queue
+import time
+import tkinter as tk
+
+# Niveles de log inferidos del prefijo del mensaje (los módulos loguean con emojis)
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LEVEL_LABELS = {"Todo": "DEBUG", "Info": "INFO", "Advertencias": "WARNING", "Errores": "ERROR"}
+
+_ERROR_MARKS = ("❌", "Exception", "Error")
+_WARNING_MARKS = ("⚠️", "⌛")
+_DEBUG_MARKS = ("📤 Signal", "[MQTT-", "[RX]")
+
+
+def classify(message: str) -> str:
+    head = message[:40]
+    if any(m in head for m in _ERROR_MARKS):
+        return "ERROR"
+    if any(m in head for m in _WARNING_MARKS):
+        return "WARNING"
+    if message.startswith(_DEBUG_MARKS):
+        return "DEBUG"
+    return "INFO"
+
+
+class TkLogSink:
+    """
+    Thread-safe log sink for a Tk text widget.
+
+    ``write()`` may be called from any thread: it only appends to a queue.
+    The Tk thread drains the queue every ``interval_ms`` and inserts the
+    batch with a single widget update. The last ``capacity`` lines are kept
+    in a ring buffer (used to re-render when the level filter changes) and
+    the widget is trimmed to ``max_lines``.
+    """
+
+    def __init__(self, root: tk.Misc, widget: tk.Text, max_lines: int = 1000,
+                 capacity: int = 5000, interval_ms: int = 100, max_batch: int = 500):
+        self.root = root
+        self.widget = widget
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self.min_level = LEVELS["INFO"]
+        self._queue: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._ring: collections.deque = collections.deque(maxlen=capacity)
+        self._closed = False
+
+        for level, color in (("DEBUG", "#888"), ("WARNING", "#b36b00"), ("ERROR", "#c00000")):
+            self.widget.tag_configure(level, foreground=color)
+        self.root.after(self.interval_ms, self._drain)
+
+    def write(self, message: str) -> None:
+        message = str(message)
+        self._queue.put((time.strftime("%H:%M:%S"), classify(message), message))
+
+    __call__ = write
+
+    def set_level(self, level: str) -> None:
+        """Show only lines at or above ``level`` and re-render from the ring buffer."""
+        self.min_level = LEVELS.get(level, LEVELS["INFO"])
+        self.widget.configure(state="normal")
+        self.widget.delete("1.0", "end")
+        visible = [e for e in self._ring if LEVELS[e[1]] >= self.min_level][-self.max_lines:]
+        self._insert(visible)
+        self.widget.configure(state="disabled")
+        self.widget.yview("end")
+
+    def close(self) -> None:
+        self._closed = True
+
+    def _drain(self) -> None:
+        if self._closed:
+            return
+        batch = []
+        try:
+            while len(batch) < self.max_batch:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if batch:
+            self._ring.extend(batch)
+            visible = [e for e in batch if LEVELS[e[1]] >= self.min_level]
+            if visible:
+                at_bottom = self.widget.yview()[1] >= 0.999
+                self.widget.configure(state="normal")
+                self._insert(visible[-self.max_lines:])
+                overflow = int(self.widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+                if overflow > 0:
+                    self.widget.delete("1.0", f"{overflow + 1}.0")
+                self.widget.configure(state="disabled")
+                if at_bottom:
+                    self.widget.yview("end")
+
+        # Con cola llena no esperamos el intervalo completo
+        delay = 10 if len(batch) >= self.max_batch else self.interval_ms
+        try:
+            self.root.after(delay, self._drain)
+        except tk.TclError:
+            self._closed = True
+
+    def _insert(self, entries) -> None:
+        for stamp, level, message in entries:
+            self.widget.insert("end", f"{stamp} {message}\n", (level,))
@@ -1,11 +1,15 @@
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, scrolledtext, simpledialog
 from tkinter import messagebox
 from typing import Dict
 from application.app_controller import AppController
+from application.observers import AppObserver
+from ui.log_sink import LEVEL_LABELS, TkLogSink
 # from infrastructure.modbus.modbus_tcp import ModbusTcp
 # from infrastructure.http.http_client import HttpClient
-from infrastructure.mqtt.mqtt_client import MQTT_HOST, MQTT_PORT
 
 class MainWindow(tk.Tk):
     def __init__(self):
@@ -35,13 +39,45 @@ class MainWindow(tk.Tk):
 
         self.device_tree_tags_configured = False
 
+        # Cambios de dispositivos pendientes (llegan desde hilos MQTT/Modbus);
+        # el hilo de Tk los aplica como máximo cada device_refresh_ms.
+        self.device_refresh_ms = 250
+        self._device_lock = threading.Lock()
+        self._pending_device_list = None
+        self._dirty_devices = {}
+        self._device_rows = {}
+        # Llamadas a la UI encoladas desde otros hilos (ver WindowObserver)
+        self._ui_calls = queue.SimpleQueue()
+
+        # Panel de valores en vivo (lee la caché de últimos valores, 2 Hz)
+        self.live_refresh_ms = 500
+        self.live_stale_after = 10.0
+        # Antigüedad por tramos: la celda solo se reescribe al cambiar de tramo
+        self.live_age_buckets = ((1, "<1 s"), (5, "<5 s"), (10, "<10 s"), (30, "<30 s"), (60, "<1 min"), (300, "<5 min"))
+
 
         self._build_gateway_config_widget()
         self._build_connectivity_widget()
         self._build_known_networks_widget()
         self._build_device_list_widget()
+        self._build_live_values_widget()
         self.log_widget = self._build_log_widget()
-        self.controller = AppController(self)
+        self.after(self.device_refresh_ms, self._device_refresh_loop)
+        self.after(self.live_refresh_ms, self._live_refresh_loop)
+        self.controller = AppController(ui=WindowObserver(self))
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.controller.start()
+
+    def call_soon(self, fn, *args):
+        """Thread-safe: ejecuta ``fn(*args)`` en el hilo de Tk en el próximo refresco."""
+        self._ui_calls.put((fn, args))
+
+    def _on_close(self):
+        try:
+            self.controller.close()
+        finally:
+            self.log_sink.close()
+            self.destroy()
 
     def _build_gateway_config_widget(self):
         """Crea el widget para la configuración del gateway."""
@@ -62,7 +98,7 @@ class MainWindow(tk.Tk):
 
         # Save Button
         # El command se asignará en el controller
-        save_button = ttk.Button(frame, text="Guardar y Reiniciar", command=lambda: self.controller.on_save_gateway_config())
+        save_button = ttk.Button(frame, text="Guardar y Reiniciar", command=lambda: self.controller.on_save_gateway_config(self.org_id_var.get(), self.gw_id_var.get()))
         save_button.grid(row=2, column=1, sticky="e", padx=5, pady=10)
 
     def _build_connectivity_widget(self):
@@ -202,6 +238,41 @@ class MainWindow(tk.Tk):
         tree_frame.grid_columnconfigure(0, weight=1)
 
     def update_device_list(self, devices):
+        """Thread-safe: registra la nueva lista; se aplica de forma incremental en el próximo refresco."""
+        with self._device_lock:
+            self._pending_device_list = list(devices)
+            self._dirty_devices.clear()
+
+    def update_device_row(self, device):
+        """Thread-safe: marca un dispositivo (p. ej. cambio de estado) para refrescar su fila."""
+        with self._device_lock:
+            self._dirty_devices[device.serial] = device
+
+    @staticmethod
+    def _device_row(device):
+        cc = device.cc
+        return (
+            device.name, device.serial,
+            cc.get("serialPort", "-"), cc.get("baudrate", "-"), cc.get("slaveId", "-"),
+            cc.get("tcpIp") or cc.get("host", "-"), cc.get("tcpPort", "-"),
+            "Online" if device.connected else "Offline",
+            cc.get("logoIp", "-"), cc.get("logoPort", "-"),
+            "Online" if device.connected_logo else "Offline",
+        )
+
+    def _set_device_row(self, iid, device):
+        # Treeview devuelve los valores convertidos por Tcl: comparamos contra lo último escrito
+        values = self._device_row(device)
+        if self._device_rows.get(iid) != values:
+            self.device_tree.item(iid, values=values)
+            self._device_rows[iid] = values
+
+    def _apply_device_updates(self):
+        """Aplica los cambios pendientes a la tabla (iid = número de serie)."""
+        with self._device_lock:
+            devices, self._pending_device_list = self._pending_device_list, None
+            dirty, self._dirty_devices = self._dirty_devices, {}
+
         if not self.device_tree_tags_configured:
             # Configurar tags de colores la primera vez
             self.device_tree.tag_configure('online', foreground='green')
@@ -210,41 +281,169 @@ class MainWindow(tk.Tk):
             self.device_tree.tag_configure('oddrow', background='#ffffff')
             self.device_tree_tags_configured = True
 
-        # Limpiar la tabla antes de actualizar
-        for i in self.device_tree.get_children():
-            self.device_tree.delete(i)
-
-        # Llenar con los nuevos datos
-        for i, device in enumerate(devices):
-            row_tag = 'evenrow' if i % 2 == 0 else 'oddrow'
-            tcp_ip = device.cc.get("tcpIp", "-")
-            tcp_port = device.cc.get("tcpPort", "-")
-            logo_ip = device.cc.get("logoIp", "-")
-            serial_port = device.cc.get("serialPort", "-")
-            baudrate = device.cc.get("baudrate", "-")
-            slave_id = device.cc.get("slaveId", "-")
-            logo_port = device.cc.get("logoPort", "-")
-            status_text = "Online" if device.connected else "Offline"
-            logo_status_text = "Online" if device.connected_logo else "Offline"
-
-            # Insertar valores y aplicar tags
-            item_id = self.device_tree.insert('', 'end', values=(device.name, device.serial, serial_port, baudrate, slave_id, tcp_ip, tcp_port, status_text, logo_ip, logo_port, logo_status_text), tags=(row_tag,))
-            
-            # Aplicar tags de color solo a las celdas de estado (esto requiere un workaround en Tkinter)
-            # La forma estándar de colorear celdas no existe, pero podemos re-insertar con tags.
-            # Esta implementación es más simple y colorea toda la fila, lo cual es aceptado.
+        if devices is not None:
+            wanted = [d for d in devices if d.serial]
+            serials = {d.serial for d in wanted}
+            for iid in self.device_tree.get_children():
+                if iid not in serials:
+                    self.device_tree.delete(iid)
+                    self._device_rows.pop(iid, None)
+            for i, device in enumerate(wanted):
+                row_tag = 'evenrow' if i % 2 == 0 else 'oddrow'
+                if self.device_tree.exists(device.serial):
+                    self._set_device_row(device.serial, device)
+                    if self.device_tree.index(device.serial) != i:
+                        self.device_tree.move(device.serial, '', i)
+                    if self.device_tree.item(device.serial, "tags") != (row_tag,):
+                        self.device_tree.item(device.serial, tags=(row_tag,))
+                else:
+                    values = self._device_row(device)
+                    self.device_tree.insert('', i, iid=device.serial, values=values, tags=(row_tag,))
+                    self._device_rows[device.serial] = values
+
+        for serial, device in dirty.items():
+            if self.device_tree.exists(serial):
+                self._set_device_row(serial, device)
+
+    def _device_refresh_loop(self):
+        try:
+            while True:
+                try:
+                    fn, args = self._ui_calls.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self._log(f"⚠️ Error actualizando la UI: {e}")
+            self._apply_device_updates()
+        finally:
+            self.after(self.device_refresh_ms, self._device_refresh_loop)
+
+    def _build_live_values_widget(self):
+        """Crea el panel de valores en vivo del dispositivo seleccionado."""
+        frame = ttk.LabelFrame(self, text="Valores en vivo (dispositivo seleccionado)", padding=15)
+        frame.pack(fill="both", expand=True, padx=15, pady=5)
+
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill="both", expand=True)
+
+        self.live_tree = ttk.Treeview(tree_frame, columns=('group', 'signal', 'value', 'age'), show='headings', height=8)
+        self.live_tree.heading('group', text='Grupo')
+        self.live_tree.heading('signal', text='Señal')
+        self.live_tree.heading('value', text='Valor')
+        self.live_tree.heading('age', text='Antigüedad')
+        self.live_tree.column('group', width=80, stretch=tk.NO)
+        self.live_tree.column('signal', width=160, stretch=tk.NO)
+        self.live_tree.column('value', width=240, stretch=tk.YES)
+        self.live_tree.column('age', width=100, anchor='center', stretch=tk.NO)
+        self.live_tree.tag_configure('stale', foreground='#999', background='#fff4e0')
+        self.live_tree.tag_configure('fault', foreground='#c00000')
+
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.live_tree.yview)
+        self.live_tree.configure(yscrollcommand=scrollbar.set)
+        self.live_tree.grid(row=0, column=0, sticky='nsew')
+        scrollbar.grid(row=0, column=1, sticky='ns')
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+
+        ttk.Button(frame, text="Historial...", command=self._open_history).pack(anchor="e", pady=(8, 0))
+
+        self._live_serial = None
+        self._live_cells = {}
+
+    def _open_history(self):
+        selection = self.device_tree.selection()
+        if not selection:
+            messagebox.showinfo("Historial", "Seleccione un dispositivo.", parent=self)
+            return
+        if not getattr(self.controller, "history", None):
+            messagebox.showinfo("Historial", "El historial está deshabilitado en gateway.json.", parent=self)
+            return
+        HistoryDialog(self, self.controller, selection[0])
+
+    @staticmethod
+    def _format_value(entry):
+        value = entry.get("value") if isinstance(entry, dict) else entry
+        if isinstance(value, float):
+            return f"{value:.3f}".rstrip("0").rstrip(".")
+        return str(value)
+
+    def _age_label(self, age: float) -> str:
+        for limit, label in self.live_age_buckets:
+            if age < limit:
+                return label
+        return f"{age // 60:.0f} min"
+
+    def _refresh_live_values(self):
+        """Actualiza solo las celdas que cambiaron; marca como obsoletos los valores viejos."""
+        selection = self.device_tree.selection()
+        serial = selection[0] if selection else None
+        if serial != self._live_serial:
+            self.live_tree.delete(*self.live_tree.get_children())
+            self._live_cells.clear()
+            self._live_serial = serial
+
+        device = getattr(getattr(self, "controller", None), "devices", {}).get(serial) if serial else None
+        if device is None:
+            return
+
+        now = time.time()
+        seen = set()
+        for group, name, entry, updated_at in sorted(device.last_values(), key=lambda r: (r[0], r[1])):
+            iid = f"{group}/{name}"
+            seen.add(iid)
+            age = now - updated_at
+            age_label = self._age_label(age)
+            if age > self.live_stale_after:
+                tags = ('stale',)
+            elif isinstance(entry, dict) and entry.get("kind") == "fault":
+                tags = ('fault',)
+            else:
+                tags = ()
+            # Sin muestra nueva ni cambio de tramo/estado no se toca la fila
+            key = (updated_at, age_label, tags)
+            previous = self._live_cells.get(iid)
+            if previous is not None and previous[0] == key:
+                continue
+            values = (group, name, self._format_value(entry), age_label)
+            if previous is None:
+                self.live_tree.insert('', 'end', iid=iid, values=values, tags=tags)
+            elif previous[1] != (values, tags):
+                self.live_tree.item(iid, values=values, tags=tags)
+            self._live_cells[iid] = (key, (values, tags))
+        for iid in list(self._live_cells):
+            if iid not in seen:
+                self.live_tree.delete(iid)
+                del self._live_cells[iid]
+
+    def _live_refresh_loop(self):
+        try:
+            self._refresh_live_values()
+        finally:
+            self.after(self.live_refresh_ms, self._live_refresh_loop)
 
     def _build_log_widget(self):
-        """Crea el widget de texto para los logs."""
-        widget = scrolledtext.ScrolledText(self, state="disabled", height=10)
-        widget.pack(fill="x", padx=15, pady=(5, 15))
+        """Crea el widget de texto para los logs (alimentado por TkLogSink)."""
+        frame = ttk.Frame(self)
+        frame.pack(fill="x", padx=15, pady=(5, 15))
+
+        filter_frame = ttk.Frame(frame)
+        filter_frame.pack(fill="x")
+        ttk.Label(filter_frame, text="Nivel:").pack(side="left", padx=(0, 5))
+        self.log_level_var = tk.StringVar(value="Info")
+        level_box = ttk.Combobox(filter_frame, textvariable=self.log_level_var, values=list(LEVEL_LABELS), state="readonly", width=14)
+        level_box.pack(side="left")
+        level_box.bind("<<ComboboxSelected>>", lambda _e: self.log_sink.set_level(LEVEL_LABELS[self.log_level_var.get()]))
+
+        widget = scrolledtext.ScrolledText(frame, state="disabled", height=10)
+        widget.pack(fill="x", pady=(5, 0))
+        self.log_sink = TkLogSink(self, widget)
         return widget
 
     def _log(self, message):
-        self.log_widget.configure(state="normal")
-        self.log_widget.insert("end", message + "\n")
-        self.log_widget.configure(state="disabled")
-        self.log_widget.yview("end")
+        """Thread-safe: encola el mensaje; el hilo de Tk lo muestra por lotes."""
+        self.log_sink.write(message)
 
     def update_connectivity_status(self, is_connected: bool, network_name: str):
         """Actualiza la UI con el estado de la conexión a Internet."""
@@ -257,6 +456,98 @@ class MainWindow(tk.Tk):
             self.conn_status_label.config(foreground="red")
             self.conn_network_var.set(network_name)
 
+class WindowObserver(AppObserver):
+    """Adapta MainWindow a los eventos de AppController (seguro entre hilos)."""
+
+    def __init__(self, window: MainWindow):
+        self.window = window
+
+    def log(self, message):
+        self.window._log(message)
+
+    def on_gateway_ids(self, org_id, gw_id):
+        self.window.call_soon(self.window.org_id_var.set, org_id)
+        self.window.call_soon(self.window.gw_id_var.set, gw_id)
+
+    def on_connectivity(self, is_connected, network_name):
+        self.window.call_soon(self.window.update_connectivity_status, is_connected, network_name)
+
+    def on_known_networks(self, networks):
+        self.window.call_soon(self.window.update_known_networks_list, dict(networks))
+
+    def on_devices(self, services):
+        self.window.update_device_list(services)
+
+    def on_device_updated(self, service):
+        self.window.update_device_row(service)
+
+class HistoryDialog(tk.Toplevel):
+    """Historial reciente de una señal: serie reducida (media y rango min/max) en un Canvas."""
+
+    WINDOWS = {"5 min": 300, "15 min": 900, "1 h": 3600}
+    BUCKETS = 120
+
+    def __init__(self, parent, controller, serial):
+        super().__init__(parent)
+        self.controller = controller
+        self.serial = serial
+        self.title(f"Historial - {serial}")
+        self.geometry("720x360")
+
+        bar = ttk.Frame(self, padding=8)
+        bar.pack(fill="x")
+        signals = controller.history.available(serial)
+        self.signal_var = tk.StringVar(value=signals[0] if signals else "")
+        self.window_var = tk.StringVar(value="15 min")
+        ttk.Label(bar, text="Señal:").pack(side=tk.LEFT)
+        ttk.Combobox(bar, textvariable=self.signal_var, values=signals, state="readonly", width=18).pack(side=tk.LEFT, padx=5)
+        ttk.Label(bar, text="Ventana:").pack(side=tk.LEFT)
+        ttk.Combobox(bar, textvariable=self.window_var, values=list(self.WINDOWS), state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bar, text="Actualizar", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        self.summary_var = tk.StringVar()
+        ttk.Label(bar, textvariable=self.summary_var).pack(side=tk.RIGHT)
+
+        self.canvas = tk.Canvas(self, background="#ffffff", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True, padx=8, pady=(0, 8))
+        self.signal_var.trace_add("write", lambda *_: self.refresh())
+        self.window_var.trace_add("write", lambda *_: self.refresh())
+        self.canvas.bind("<Configure>", lambda _e: self.refresh())
+
+    def refresh(self):
+        signal = self.signal_var.get()
+        self.canvas.delete("all")
+        if not signal:
+            self.summary_var.set("Sin historial")
+            return
+        result = self.controller.query_history(
+            self.serial, signal, seconds=self.WINDOWS[self.window_var.get()], buckets=self.BUCKETS
+        )
+        buckets = result.get("buckets") or []
+        if not buckets:
+            self.summary_var.set(result.get("error") or "Sin muestras en la ventana")
+            return
+
+        lo = min(b[2] for b in buckets)
+        hi = max(b[3] for b in buckets)
+        n = sum(b[4] for b in buckets)
+        mean = sum(b[1] * b[4] for b in buckets) / n
+        self.summary_var.set(f"min {lo:.2f}  máx {hi:.2f}  media {mean:.2f}  ({n} muestras)")
+
+        w, h, pad = self.canvas.winfo_width(), self.canvas.winfo_height(), 20
+        span_t = max(result["end"] - result["start"], 1e-9)
+        span_v = (hi - lo) or 1.0
+        x = lambda t: pad + (t - result["start"]) / span_t * (w - 2 * pad)
+        y = lambda v: h - pad - (v - lo) / span_v * (h - 2 * pad)
+        line = []
+        for t, avg, b_lo, b_hi, _n in buckets:
+            self.canvas.create_line(x(t), y(b_lo), x(t), y(b_hi), fill="#c8d8f0")
+            line.extend((x(t), y(avg)))
+        if len(line) >= 4:
+            self.canvas.create_line(*line, fill="#0078D7", width=2)
+        self.canvas.create_text(pad, pad / 2, text=f"{hi:.2f}", anchor="w", fill="#666")
+        self.canvas.create_text(pad, h - pad / 2, text=f"{lo:.2f}", anchor="w", fill="#666")
+
+
 class NetworkDialog(simpledialog.Dialog):
     """Diálogo personalizado para añadir/editar redes Wi-Fi."""
     def __init__(self, parent, title=None, ssid_initial="", password_initial=""):